@@ -4,11 +4,13 @@ from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import pandas as pd
 import random
-import requests
 import json
-import sqlite3 
 import time 
-from io import StringIO
+import atexit
+import threading
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -20,184 +22,55 @@ if not YOUTUBE_API_KEY:
 
 
 # IMPORT CÁC MODULE MỚI 
-from tlu_api import (
-    authenticate_tlu, 
-    fetch_student_marks,
-    fetch_current_semester_id, 
-    fetch_student_schedule     
+from tlu_api import fetch_student_mark_records, fetch_current_semester_id, fetch_student_schedule
+from tlu_api_async import (
+    tlu_client,
+    authenticate_tlu_async,
+    fetch_student_mark_records_async,
+    fetch_current_semester_id_async,
+    fetch_student_schedule_async
 )
+import storage
+import cache_codec
+from memory_cache import MemoryCache
+from kv_cache import get_cache
 from recommender import (
     process_tlu_data_to_progress, 
-    get_recommendation_logic, 
+    get_recommendation_logic_async,
+    get_cf_recommendations_batch,
+    extract_cf_grade_rows,
     predict_future_logic,
     get_insight_logic,
     process_schedule_to_courses,
-    build_cf_model_data
+    search_youtube_videos,
+    migrate_legacy_caches,
+    youtube_stats,
+    ai_stats
 )
+from model_holder import ModelHolder
+from score_model import score_model, predict_course_scores
+from prewarm import PrewarmScheduler
+from session_store import create_session_store, SESSION_TTL
+from http_client import RateLimiter
+from grade_feed import load_cursor, read_grade_changes, save_cursor
 
 # ==============================
-# 💾 YouTube Cache System
+# 💾 Cache AI + YouTube (kv_cache dùng chung với recommender.py)
 # ==============================
-def init_youtube_cache_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS youtube_cache (
-            query TEXT PRIMARY KEY,
-            data TEXT NOT NULL,
-            expires_at REAL NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-    print("✅ Bảng youtube_cache đã sẵn sàng.")
-
-def init_ai_cache_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS ai_cache (
-            prompt TEXT PRIMARY KEY,
-            response TEXT NOT NULL,
-            expires_at REAL NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-    print("✅ Bảng ai_cache đã sẵn sàng.")
-
-
-YOUTUBE_CACHE_TTL = 86400  # cache 1 ngày (24 giờ)
-
-def get_youtube_cache(query):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT data, expires_at FROM youtube_cache WHERE query = ?", (query,))
-    row = c.fetchone()
-    conn.close()
-
-    if not row:
-        print(f"❌ Cache MISS cho từ khóa: {query}")
-        return None
-
-    data, expires_at = row
-    if time.time() > expires_at:
-        print(f"⚠️ Cache EXPIRED cho từ khóa: {query}")
-        return None
-
-    print(f"✅ Cache HIT cho từ khóa: {query}")
-    return json.loads(data)
+def drop_legacy_cache_tables():
+    """
+    Xóa bảng ai_cache/youtube_cache cũ trong tlu_cache.db: khóa (prompt/từ khóa thô)
+    và dạng dữ liệu không còn khớp với kv_cache nên không chép sang.
+    """
+    for table in ("ai_cache", "youtube_cache"):
+        if get_cache().drop_legacy_table(DB_NAME, table):
+            print(f"🧹 Đã xóa bảng cache cũ {table} ({DB_NAME}).")
 
 
-def set_youtube_cache(query, videos):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    expires_at = time.time() + YOUTUBE_CACHE_TTL
-    c.execute(
-        "INSERT OR REPLACE INTO youtube_cache (query, data, expires_at) VALUES (?, ?, ?)",
-        (query, json.dumps(videos, ensure_ascii=False), expires_at)
-    )
-    conn.commit()
-    conn.close()
-    print(f"💾 Đã lưu cache YouTube cho từ khóa: {query}")
-
-
-def clean_expired_youtube_cache():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM youtube_cache WHERE expires_at < ?", (time.time(),))
-    deleted = c.rowcount
-    conn.commit()
-    conn.close()
-    if deleted > 0:
-        print(f"🧹 Đã dọn {deleted} cache YouTube hết hạn.")
-
-AI_CACHE_TTL = 86400  # 24h
-
-def get_ai_cache(prompt):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT response, expires_at FROM ai_cache WHERE prompt = ?", (prompt,))
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        print(f"❌ AI Cache MISS cho prompt: {prompt[:60]}...")
-        return None
-    response, expires_at = row
-    if time.time() > expires_at:
-        print(f"⚠️ AI Cache EXPIRED cho prompt: {prompt[:60]}...")
-        return None
-    print(f"✅ AI Cache HIT cho prompt: {prompt[:60]}...")
-    return json.loads(response)
-
-def set_ai_cache(prompt, response):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    expires_at = time.time() + AI_CACHE_TTL
-    c.execute(
-        "INSERT OR REPLACE INTO ai_cache (prompt, response, expires_at) VALUES (?, ?, ?)",
-        (prompt, json.dumps(response, ensure_ascii=False), expires_at)
-    )
-    conn.commit()
-    conn.close()
-    print(f"💾 Đã lưu AI cache cho prompt: {prompt[:60]}...")
-
-def clean_expired_ai_cache():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM ai_cache WHERE expires_at < ?", (time.time(),))
-    deleted = c.rowcount
-    conn.commit()
-    conn.close()
+def clean_expired_cache():
+    deleted = get_cache().purge_expired()
     if deleted > 0:
-        print(f"🧹 Đã dọn {deleted} AI cache hết hạn.")
-
-
-def search_youtube_videos(query, max_results=5):
-    """Gửi API YouTube để tìm video hoặc tập."""
-    if not YOUTUBE_API_KEY:
-        print("❌ Không có YOUTUBE_API_KEY — không thể gửi API.")
-        return []
-    
-    print(f"🔍 Gọi YouTube API thật cho từ khóa: {query}")
-    url = (
-        "https://www.googleapis.com/youtube/v3/search?"
-        f"part=snippet&type=video&maxResults={max_results}&q={query}&key={YOUTUBE_API_KEY}"
-    )
-
-    try:
-        resp = requests.get(url, timeout=10)
-        if resp.status_code != 200:
-            print(f"❌ Lỗi YouTube API: {resp.status_code}")
-            return []
-
-        data = resp.json()
-        videos = []
-        for item in data.get("items", []):
-            videos.append({
-                "title": item["snippet"]["title"],
-                "videoId": item["id"]["videoId"],
-                "url": f"https://www.youtube.com/watch?v={item['id']['videoId']}",
-                "thumbnail": item["snippet"]["thumbnails"]["medium"]["url"]
-            })
-
-        return videos
-
-    except Exception as e:
-        print(f"❌ Lỗi khi gửi YouTube API: {e}")
-        return []
-
-def get_youtube_videos_with_cache(query):
-    """Trả về video từ cache nếu có, nếu không thì gọi YouTube API thật và lưu cache."""
-    cached = get_youtube_cache(query)
-    if cached:
-        return cached
-
-    videos = search_youtube_videos(query)
-    if videos:
-        set_youtube_cache(query, videos)
-    return videos
-
+        print(f"🧹 Đã dọn {deleted} mục cache AI/YouTube hết hạn.")
 
 
 app = Flask(__name__)
@@ -240,12 +113,17 @@ def upload_avatar():
 # --- THIẾT LẬP CACHE ---
 DB_NAME = "tlu_cache.db"
 CACHE_DURATION = 3600 # 1 giờ
+# Quá CACHE_DURATION dữ liệu vẫn được trả về (stale) trong khi làm mới nền;
+# chỉ quá hạn cứng này mới bắt request chờ gọi lại TLU.
+CACHE_HARD_EXPIRY = int(os.getenv("CACHE_HARD_EXPIRY", str(24 * 3600)))
+
+# Cache L1 (trong RAM) chứa (DataFrame đã parse, timestamp), đặt trước bảng api_cache
+L1_CACHE_SIZE = int(os.getenv("L1_CACHE_SIZE", "512"))
+api_l1_cache = MemoryCache(maxsize=L1_CACHE_SIZE, ttl=CACHE_HARD_EXPIRY)
 
 def init_db():
     """ Khởi tạo CSDL SQLite (chạy 1 lần) """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
+    storage.execute(DB_NAME, '''
     CREATE TABLE IF NOT EXISTS api_cache (
         student_id TEXT,
         data_type TEXT,
@@ -254,46 +132,86 @@ def init_db():
         PRIMARY KEY (student_id, data_type)
     )
     ''')
-    conn.commit()
-    conn.close()
+    # Migration: cột `encoding` cho biết codec của json_data (dòng cũ là JSON records)
+    columns = [row[1] for row in storage.fetchall(DB_NAME, "PRAGMA table_info(api_cache)")]
+    if "encoding" not in columns:
+        storage.execute(DB_NAME, "ALTER TABLE api_cache ADD COLUMN encoding TEXT NOT NULL DEFAULT 'json'")
 
     
-def get_from_cache(student_id, data_type):
-    """ Lấy dữ liệu từ cache (nếu có và chưa hết hạn) """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT json_data, timestamp 
+def _load_cache_row(student_id, data_type):
+    """ Đọc và giải mã dòng api_cache vào L1. Trả về (DataFrame, timestamp) hoặc None. """
+    result = storage.fetchone(DB_NAME, '''
+        SELECT json_data, timestamp, encoding 
         FROM api_cache 
         WHERE student_id = ? AND data_type = ?
     ''', (student_id, data_type))
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
-        json_data, cache_timestamp = result
-        
+
+    if not result:
+        print(f"CACHE MISS: Không tìm thấy {data_type} cho {student_id} trong CSDL.")
+        return None
+
+    blob, cache_timestamp, encoding = result
+    if time.time() - cache_timestamp > CACHE_HARD_EXPIRY:
+        print(f"CACHE EXPIRED: Dữ liệu {data_type} đã quá hạn cứng. Gọi lại API TLU.")
+        return None
+
+    try:
+        df = cache_codec.decode(blob, encoding)
+    except Exception as e:
+        print(f"LỖI: Không thể giải mã ({encoding}) dữ liệu từ cache CSDL: {e}")
+        return None 
+    if encoding != cache_codec.CACHE_CODEC:
+        _reencode_cache_row(student_id, data_type, df, cache_timestamp)
+    api_l1_cache.set((student_id, data_type), (df, cache_timestamp), expires_at=cache_timestamp + CACHE_HARD_EXPIRY)
+    print(f"CACHE HIT: Trả về dữ liệu {data_type} cho {student_id} từ CSDL.")
+    return df, cache_timestamp
+
+def get_from_cache(student_id, data_type):
+    """
+    Lấy dữ liệu từ cache: RAM (L1) trước, rồi tới CSDL.
+    Quá CACHE_DURATION vẫn trả dữ liệu cũ và làm mới nền từ TLU;
+    quá CACHE_HARD_EXPIRY thì coi như không có (None).
+    L1 cũ thì xem lại dòng trong CSDL trước: worker khác (bộ làm nóng giữ lease,
+    request khác) có thể đã ghi bản mới, khi đó dùng bản đó thay vì gọi lại TLU.
+    """
+    entry = api_l1_cache.get((student_id, data_type))
+    if entry is not None:
+        df, cache_timestamp = entry
+        print(f"CACHE HIT (L1): Trả về dữ liệu {data_type} cho {student_id} từ RAM.")
         if time.time() - cache_timestamp > CACHE_DURATION:
-            print(f"CACHE EXPIRED: Dữ liệu {data_type} đã hết hạn. Gọi lại API TLU.")
+            row = storage.fetchone(DB_NAME, "SELECT timestamp FROM api_cache WHERE student_id = ? AND data_type = ?",
+                                   (student_id, data_type))
+            if row is not None and row[0] > cache_timestamp:
+                fresher = _load_cache_row(student_id, data_type)
+                if fresher is not None:
+                    df, cache_timestamp = fresher
+    else:
+        loaded = _load_cache_row(student_id, data_type)
+        if loaded is None:
             return None
-            
-        print(f"CACHE HIT: Trả về dữ liệu {data_type} cho {student_id} từ CSDL.")
-        
-        try:
-            json_io = StringIO(json_data) 
-            return pd.read_json(json_io, orient='records')
-        except Exception as e:
-            print(f"LỖI: Không thể đọc/convert JSON từ cache CSDL: {e}")
-            return None 
-    
-    print(f"CACHE MISS: Không tìm thấy {data_type} cho {student_id} trong CSDL.")
-    return None
+        df, cache_timestamp = loaded
+
+    if time.time() - cache_timestamp > CACHE_DURATION:
+        print(f"CACHE STALE: Dữ liệu {data_type} của {student_id} đã cũ, trả về tạm và làm mới nền.")
+        _count_refresh("stale_served")
+        schedule_refresh(student_id, data_type)
+    return df.copy()
+
+def _reencode_cache_row(student_id, data_type, df, cache_timestamp):
+    """ Ghi lại dòng cache cũ bằng codec hiện tại (giữ nguyên timestamp, bỏ qua nếu dòng vừa bị ghi mới). """
+    try:
+        encoding, blob = cache_codec.encode(df)
+        storage.execute(
+            DB_NAME,
+            "UPDATE api_cache SET json_data = ?, encoding = ? WHERE student_id = ? AND data_type = ? AND timestamp = ?",
+            (blob, encoding, student_id, data_type, cache_timestamp)
+        )
+    except Exception as e:
+        print(f"LỖI: Không thể chuyển dòng cache sang codec {cache_codec.CACHE_CODEC}. Lý do: {e}")
+
 
 def set_to_cache(student_id, data_type, data):
     """ Lưu dữ liệu vào cache CSDL """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
         if isinstance(data, pd.DataFrame):
              data_to_serialize = data
@@ -303,42 +221,116 @@ def set_to_cache(student_id, data_type, data):
              print(f"LỖI: Dữ liệu {data_type} không thể lưu vào cache (phải là list/DataFrame).")
              return
 
-        json_data = data_to_serialize.to_json(orient='records') 
+        encoding, blob = cache_codec.encode(data_to_serialize)
         
-        cursor.execute(
-            "INSERT OR REPLACE INTO api_cache (student_id, data_type, json_data, timestamp) VALUES (?, ?, ?, ?)",
-            (student_id, data_type, json_data, time.time())
+        api_l1_cache.invalidate((student_id, data_type))
+        storage.execute(
+            DB_NAME,
+            "INSERT OR REPLACE INTO api_cache (student_id, data_type, json_data, timestamp, encoding) VALUES (?, ?, ?, ?, ?)",
+            (student_id, data_type, blob, time.time(), encoding)
         )
-        conn.commit()
         print(f"CACHE SET: Đã lưu dữ liệu {data_type} cho {student_id} vào CSDL.")
     except Exception as e:
         print(f"LỖI: Không thể lưu vào cache. Lý do: {e}")
-    finally:
-        conn.close()
 
 
 # =========================================================
 # NẠP VÀ HUẤN LUYỆN MÔ HÌNH AI KHI KHỞI ĐỘNG
 # =========================================================
-print("🤖 Đang nạp mô hình gợi ý AI (CF) từ 'tong_hop_diem_sinh_vien.csv'...")
-cf_model_data = None
-try:
-    full_data = pd.read_csv("tong_hop_diem_sinh_vien.csv")
-    cf_model_data = build_cf_model_data(full_data)
-    
-    if cf_model_data and cf_model_data[0] is not None:
-        print(f"✅ Nạp mô hình AI (CF) thành công. Đã phân tích {len(cf_model_data[0])} sinh viên.")
-    else:
-        print("❌ LỖI: Không thể nạp mô hình AI (CF).")
-        cf_model_data = None
-        
-except FileNotFoundError:
-    print("❌ LỖI: Không tìm thấy tệp 'tong_hop_diem_sinh_vien.csv'.")
-    cf_model_data = None
-except Exception as e:
-    print(f"❌ LỖI: Không thể nạp mô hình AI (CF) từ CSV. Lý do: {e}")
-    cf_model_data = None
-    
+CF_CSV_PATH = "tong_hop_diem_sinh_vien.csv"
+CF_INDEX_DIR = os.path.join("models", "cf_index")
+# Retry-After (giây) gửi kèm 503 khi mô hình còn đang nạp
+CF_WARMING_RETRY_AFTER = 5
+
+
+def _load_cf_model():
+    from cf_index import load_or_build_cf_index  # nạp lười: scipy chỉ cần khi dựng mô hình
+    cf_model_data = load_or_build_cf_index(CF_CSV_PATH, CF_INDEX_DIR)
+    if cf_model_data is not None and len(cf_model_data) > 0:
+        print(f"✅ Nạp mô hình AI (CF) thành công. Đã phân tích {len(cf_model_data)} sinh viên.")
+        return cf_model_data
+    print("❌ LỖI: Không thể nạp mô hình AI (CF).")
+    return None
+
+
+# Nạp mô hình trong thread nền để server nhận request ngay khi khởi động;
+# cập nhật tăng dần khi có điểm mới rồi hoán đổi nguyên tử.
+print("🤖 Đang nạp nền mô hình gợi ý AI (CF) từ 'tong_hop_diem_sinh_vien.csv'...")
+cf_model = ModelHolder("cf")
+cf_model.load_in_background(_load_cf_model)
+_cf_update_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cf-update")
+
+
+def schedule_cf_update(student_id, tlu_marks):
+    """ Đẩy điểm mới lấy từ TLU vào mô hình CF (chạy nền, tuần tự). """
+    try:
+        student_id_int = int(student_id)
+    except ValueError:
+        return
+    rows = extract_cf_grade_rows(tlu_marks, student_id_int)
+    if rows and cf_model.get() is not None:
+        _cf_update_executor.submit(_apply_cf_update, rows)
+
+
+def _apply_cf_update(rows):
+    from cf_index import apply_updates
+    try:
+        current = cf_model.get()
+        updated = cf_model.update(lambda index: apply_updates(index, rows))
+        if updated is not None and updated is not current:
+            _cf_dirty.set()  # lưu ra đĩa sau (persist_cf_index), không ghi lại cả chỉ mục mỗi lô
+    except Exception as e:
+        print(f"❌ LỖI: Không thể cập nhật mô hình CF. Lý do: {e}")
+
+
+# Các việc nền dùng chung CSDL/đĩa (lưu chỉ mục CF, đọc grade_changes) chỉ do MỘT
+# tiến trình làm: tiến trình đang giữ lease LEADER_LEASE trong tlu_cache.db.
+LEADER_LEASE = "app.leader"
+_process_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+CF_SAVE_INTERVAL = float(os.getenv("CF_SAVE_INTERVAL", "300"))  # giây giữa hai lần lưu chỉ mục CF
+_cf_dirty = threading.Event()
+_cf_save_lock = threading.Lock()
+
+
+def is_leader(ttl):
+    """ Giành/gia hạn lease LEADER_LEASE (`ttl` giây); True nếu tiến trình này đang giữ. """
+    try:
+        return storage.try_acquire_lease(DB_NAME, LEADER_LEASE, _process_id, ttl)
+    except Exception as e:
+        print(f"LỖI: Không thể giành lease {LEADER_LEASE}. Lý do: {e}")
+        return False
+
+
+def persist_cf_index():
+    """
+    Lưu chỉ mục CF đã cập nhật ra đĩa — nhiều nhất mỗi CF_SAVE_INTERVAL giây (và
+    khi tắt server), chỉ ở tiến trình giữ lease, để N worker không cùng ghi lại
+    toàn bộ chỉ mục sau mỗi lô điểm. Trả về True nếu đã lưu.
+    """
+    from cf_index import save_cf_index
+    with _cf_save_lock:
+        if not _cf_dirty.is_set() or not is_leader(CF_SAVE_INTERVAL * 3):
+            return False
+        index = cf_model.get()
+        if index is None:
+            return False
+        _cf_dirty.clear()
+        try:
+            save_cf_index(index, CF_INDEX_DIR)
+        except Exception as e:
+            _cf_dirty.set()
+            print(f"❌ LỖI: Không thể lưu chỉ mục CF. Lý do: {e}")
+            return False
+        return True
+
+
+def _cf_persist_loop():
+    while not _cf_persist_stop.wait(CF_SAVE_INTERVAL):
+        persist_cf_index()
+
+
+_cf_persist_stop = threading.Event()
+
 
 # =========================================================
 # NẠP CƠ SỞ DỮ LIỆU HỌC LIỆU (JSON)
@@ -356,11 +348,17 @@ except Exception as e:
 
 # =========================================================
 
-user_sessions = {}  # Lưu phiên đăng nhập tạm thời
+# Phiên đăng nhập (token TLU) dùng chung giữa các worker, có hạn dùng
+user_sessions = create_session_store()
+
+# Lưu ý: các route async bên dưới vẫn chạy qua WSGI (asgiref mở một event loop
+# riêng cho mỗi request), nên không tăng số request đồng thời của một worker —
+# chỉ các lời gọi TLU/YouTube trong cùng một request chạy song song. Thông lượng
+# vẫn do số worker/thread của server WSGI quyết định (xem tlu_api_async.py).
 
 
 @app.route('/api/login', methods=['POST'])
-def login():
+async def login():
     try:
         data = request.get_json()
         if not data:
@@ -372,14 +370,15 @@ def login():
         if not student_id or not password: 
             return jsonify({"success": False, "message": "Vui lòng cung cấp mã sinh viên và mật khẩu."}), 400
 
-        auth_result = authenticate_tlu(student_id, password) 
+        auth_result = await authenticate_tlu_async(student_id, password) 
 
         if auth_result and auth_result.get("success"):
-            user_sessions[student_id] = {
+            expires_in = auth_result.get("expires_in")
+            user_sessions.set(student_id, {
                 "access_token": auth_result["access_token"],
                 "name": auth_result["name"],
                 "student_info": auth_result
-            }
+            }, ttl=min(SESSION_TTL, int(expires_in)) if expires_in else None)
             
             return jsonify({
                 "success": True,
@@ -411,16 +410,288 @@ def get_ALL_marks_data(student_id):
 
     access_token = session.get("access_token")
     
-    tlu_marks = fetch_student_marks(access_token)
+    tlu_marks = fetch_student_mark_records(access_token)
     
     if tlu_marks is None: 
         return None, "Không thể lấy dữ liệu điểm tổng kết từ TLU API."
     
-    progress_data = process_tlu_data_to_progress(tlu_marks, student_id)
+    return store_marks(student_id, tlu_marks), None
+
+
+async def get_ALL_marks_data_async(student_id):
+    """ 
+    Bản async của get_ALL_marks_data (gọi TLU qua httpx, không chặn thread).
+    """
+    cached_data = get_from_cache(student_id, "marks")
+    if cached_data is not None:
+        return cached_data, None 
+
+    session = user_sessions.get(student_id)
+    if not session or "access_token" not in session:
+        return None, "Phiên đăng nhập hết hạn."
+
+    tlu_marks = await fetch_student_mark_records_async(session.get("access_token"))
     
+    if tlu_marks is None: 
+        return None, "Không thể lấy dữ liệu điểm tổng kết từ TLU API."
+    
+    return store_marks(student_id, tlu_marks), None
+
+
+def store_marks(student_id, tlu_marks):
+    """ Chuyển điểm TLU thành tiến độ, ghi cache và đẩy vào mô hình CF. """
+    progress_data = process_tlu_data_to_progress(tlu_marks, student_id)
     set_to_cache(student_id, "marks", progress_data)
+    schedule_cf_update(student_id, tlu_marks)
+    return progress_data
+
+
+# =========================================================
+# LÀM MỚI NỀN (STALE-WHILE-REVALIDATE) CHO api_cache
+# =========================================================
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "4"))
+_refresh_executor = ThreadPoolExecutor(max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+_refresh_lock = threading.Lock()
+_refreshing = set()  # (student_id, data_type) đang được làm mới
+refresh_stats = {"stale_served": 0, "scheduled": 0, "refreshed": 0, "failed": 0, "no_session": 0}
+
+
+def _count_refresh(name):
+    with _refresh_lock:
+        refresh_stats[name] += 1
+
+
+def _session_token(student_id):
+    session = user_sessions.get(student_id)
+    return session.get("access_token") if session else None
+
+
+def refresh_marks(student_id):
+    """ Lấy lại điểm từ TLU bằng token đã lưu. True/False = thành công/thất bại, None = không có phiên. """
+    access_token = _session_token(student_id)
+    if not access_token:
+        return None
+    tlu_marks = fetch_student_mark_records(access_token)
+    if tlu_marks is None:
+        return False
+    store_marks(student_id, tlu_marks)
+    return True
+
+
+def refresh_schedule(student_id):
+    """ Lấy lại lịch học kỳ hiện tại từ TLU bằng token đã lưu (giá trị trả về như refresh_marks). """
+    access_token = _session_token(student_id)
+    if not access_token:
+        return None
+    semester_id = fetch_current_semester_id(access_token)
+    schedule_data = fetch_student_schedule(access_token, semester_id) if semester_id else None
+    if schedule_data is None:
+        return False
+    set_to_cache(student_id, "schedule", process_schedule_to_courses(schedule_data, student_id))
+    return True
+
+
+CACHE_REFRESHERS = {"marks": refresh_marks, "schedule": refresh_schedule}
+
+
+def _claim_refresh(key):
+    with _refresh_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+
+def schedule_refresh(student_id, data_type):
+    """ Đưa việc làm mới (student_id, data_type) vào hàng đợi nền; bỏ qua nếu đang làm mới. """
+    refresher = CACHE_REFRESHERS.get(data_type)
+    key = (student_id, data_type)
+    if refresher is None or not _claim_refresh(key):
+        return False
+    _count_refresh("scheduled")
+    _refresh_executor.submit(_run_refresh, key, refresher)
+    return True
+
+
+def refresh_now(student_id, data_type):
+    """ Làm mới ngay trên thread hiện tại. Trả về "refreshed"/"failed"/"no_session", hoặc "inflight" nếu đang có lượt khác. """
+    key = (student_id, data_type)
+    if not _claim_refresh(key):
+        return "inflight"
+    return _run_refresh(key, CACHE_REFRESHERS[data_type])
+
+
+def _run_refresh(key, refresher):
+    try:
+        result = refresher(key[0])
+    except Exception as e:
+        print(f"LỖI: Không thể làm mới {key[1]} cho {key[0]}. Lý do: {e}")
+        result = False
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(key)
+    outcome = "no_session" if result is None else "refreshed" if result else "failed"
+    _count_refresh(outcome)
+    return outcome
+
+
+# =========================================================
+# LÀM NÓNG TRƯỚC CACHE CHO SINH VIÊN ĐANG HOẠT ĐỘNG
+# =========================================================
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "1") == "1"
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "60"))
+PREWARM_LEAD_TIME = float(os.getenv("PREWARM_LEAD_TIME", "300"))  # làm mới trước khi hết CACHE_DURATION bao lâu (giây)
+PREWARM_JITTER = float(os.getenv("PREWARM_JITTER", "0.2"))
+TLU_PREWARM_RATE = float(os.getenv("TLU_PREWARM_RATE", "5"))  # lời gọi TLU/giây của bộ làm nóng
+STUDENTS_DB = "smart_learning.db"
+PREWARM_LEASE = "prewarm"
+PREWARM_LEASE_TTL = PREWARM_INTERVAL * 3  # giây; người giữ gia hạn ít nhất mỗi PREWARM_INTERVAL
+
+
+def list_prewarm_students():
+    """ Sinh viên đang có phiên đăng nhập + sinh viên trong bảng students (smart_learning.db). """
+    student_ids = user_sessions.active_ids()
+    if not os.path.exists(STUDENTS_DB):
+        return student_ids
+    try:
+        student_ids += [row[0] for row in storage.fetchall(STUDENTS_DB, "SELECT student_id FROM students")]
+    except Exception as e:
+        print(f"CẢNH BÁO: Không đọc được bảng students để làm nóng cache. Lý do: {e}")
+    return student_ids
+
+
+def get_cache_timestamps():
+    rows = storage.fetchall(DB_NAME, "SELECT student_id, data_type, timestamp FROM api_cache")
+    return {(student_id, data_type): timestamp for student_id, data_type, timestamp in rows}
+
+
+prewarm_scheduler = PrewarmScheduler(
+    list_students=list_prewarm_students,
+    get_timestamps=get_cache_timestamps,
+    refresh=refresh_now,
+    can_refresh=lambda student_id: _session_token(student_id) is not None,
+    rate_limiter=RateLimiter(TLU_PREWARM_RATE),
+    call_cost={"marks": 1, "schedule": 2},
+    ttl=CACHE_DURATION,
+    lead_time=PREWARM_LEAD_TIME,
+    interval=PREWARM_INTERVAL,
+    jitter=PREWARM_JITTER,
+    # Chỉ một tiến trình (giữ lease trong tlu_cache.db) quét, để ngân sách
+    # TLU_PREWARM_RATE là của cả server chứ không nhân theo số worker
+    lease=lambda: storage.try_acquire_lease(DB_NAME, PREWARM_LEASE, _process_id, PREWARM_LEASE_TTL),
+)
+
+
+# =========================================================
+# NHẬN THAY ĐỔI ĐIỂM TỪ data_synchronizer / batch_sync (bảng grade_changes)
+# =========================================================
+GRADE_FEED_ENABLED = os.getenv("GRADE_FEED_ENABLED", "1") == "1"
+GRADE_FEED_INTERVAL = float(os.getenv("GRADE_FEED_INTERVAL", "30"))
+GRADE_FEED_BATCH = 1000
+GRADE_FEED_CURSOR = "app.grade_changes"  # tên con trỏ trong bảng feed_cursors của tlu_cache.db
+GRADE_FEED_LEASE_TTL = GRADE_FEED_INTERVAL * 3
+_grade_feed_lock = threading.Lock()
+_grade_feed_stop = threading.Event()
+grade_feed_stats = {"cursor": None, "leader": None, "polls": 0, "changes": 0,
+                    "students_invalidated": 0, "last_error": None}
+
+
+def consume_grade_changes():
+    """
+    Đọc các thay đổi điểm mới (sau con trỏ change_id) do tiến trình đồng bộ ghi vào
+    smart_learning.db: xóa cache "marks" của đúng các sinh viên bị ảnh hưởng và đẩy
+    điểm mới vào mô hình CF. Trả về số thay đổi đã xử lý.
+
+    Nhiều worker: chỉ tiến trình giữ lease LEADER_LEASE là bên đọc chính — nó xóa
+    api_cache và lưu con trỏ chung GRADE_FEED_CURSOR trong tlu_cache.db (cùng
+    transaction), nên sau khi khởi động lại server đọc tiếp từ thay đổi cuối đã xử
+    lý. Các worker còn lại chỉ theo dõi: giữ con trỏ trong bộ nhớ (bắt đầu từ con
+    trỏ chung), xóa L1 và cập nhật mô hình CF của chính mình, không ghi gì vào CSDL.
+    Khi đổi vai, con trỏ được đọc lại từ tlu_cache.db.
+    """
+    with _grade_feed_lock:
+        if not os.path.exists(STUDENTS_DB):  # chưa đồng bộ lần nào: không tạo file rỗng, chờ lượt sau
+            grade_feed_stats["last_error"] = f"chưa có {STUDENTS_DB}"
+            return 0
+        leader = is_leader(GRADE_FEED_LEASE_TTL)
+        if leader != grade_feed_stats["leader"]:
+            grade_feed_stats["leader"] = leader
+            grade_feed_stats["cursor"] = None
+        try:
+            if grade_feed_stats["cursor"] is None:
+                with storage.transaction(DB_NAME) as conn:
+                    grade_feed_stats["cursor"] = load_cursor(conn, GRADE_FEED_CURSOR)
+            with storage.get_pool(STUDENTS_DB).connection() as conn:
+                changes = read_grade_changes(conn, grade_feed_stats["cursor"], GRADE_FEED_BATCH)
+        except Exception as e:
+            grade_feed_stats["last_error"] = str(e)
+            return 0
+        grade_feed_stats["polls"] += 1
+        grade_feed_stats["last_error"] = None
+        if not changes:
+            return 0
+
+        students = sorted({change[1] for change in changes})
+        if leader:
+            try:
+                with storage.transaction(DB_NAME) as conn:
+                    conn.executemany("DELETE FROM api_cache WHERE student_id = ? AND data_type = 'marks'",
+                                     [(student_id,) for student_id in students])
+                    save_cursor(conn, GRADE_FEED_CURSOR, changes[-1][0])
+            except Exception as e:
+                print(f"LỖI: Không thể xóa cache điểm theo grade_changes. Lý do: {e}")
+                grade_feed_stats["last_error"] = str(e)
+                return 0  # không tiến con trỏ: lượt sau xử lý lại
+        for student_id in students:
+            api_l1_cache.invalidate((student_id, "marks"))
+
+        cf_rows = [(int(student_id), subject_name, new_score)
+                   for _, student_id, _, subject_name, _, _, new_score, _ in changes
+                   if student_id.isdigit() and subject_name and new_score is not None]
+        if cf_rows and cf_model.get() is not None:
+            _cf_update_executor.submit(_apply_cf_update, cf_rows)
+
+        grade_feed_stats["cursor"] = changes[-1][0]
+        grade_feed_stats["changes"] += len(changes)
+        grade_feed_stats["students_invalidated"] += len(students)
+        return len(changes)
+
+
+def _grade_feed_loop():
+    consume_grade_changes()
+    while not _grade_feed_stop.wait(GRADE_FEED_INTERVAL):
+        while consume_grade_changes() == GRADE_FEED_BATCH:
+            pass  # còn tồn: đọc tiếp ngay
+
+
+
+# =========================================================
+# KHỞI ĐỘNG CÁC VIỆC NỀN (không chạy khi chỉ import app.py)
+# =========================================================
+_background_lock = threading.Lock()
+_background_started = False
 
-    return progress_data, None
+
+def start_background_jobs():
+    """ Khởi động bộ làm nóng cache, luồng đọc grade_changes và lưu chỉ mục CF (một lần cho mỗi tiến trình server). """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    if PREWARM_ENABLED:
+        prewarm_scheduler.start()
+    if GRADE_FEED_ENABLED:
+        # Chạy kể cả khi smart_learning.db chưa có: mỗi lượt tự kiểm tra lại
+        threading.Thread(target=_grade_feed_loop, name="grade-feed", daemon=True).start()
+    threading.Thread(target=_cf_persist_loop, name="cf-persist", daemon=True).start()
+    atexit.register(persist_cf_index)  # lưu nốt các cập nhật CF chưa lưu khi tắt server
+
+
+@app.before_request
+def _ensure_background_jobs():
+    if not _background_started:
+        start_background_jobs()
 
 
 @app.route('/api/progress/<student_id>', methods=['GET'])
@@ -435,12 +706,20 @@ def get_progress(student_id):
     return jsonify(progress_data.to_dict(orient='records'))
 
 
+def cf_warming_response():
+    response = jsonify({"status": "warming", "message": "Mô hình gợi ý đang được nạp, vui lòng thử lại sau giây lát."})
+    response.headers["Retry-After"] = str(CF_WARMING_RETRY_AFTER)
+    return response, 503
+
+
 @app.route('/api/recommendation/<student_id>', methods=['GET'])
-def get_recommendation(student_id):
+async def get_recommendation(student_id):
     """ 
     API Gợi ý học tập, sử dụng từ 3 nguồn: TLU API, CF (CSV), và Gemini AI.
     """
-    progress_data, error = get_ALL_marks_data(student_id) 
+    if cf_model.status() == ModelHolder.WARMING:
+        return cf_warming_response()
+    progress_data, error = await get_ALL_marks_data_async(student_id) 
     if error:
         return jsonify({"message": error}), 500
     
@@ -450,16 +729,50 @@ def get_recommendation(student_id):
         student_id_int = None
         print(f"Cảnh báo: student_id {student_id} không phải là số, không thể dùng mô hình CF.")
 
-    recommendations = get_recommendation_logic(
+    recommendations = await get_recommendation_logic_async(
         progress_data,
         student_id_int, 
-        cf_model_data,
+        cf_model.get(),
         materials_db  # materials_db này có thể bị bỏ qua nếu logic dùng AI
     )
     
     return jsonify(recommendations)
 
 
+@app.route('/api/recommendation/batch', methods=['POST'])
+def get_recommendation_batch():
+    """ 
+    API gợi ý 'Khám phá' (CF) cho cả lớp/khoa — dùng cho báo cáo hằng đêm của cố vấn.
+    Body: {"student_ids": [...], "num_recs": 5}
+    """
+    data = request.get_json(silent=True) or {}
+    student_ids = data.get("student_ids")
+    if not isinstance(student_ids, list) or not student_ids:
+        return jsonify({"message": "Vui lòng cung cấp danh sách student_ids."}), 400
+    if cf_model.status() == ModelHolder.WARMING:
+        return cf_warming_response()
+    model = cf_model.get()
+    if model is None:
+        return jsonify({"message": "Mô hình CF chưa sẵn sàng."}), 503
+
+    valid_ids, invalid_ids = [], []
+    for sid in student_ids:
+        try:
+            valid_ids.append(int(sid))
+        except (TypeError, ValueError):
+            invalid_ids.append(sid)
+
+    try:
+        num_recs = int(data.get("num_recs", 5))
+    except (TypeError, ValueError):
+        return jsonify({"message": "num_recs phải là số nguyên."}), 400
+    recommendations = get_cf_recommendations_batch(valid_ids, model, num_recs=num_recs)
+    return jsonify({
+        "recommendations": {str(sid): recs for sid, recs in recommendations.items()},
+        "invalid_student_ids": invalid_ids
+    })
+
+
 # =========================================================
 # 🧠 SỬA LỖI LOGIC: API /api/insight PHẢI LẤY ĐÚNG student_id
 # =========================================================
@@ -495,13 +808,22 @@ def predict_future(student_id):
     except Exception as e:
         return jsonify({"message": f"Lỗi khi tạo DataFrame từ tiến độ: {e}"}), 500
 
-    predictions = predict_future_logic(progress_data) 
+    predictions = predict_future_logic(progress_data, student_id=student_id)
+
+    # Dự đoán điểm các môn đang học bằng mô hình MLP (nếu đã có lịch học trong cache)
+    schedule_data = get_from_cache(student_id, "schedule")
+    if schedule_data is not None:
+        try:
+            # Dict mới: `predictions` là đối tượng đang nằm trong cache dự báo, không được sửa tại chỗ
+            predictions = {**predictions, "score_predictions": predict_course_scores(schedule_data, progress_data)}
+        except Exception as e:
+            print(f"LỖI: Không thể dự đoán điểm bằng mô hình MLP. Lý do: {e}")
     return jsonify(predictions)
 
 
 # --- API CHO TRANG "CÁC MÔN ĐANG HỌC" ---
 @app.route('/api/current-schedule/<student_id>', methods=['GET'])
-def get_current_schedule(student_id):
+async def get_current_schedule(student_id):
     """
     API lấy danh sách các môn đang học (cho trang SchedulePage.js)
     """
@@ -515,11 +837,12 @@ def get_current_schedule(student_id):
 
     access_token = session.get("access_token")
 
-    current_semester_id = fetch_current_semester_id(access_token)
-    if not current_semester_id:
-        return jsonify({"error": "Không thể lấy dữ liệu học kỳ hiện tại."}), 500
+    async with tlu_client() as client:
+        current_semester_id = await fetch_current_semester_id_async(access_token, client=client)
+        if not current_semester_id:
+            return jsonify({"error": "Không thể lấy dữ liệu học kỳ hiện tại."}), 500
 
-    schedule_data = fetch_student_schedule(access_token, current_semester_id)
+        schedule_data = await fetch_student_schedule_async(access_token, current_semester_id, client=client)
     
     if schedule_data is None: 
         return jsonify({"error": "Không thể lấy dữ liệu lịch học."}), 500
@@ -531,23 +854,64 @@ def get_current_schedule(student_id):
     return jsonify(processed_schedule.to_dict(orient='records'))
 
 
+YOUTUBE_ENDPOINT_RESULTS = 5
+
+
 @app.route('/api/youtube/<keyword>', methods=['GET'])
 def youtube_search(keyword):
-    """API tìm kiếm video YouTube có cache"""
-    videos = get_youtube_videos_with_cache(keyword)
+    """API tìm kiếm video YouTube (cùng cache, khóa và dạng kết quả với gợi ý của recommender)"""
+    videos = search_youtube_videos(keyword, max_results=YOUTUBE_ENDPOINT_RESULTS)
     if not videos:
         return jsonify({"message": "Không tìm thấy video"}), 404
     return jsonify(videos)
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """ Thống kê cache L1 (hit/miss/eviction) và làm mới nền """
+    with _refresh_lock:
+        refresh = dict(refresh_stats, inflight=len(_refreshing))
+    return jsonify({
+        "api_l1_cache": api_l1_cache.stats(),
+        "refresh": refresh,
+        "prewarm": prewarm_scheduler.stats(),
+        "kv_cache": get_cache().stats(),
+        "youtube": youtube_stats(),
+        "ai": ai_stats(),
+        "grade_feed": dict(grade_feed_stats)
+    })
+
+
+@app.route('/api/models/status', methods=['GET'])
+def models_status():
+    """ Trạng thái nạp mô hình (warming/ready/failed) """
+    return jsonify({"cf": cf_model.stats(), "score": score_model.stats()})
+
+
 @app.route('/')
 def home():
     return jsonify({"message": "Smart Learning System Backend Ready (TLU Integrated) 🚀"})
 
 
-if __name__ == '__main__':
+def migrate_cache_db():
+    """
+    Tạo/nâng cấp bảng cache và chuyển các bảng cache cũ sang kv_cache. Gọi tường
+    minh khi khởi động server hoặc bằng `flask --app app migrate-cache`, không
+    chạy khi import. Chạy lại nhiều lần không sao.
+    """
     init_db()
-    init_youtube_cache_db()  
-    init_ai_cache_db() 
-    clean_expired_youtube_cache() 
+    migrate_legacy_caches()
+    drop_legacy_cache_tables()
+    clean_expired_cache()
+
+
+@app.cli.command("migrate-cache")
+def migrate_cache_command():
+    """ Tạo bảng cache và chuyển/xóa các bảng cache cũ. """
+    migrate_cache_db()
+
+
+if __name__ == '__main__':
+    migrate_cache_db()
+    start_background_jobs()
     app.run(debug=True, port=5000)
@@ -0,0 +1,291 @@
+"""
+Đồng bộ hàng loạt nhiều sinh viên vào smart_learning.db (thay cho việc gõ tay
+từng tài khoản ở data_synchronizer.initial_setup_and_sync).
+
+- Đầu vào: file CSV có dòng tiêu đề, mỗi dòng một sinh viên với cột
+  `username,password` (đăng nhập TLU) hoặc `access_token` (token có sẵn).
+- Một pool worker có giới hạn lo phần mạng (đăng nhập, lấy thông tin, đọc dần
+  bảng điểm) và dựng sẵn StudentBatch; mọi lời gọi TLU đi qua HostRateLimiter
+  (token bucket riêng cho mỗi host).
+- MỘT thread ghi duy nhất giữ kết nối SQLite và ghi từng lô
+  (write_student_batch: một transaction cho mỗi sinh viên), nên các worker
+  không tranh khóa ghi của SQLite. Hàng đợi giữa hai bên có giới hạn: khi ghi
+  chậm, worker phải chờ thay vì dồn bảng điểm trong RAM.
+- Đồng bộ theo delta: sinh viên có bảng điểm không đổi (trùng hash lần trước)
+  không bị ghi lại điểm; điểm thay đổi được ghi vào grade_changes (cuối lượt
+  xóa các dòng cũ hơn GRADE_CHANGES_RETENTION_DAYS ngày).
+- Checkpoint: sau khi lô của một sinh viên commit xong, khóa của dòng đó được
+  ghi thêm vào file checkpoint; chạy lại với cùng file sẽ bỏ qua các dòng đã
+  xong (dòng lỗi không được ghi nên sẽ được thử lại). Lượt chạy hết mà không
+  có dòng lỗi và không bị dừng giữa chừng thì xóa file checkpoint, để lần đồng
+  bộ định kỳ sau (cùng lệnh) lại đồng bộ toàn bộ.
+
+    python batch_sync.py lop_64HTTT.csv [--workers 8] [--rate 5] [--db smart_learning.db]
+    TLU_BASE_URL=http://127.0.0.1:8765 python batch_sync.py accounts.csv   # chạy với benchmarks/tlu_stub.py
+"""
+import argparse
+import contextlib
+import csv
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from data_synchronizer import (
+    DATABASE_NAME,
+    StudentBatch,
+    create_connection,
+    create_tables,
+    write_student_batch,
+)
+from grade_feed import prune_grade_changes
+from http_client import HostRateLimiter, tlu_url
+from tlu_api_handler import authenticate_tlu, fetch_student_data, iter_student_marks
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 5.0  # lời gọi/giây cho mỗi host
+PROGRESS_INTERVAL = 2.0  # giây
+LOG_TYPE = "BATCH_SYNC"
+
+
+class SyncError(Exception):
+    """ Lỗi đồng bộ một sinh viên (không dừng cả lượt). """
+
+
+def account_key(account):
+    """ Khóa checkpoint của một dòng: username, hoặc hash của token (không lưu token ra file). """
+    if account.get("username"):
+        return account["username"]
+    return "token:" + hashlib.sha256(account["access_token"].encode("utf-8")).hexdigest()[:16]
+
+
+def load_accounts(path):
+    """ Đọc file CSV tài khoản. Bỏ qua dòng trống/thiếu dữ liệu, trùng khóa chỉ giữ dòng đầu. """
+    accounts = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = set(reader.fieldnames or ())
+        if not ({"username", "password"} <= columns or "access_token" in columns):
+            raise ValueError(f"{path}: cần cột 'username,password' hoặc 'access_token'")
+        for row in reader:
+            account = {key: (row.get(key) or "").strip()
+                       for key in ("username", "password", "access_token")}
+            if not account["access_token"] and not (account["username"] and account["password"]):
+                continue
+            accounts.setdefault(account_key(account), account)
+    return accounts
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def fetch_account(account, limiter):
+    """ Phần mạng của một sinh viên (chạy trong worker): trả về StudentBatch sẵn sàng để ghi. """
+    token = account["access_token"]
+    if not token:
+        limiter.acquire(tlu_url("/education/oauth/token"))
+        token = authenticate_tlu(account["username"], account["password"])
+        if not token:
+            raise SyncError("đăng nhập thất bại")
+
+    limiter.acquire(tlu_url("/education/api/users/getCurrentUser"))
+    student_info = fetch_student_data(token)
+    batch = StudentBatch()
+    if not student_info or not batch.add_student(student_info):
+        raise SyncError("không lấy được thông tin sinh viên")
+
+    limiter.acquire(tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent"))
+    try:
+        batch.add_marks(iter_student_marks(token))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise SyncError(f"lỗi đọc bảng điểm: {e}") from e
+    batch.add_log(LOG_TYPE, student_info)
+    return batch
+
+
+class BatchSync:
+    """ Điều phối pool worker (mạng) và thread ghi duy nhất (SQLite). """
+
+    def __init__(self, db_file=DATABASE_NAME, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, burst=None,
+                 checkpoint=None, progress_interval=PROGRESS_INTERVAL, log=None):
+        self.db_file = db_file
+        self.workers = workers
+        self.limiter = HostRateLimiter(rate, burst)
+        self.checkpoint = checkpoint
+        self.progress_interval = progress_interval
+        self.log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+
+        self._queue = queue.Queue(maxsize=workers * 2)
+        self._stop = threading.Event()
+        self.total = 0
+        self.skipped = 0
+        self.succeeded = 0
+        self.failures = {}  # khóa -> lý do
+        self.rows = 0
+        self.grade_changes = 0
+        self.unchanged = 0  # sinh viên có bảng điểm trùng hash lần trước (không ghi điểm)
+        self._started = None
+        self._last_progress = 0.0
+        self._last_done = None
+
+    # --- worker (mạng) ---
+
+    def _fetch(self, key, account):
+        if self._stop.is_set():
+            return
+        try:
+            item = (key, fetch_account(account, self.limiter), None)
+        except SyncError as e:
+            item = (key, None, str(e))
+        except Exception as e:  # lỗi không lường trước của một sinh viên không được làm dừng cả lượt
+            item = (key, None, f"lỗi không xác định: {e}")
+        self._queue.put(item)
+
+    # --- thread ghi (SQLite) ---
+
+    def _writer(self):
+        conn = create_connection(self.db_file)
+        if conn is None:
+            self._stop.set()
+            while self._queue.get() is not None:  # vẫn nhận hết để worker không bị chặn
+                pass
+            return
+        create_tables(conn)
+        checkpoint = open(self.checkpoint, "a", encoding="utf-8") if self.checkpoint else None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                key, batch, error = item
+                if batch is not None and not write_student_batch(conn, batch):
+                    error = "lỗi ghi CSDL"
+                if error:
+                    self.failures[key] = error
+                else:
+                    self.succeeded += 1
+                    self.rows += batch.row_count
+                    self.grade_changes += batch.changes
+                    self.unchanged += batch.unchanged
+                    if checkpoint:
+                        checkpoint.write(key + "\n")
+                        checkpoint.flush()
+                self._report_progress()
+            prune_grade_changes(conn)
+        finally:
+            if checkpoint:
+                checkpoint.close()
+            conn.close()
+
+    def _report_progress(self, force=False):
+        now = time.monotonic()
+        done = self.succeeded + len(self.failures)
+        if force and done == self._last_done:
+            return  # dòng tiến độ cuối đã in
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress, self._last_done = now, done
+        pending = self.total - self.skipped
+        elapsed = now - self._started
+        speed = done / elapsed if elapsed else 0.0
+        eta = f"{(pending - done) / speed:.0f} s" if speed else "?"
+        self.log(f"[{done}/{pending}] thành công {self.succeeded}, lỗi {len(self.failures)}, "
+                 f"{self.unchanged} không đổi, {self.grade_changes} điểm thay đổi | {speed:.1f} SV/giây, còn lại ~{eta}")
+
+    # --- điều phối ---
+
+    def run(self, accounts):
+        """ Đồng bộ {khóa: tài khoản}. Ctrl+C dừng êm: các lô đã tải xong vẫn được ghi và checkpoint. """
+        done = load_checkpoint(self.checkpoint)
+        self.total = len(accounts)
+        pending = [(key, account) for key, account in accounts.items() if key not in done]
+        self.skipped = self.total - len(pending)
+        if self.skipped:
+            self.log(f"Bỏ qua {self.skipped} sinh viên đã đồng bộ (checkpoint {self.checkpoint}).")
+
+        self._started = time.monotonic()
+        writer = threading.Thread(target=self._writer, name="batch-sync-writer", daemon=True)
+        writer.start()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-sync")
+        interrupted = False
+        try:
+            for key, account in pending:
+                executor.submit(self._fetch, key, account)
+            executor.shutdown(wait=True)
+        except KeyboardInterrupt:
+            self.log("⚠️ Đang dừng: chờ các sinh viên đang tải dở rồi ghi checkpoint...")
+            interrupted = True
+            self._stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        finally:
+            self._queue.put(None)
+            writer.join()
+        self._report_progress(force=True)
+        if not interrupted and not self._stop.is_set() and not self.failures:
+            self._clear_checkpoint()
+        return self.stats()
+
+    def _clear_checkpoint(self):
+        """ Lượt chạy đã xong hết: xóa checkpoint để lần chạy sau không bỏ qua ai. """
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+            self.log(f"Đã đồng bộ xong toàn bộ, xóa checkpoint {self.checkpoint}.")
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": len(self.failures),
+            "rows": self.rows,
+            "unchanged": self.unchanged,
+            "grade_changes": self.grade_changes,
+            "seconds": round(elapsed, 3),
+            "students_per_second": round(self.succeeded / elapsed, 2) if elapsed else None,
+            "rate_limit_wait_seconds": round(self.limiter.waited_seconds, 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đồng bộ hàng loạt sinh viên TLU vào smart_learning.db")
+    parser.add_argument("accounts", help="file CSV: cột username,password hoặc access_token")
+    parser.add_argument("--db", default=DATABASE_NAME)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="số lời gọi/giây tối đa cho mỗi host")
+    parser.add_argument("--burst", type=float, default=None)
+    parser.add_argument("--checkpoint", default=None, help="mặc định: <accounts>.checkpoint")
+    parser.add_argument("--quiet", action="store_true", help="ẩn log của từng lời gọi TLU, chỉ in tiến độ")
+    args = parser.parse_args()
+
+    try:
+        accounts = load_accounts(args.accounts)
+    except (OSError, ValueError) as e:
+        print(f"❌ Không đọc được file tài khoản: {e}")
+        sys.exit(2)
+
+    sync = BatchSync(args.db, workers=args.workers, rate=args.rate, burst=args.burst,
+                     checkpoint=args.checkpoint or f"{args.accounts}.checkpoint")
+    with open(os.devnull, "w") as devnull, \
+            (contextlib.redirect_stdout(devnull) if args.quiet else contextlib.nullcontext()):
+        stats = sync.run(accounts)
+
+    print(f"✅ Xong: {stats['succeeded']} thành công, {stats['failed']} lỗi, {stats['skipped']} bỏ qua, "
+          f"{stats['unchanged']} không đổi, {stats['grade_changes']} điểm thay đổi trong {stats['seconds']} s.")
+    for key, reason in sync.failures.items():
+        print(f"   ❌ {key}: {reason}")
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
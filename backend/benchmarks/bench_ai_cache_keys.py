@@ -0,0 +1,51 @@
+"""
+Benchmark: tỉ lệ trúng cache nội dung Gemini theo cách tạo khóa — khóa cũ
+f"AI_GEMINI_{môn}_{tiến độ}" so với khóa mới (tên môn chuẩn hóa + dải tiến độ +
+phiên bản prompt), trên một khóa sinh viên giả lập (mỗi môn < 70% là một lần tra).
+
+Tên môn được viết lại ngẫu nhiên (hoa/thường, khoảng trắng thừa) như dữ liệu
+TLU thực tế giữa các lớp/học kỳ.
+
+    python benchmarks/bench_ai_cache_keys.py [--students 2000] [--courses 120]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import make_cohort  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from recommender import ai_cache_key  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=120)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    variants = [str.title, str.lower, str.upper, lambda name: f" {name}", lambda name: name.replace(" ", "  ")]
+    cohort = make_cohort(args.students, args.courses)
+    lookups = [
+        (rng.choice(variants)(f"Giải tích và đại số {course.rsplit(' ', 1)[-1]}"), int(score * 10))
+        for course, score in zip(cohort["Tên Môn Học"], cohort["Điểm Tổng Kết (10)"])
+        if int(score * 10) < 70
+    ]
+    strategies = {
+        "khóa cũ": lambda course, progress: f"AI_GEMINI_{course}_{progress}",
+        "khóa mới": ai_cache_key,
+    }
+    print(f"{len(lookups)} lượt tra nội dung AI ({args.students} sinh viên, {args.courses} môn)")
+    for label, make_key in strategies.items():
+        distinct = len({make_key(course, progress) for course, progress in lookups})
+        print(f"  {label:8}: {distinct:6d} lần gọi Gemini | tỉ lệ trúng cache {1 - distinct / len(lookups):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark/kiểm tra batch_sync với stub TLU cục bộ (có độ trễ giả lập).
+
+1. Thời gian đồng bộ cả lớp với 1 worker và với pool N worker (rate limit rộng).
+2. Rate limit: với --rate thấp, số lời gọi/giây thực tế tới stub không vượt giới hạn.
+3. Checkpoint: lượt đầu dừng giữa chừng (chỉ nửa lớp), lượt sau chỉ đồng bộ phần
+   còn lại; tài khoản sai mật khẩu bị báo lỗi và được thử lại ở lượt sau.
+
+    python benchmarks/bench_batch_sync.py [--students 200] [--workers 8] [--latency 0.05]
+"""
+import argparse
+import contextlib
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tlu_stub import start_stub  # noqa: E402
+
+server, state, base_url = start_stub(latency=0.0, num_subjects=40)
+os.environ["TLU_BASE_URL"] = base_url
+import batch_sync  # noqa: E402
+
+WRONG_PASSWORDS = 3
+
+
+def write_accounts(path, num_students):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["username", "password"])
+        for i in range(num_students):
+            writer.writerow([f"22511{i:05d}", "wrong" if i < WRONG_PASSWORDS else "secret"])
+
+
+def run(accounts, db_file, workers, rate, checkpoint=None):
+    sync = batch_sync.BatchSync(db_file, workers=workers, rate=rate, checkpoint=checkpoint,
+                                log=lambda message: None)
+    requests_before = state.requests
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stats = sync.run(accounts)
+    stats["tlu_requests"] = state.requests - requests_before
+    return stats
+
+
+def grade_count(db_file):
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute("SELECT COUNT(*), COUNT(DISTINCT student_id) FROM grades").fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=20.0, help="giới hạn cho phần kiểm tra rate limit")
+    args = parser.parse_args()
+
+    state.latency = args.latency
+    workdir = tempfile.mkdtemp()
+    accounts_file = os.path.join(workdir, "accounts.csv")
+    write_accounts(accounts_file, args.students)
+    accounts = batch_sync.load_accounts(accounts_file)
+    print(f"{len(accounts)} tài khoản ({WRONG_PASSWORDS} sai mật khẩu), độ trễ stub {args.latency * 1000:.0f} ms/request")
+
+    print("1. Pool worker (rate limit rộng):")
+    for workers in (1, args.workers):
+        db_file = os.path.join(workdir, f"pool_{workers}.db")
+        stats = run(accounts, db_file, workers, rate=10_000)
+        print(f"   {workers:2d} worker: {stats['seconds']:6.2f} s, {stats['students_per_second']:6.1f} SV/giây, "
+              f"thành công {stats['succeeded']}, lỗi {stats['failed']}, grades {grade_count(db_file)}")
+
+    print(f"2. Rate limit {args.rate:g} lời gọi/giây:")
+    subset = dict(list(accounts.items())[:40])
+    start = time.monotonic()
+    stats = run(subset, os.path.join(workdir, "rate.db"), args.workers, rate=args.rate)
+    elapsed = time.monotonic() - start
+    burst = max(1.0, args.rate)  # dung lượng mặc định của RateLimiter
+    print(f"   {stats['tlu_requests']} lời gọi trong {elapsed:.2f} s; trừ {burst:g} lượt burst ban đầu: "
+          f"{(stats['tlu_requests'] - burst) / elapsed:.1f}/giây, chờ rate limit {stats['rate_limit_wait_seconds']} s")
+
+    print("3. Checkpoint/resume:")
+    db_file = os.path.join(workdir, "resume.db")
+    checkpoint = os.path.join(workdir, "accounts.csv.checkpoint")
+    half = dict(list(accounts.items())[:len(accounts) // 2])
+    first = run(half, db_file, args.workers, rate=10_000, checkpoint=checkpoint)
+    second = run(accounts, db_file, args.workers, rate=10_000, checkpoint=checkpoint)
+    print(f"   lượt 1 (dừng giữa chừng): thành công {first['succeeded']}, lỗi {first['failed']}")
+    print(f"   lượt 2: bỏ qua {second['skipped']}, thành công {second['succeeded']}, lỗi {second['failed']}, "
+          f"grades {grade_count(db_file)}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
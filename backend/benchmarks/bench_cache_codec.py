@@ -0,0 +1,52 @@
+"""
+Benchmark: codec của bảng api_cache — thời gian mã hóa/giải mã và kích thước
+blob cho payload điểm thực tế (DataFrame tiến độ tạo từ dữ liệu điểm TLU).
+
+    python benchmarks/bench_cache_codec.py [--subjects 40 200] [--iterations 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import cache_codec  # noqa: E402
+from tlu_stub import make_marks, make_schedule  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from recommender import process_schedule_to_courses, process_tlu_data_to_progress  # noqa: E402
+
+
+def measure(fn, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subjects", type=int, nargs="+", default=[40, 200])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    codecs = ["json", "columnar"] + (["arrow"] if cache_codec.arrow_available() else [])
+    payloads = {f"marks x{n}": process_tlu_data_to_progress(make_marks(n), "2251162052") for n in args.subjects}
+    payloads["schedule x6"] = process_schedule_to_courses(make_schedule(6), "2251162052")
+
+    for label, df in payloads.items():
+        print(f"{label} ({len(df)} dòng, {len(df.columns)} cột)")
+        for name in codecs:
+            encode, decode = cache_codec.CODECS[name]
+            blob = encode(df)
+            same = decode(blob).equals(df)
+            print(f"  {name:9}: encode {measure(encode, df, args.iterations):8.1f} µs | "
+                  f"decode {measure(decode, blob, args.iterations):8.1f} µs | "
+                  f"{len(blob):6d} byte | giữ kiểu: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark: gợi ý CF cho cả khóa — lặp `get_cf_recommendations` từng sinh viên
+so với `get_cf_recommendations_batch` (vector hóa) trên dữ liệu giả lập.
+
+    python benchmarks/bench_cf_batch.py [--students 10000] [--courses 120]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from cf_index import build_cf_index  # noqa: E402
+from recommender import get_cf_recommendations, get_cf_recommendations_batch  # noqa: E402
+from synthetic_data import make_cohort  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--courses", type=int, default=120)
+    args = parser.parse_args()
+
+    cohort = make_cohort(args.students, args.courses)
+    start = time.perf_counter()
+    index = build_cf_index(cohort)
+    print(f"build index: {len(index)} sinh viên, {len(index.courses)} môn, {time.perf_counter() - start:.2f}s")
+
+    student_ids = [int(sid) for sid in index.student_ids]
+
+    start = time.perf_counter()
+    looped = {sid: get_cf_recommendations(sid, index) for sid in student_ids}
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = get_cf_recommendations_batch(student_ids, index)
+    batch_time = time.perf_counter() - start
+
+    same = sum(looped[sid] == batched[sid] for sid in student_ids)
+    print(f"loop  : {loop_time:7.2f}s  ({len(student_ids) / loop_time:9.0f} sinh viên/s)")
+    print(f"batch : {batch_time:7.2f}s  ({len(student_ids) / batch_time:9.0f} sinh viên/s)  x{loop_time / batch_time:.1f}")
+    print(f"kết quả trùng khớp: {same}/{len(student_ids)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: đồng bộ theo delta (hash bảng điểm + upsert chỉ khi điểm khác) so với
+ghi lại toàn bộ điểm bằng INSERT OR REPLACE mỗi lượt, trên khóa sinh viên giả lập.
+
+Các lượt: đồng bộ đầu tiên, đồng bộ lại không có gì đổi, rồi đồng bộ lại khi một
+phần sinh viên có một điểm thay đổi (--changed). Đo thời gian, grade_id lớn nhất
+(REPLACE xóa rồi chèn lại nên grade_id tăng mãi), kích thước file CSDL và số dòng
+ghi vào grade_changes. Chạy từ thư mục backend/:
+
+    python benchmarks/bench_delta_sync.py [--students 10000] [--changed 0.02]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import data_synchronizer  # noqa: E402
+from bench_sync_write import build_batch, make_payloads  # noqa: E402
+
+SQL_REPLACE_GRADE = """
+    INSERT OR REPLACE INTO grades (student_id, subject_id, semester, score)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+def write_full_rewrite(conn, batch):
+    """ Cách cũ: ghi lại mọi điểm của sinh viên bằng INSERT OR REPLACE (một transaction). """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(data_synchronizer.SQL_UPSERT_STUDENT, batch.students)
+        conn.executemany(data_synchronizer.SQL_INSERT_SUBJECT, batch.subjects.values())
+        conn.executemany(SQL_REPLACE_GRADE, batch.grades)
+        conn.executemany(data_synchronizer.SQL_INSERT_LOG, batch.logs)
+
+
+def write_delta(conn, batch):
+    data_synchronizer.write_student_batch(conn, batch)
+
+
+def change_some_scores(payloads, fraction, seed=1):
+    """ Bản sao payload trong đó `fraction` số sinh viên có đúng một điểm thay đổi. """
+    rng = random.Random(seed)
+    changed = copy.deepcopy(payloads)
+    for _, marks in rng.sample(changed, int(len(changed) * fraction)):
+        mark = rng.choice(marks)
+        mark["mark"] = round(10.0 - mark["mark"] + 0.1, 1)
+    return changed
+
+
+def db_size(db_file):
+    return sum(os.path.getsize(path) for path in (db_file, db_file + "-wal") if os.path.exists(path))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--changed", type=float, default=0.02, help="tỉ lệ sinh viên có điểm thay đổi ở lượt 3")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.students)
+    passes = [
+        ("đầu tiên", payloads),
+        ("không đổi", payloads),
+        (f"{args.changed:.0%} SV đổi điểm", change_some_scores(payloads, args.changed)),
+    ]
+    print(f"{len(payloads)} sinh viên, {sum(len(marks) for _, marks in payloads)} điểm")
+    workdir = tempfile.mkdtemp()
+    for label, write in (("ghi lại toàn bộ", write_full_rewrite), ("delta", write_delta)):
+        db_file = os.path.join(workdir, f"{write.__name__}.db")
+        conn = data_synchronizer.create_connection(db_file)
+        data_synchronizer.create_tables(conn)
+        print(f"{label}:")
+        for pass_label, data in passes:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for info, marks in data:
+                    write(conn, build_batch(info, marks))
+            elapsed = time.perf_counter() - start
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            max_grade_id, feed = conn.execute(
+                "SELECT (SELECT MAX(grade_id) FROM grades), (SELECT COUNT(*) FROM grade_changes)").fetchone()
+            print(f"  {pass_label:16}: {elapsed:6.2f} s | grade_id lớn nhất {max_grade_id:8d} | "
+                  f"CSDL {db_size(db_file) / 2**20:6.1f} MiB | grade_changes {feed}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: thời gian import `app` (khởi động server) đo bằng `python -X importtime`.
+
+In tổng thời gian và các module tốn nhiều nhất; với --budget-ms, thoát mã 1
+nếu vượt ngân sách (dùng làm cổng kiểm tra trong CI).
+
+    python benchmarks/bench_import_time.py [--budget-ms 1500] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_imports(module="app"):
+    """
+    Trả về (thời gian import tính bằng ms, danh sách (cumulative µs, tên module)).
+    Tổng đo bằng đồng hồ trong tiến trình con vì các thread nạp nền có thể làm
+    lệch cây lồng nhau của -X importtime.
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print('IMPORT_MS', (time.perf_counter() - t) * 1000)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import {module} thất bại:\n{proc.stderr[-2000:]}")
+
+    total_ms = next(float(line.split()[1]) for line in proc.stdout.splitlines() if line.startswith("IMPORT_MS"))
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if name != module and "." not in name:
+            modules.append((int(parts[1]), name))
+    return total_ms, sorted(modules, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total_ms, modules = measure_imports(args.module)
+    print(f"import {args.module}: {total_ms:.0f} ms")
+    for us, name in modules[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"❌ Vượt ngân sách {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: lấy bảng điểm TLU — `fetch_student_marks` (response.json() cả tài
+liệu) so với `fetch_student_mark_records` (đọc dần + chỉ giữ trường cần dùng),
+với bảng điểm đầy đủ trường chi tiết từ stub cục bộ. Đo bộ nhớ đỉnh
+(tracemalloc), bộ nhớ còn giữ sau khi trả về và thời gian. Stub chạy ở tiến
+trình riêng để tracemalloc chỉ đo phía client.
+
+    python benchmarks/bench_mark_stream.py [--subjects 200 2000 8000]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tlu_stub.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def stub_process(port, subjects):
+    process = subprocess.Popen(
+        [sys.executable, STUB, "--port", str(port), "--subjects", str(subjects), "--mark-details"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                break
+            time.sleep(0.05)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def measure_memory(fetch, token):
+    gc.collect()
+    tracemalloc.start()
+    data = fetch.__wrapped__(token)  # bỏ qua single-flight
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, peak, retained
+
+
+def measure_time(fetch, token, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fetch.__wrapped__(token)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subjects", type=int, nargs="+", default=[200, 2000, 8000])
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["TLU_BASE_URL"] = f"http://127.0.0.1:{port}"
+    import tlu_api  # tlu_api gọi sys.stdout.reconfigure nên không import trong redirect_stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        from recommender import process_tlu_data_to_progress
+        from tlu_stream import slim_mark
+
+    mib = 1024 * 1024
+    for subjects in args.subjects:
+        with stub_process(port, subjects), contextlib.redirect_stdout(io.StringIO()):
+            full, full_peak, full_kept = measure_memory(tlu_api.fetch_student_marks, "stub-2251162052")
+            slim, slim_peak, slim_kept = measure_memory(tlu_api.fetch_student_mark_records, "stub-2251162052")
+            same = slim == [slim_mark(item) for item in full] and process_tlu_data_to_progress(full, "1").equals(
+                process_tlu_data_to_progress(slim, "1"))
+            full_time = measure_time(tlu_api.fetch_student_marks, "stub-2251162052")
+            slim_time = measure_time(tlu_api.fetch_student_mark_records, "stub-2251162052")
+        print(f"{subjects} môn:")
+        print(f"  response.json(): đỉnh {full_peak / mib:7.2f} MiB | giữ lại {full_kept / mib:7.2f} MiB | {full_time * 1000:7.1f} ms")
+        print(f"  stream + rút gọn: đỉnh {slim_peak / mib:7.2f} MiB | giữ lại {slim_kept / mib:7.2f} MiB | "
+              f"{slim_time * 1000:7.1f} ms | cùng kết quả: {same}")
+
+
+if __name__ == "__main__":
+    main()
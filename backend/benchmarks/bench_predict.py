@@ -0,0 +1,91 @@
+"""
+Benchmark: `predict_future_logic` — bản cũ (iterrows + LinearRegression mỗi môn)
+so với bản vector hóa dạng đóng, và lần gọi lặp lại (trúng cache theo sinh viên).
+
+    python benchmarks/bench_predict.py [--students 200] [--courses 60]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recommender import (  # noqa: E402
+    _progress_fingerprint, forecast_next_week, predict_future_logic, simulate_progress_history
+)
+
+
+def legacy_predict_future_logic(progress_data):
+    """ Bản trước khi vector hóa (giữ nguyên để so sánh). """
+    from sklearn.linear_model import LinearRegression
+    future_preds = []
+    for _, row in progress_data.iterrows():
+        current_progress = float(row["progress"])
+        past_scores = np.clip(np.random.normal(current_progress, 5, size=5), 40, 100)
+        X = np.arange(1, 6).reshape(-1, 1)
+        model = LinearRegression().fit(X, past_scores)
+        next_week = float(model.predict([[6]])[0])
+        future_preds.append({
+            "course": row["course"],
+            "predicted_progress": round(next_week, 1),
+            "risk": round(max(0, min(100, 100 - next_week)), 1)
+        })
+    return {"predictions": sorted(future_preds, key=lambda x: -x["risk"])}
+
+
+def make_students(num_students, num_courses, seed=7):
+    rng = np.random.default_rng(seed)
+    return {
+        str(2251160000 + i): pd.DataFrame({
+            "course": [f"Môn {j}" for j in range(num_courses)],
+            "progress": rng.uniform(30, 100, size=num_courses).round(1),
+        })
+        for i in range(num_students)
+    }
+
+
+def check_closed_form(progress_data):
+    """ Hệ số dạng đóng phải khớp LinearRegression trên cùng lịch sử. """
+    from sklearn.linear_model import LinearRegression
+    progress = progress_data["progress"].to_numpy(dtype=float)
+    history = simulate_progress_history(progress, _progress_fingerprint(progress_data["course"].tolist(), progress))
+    X = np.arange(1, 6).reshape(-1, 1)
+    expected = np.array([LinearRegression().fit(X, row).predict([[6]])[0] for row in history])
+    return float(np.max(np.abs(expected - forecast_next_week(history))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--courses", type=int, default=60)
+    args = parser.parse_args()
+    students = make_students(args.students, args.courses)
+
+    legacy_predict_future_logic(next(iter(students.values())))  # nạp sklearn trước khi đo
+    start = time.perf_counter()
+    for df in students.values():
+        legacy_predict_future_logic(df)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = {sid: predict_future_logic(df, student_id=sid) for sid, df in students.items()}
+    vector_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    again = {sid: predict_future_logic(df, student_id=sid) for sid, df in students.items()}
+    cached_time = time.perf_counter() - start
+
+    print(f"{args.students} sinh viên x {args.courses} môn")
+    print(f"cũ (sklearn/môn): {legacy_time * 1000 / args.students:8.2f} ms/sinh viên")
+    print(f"vector hóa      : {vector_time * 1000 / args.students:8.2f} ms/sinh viên  x{legacy_time / vector_time:.0f}")
+    print(f"trúng cache     : {cached_time * 1000 / args.students:8.3f} ms/sinh viên")
+    deterministic = all(predict_future_logic(df) == first[sid] for sid, df in students.items())  # tính lại, không cache
+    print(f"tất định: {deterministic and first == again}  | sai lệch tối đa so với LinearRegression: "
+          f"{check_closed_form(next(iter(students.values()))):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: mô hình dự đoán điểm — runtime NumPy (score_mlp.npz) so với Keras.
+
+Mỗi runtime chạy trong một tiến trình con riêng để đo đúng thời gian nạp và
+bộ nhớ (RSS tối đa). Bỏ qua Keras nếu chưa cài.
+
+    python benchmarks/bench_score_model.py [--requests 2000] [--rows 6]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def run_runtime(runtime, num_requests, rows):
+    """ Chạy trong tiến trình con: nạp runtime, đo độ trễ từng request; in kết quả dạng JSON. """
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    import score_model
+    from export_score_model import sample_inputs
+    loader = score_model.load_numpy_artifacts if runtime == "numpy" else score_model.load_keras_artifacts
+    predict, standardizer, label_encoder = loader()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    x = (sample_inputs(label_encoder.classes_, num_rows=rows) - standardizer.mean_) / standardizer.scale_
+    predict(x)  # lần đầu (khởi tạo) không tính
+    latencies = []
+    for _ in range(num_requests):
+        t = time.perf_counter()
+        predict(x)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    print(json.dumps({
+        "load_ms": load_ms,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=6, help="số môn mỗi request")
+    parser.add_argument("--child", choices=["numpy", "keras"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_runtime(args.child, args.requests, args.rows)
+
+    print(f"{args.requests} request x {args.rows} môn")
+    for runtime in ("numpy", "keras"):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", runtime, "--requests", str(args.requests), "--rows", str(args.rows)],
+            cwd=BACKEND_DIR, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{runtime:6}: bỏ qua ({proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'lỗi'})")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{runtime:6}: nạp {result['load_ms']:8.0f} ms | p50 {result['p50_ms']:7.3f} ms | "
+              f"p95 {result['p95_ms']:7.3f} ms | RSS tăng thêm {result['rss_mb']:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
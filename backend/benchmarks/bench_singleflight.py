@@ -0,0 +1,83 @@
+"""
+Benchmark: single-flight cho các lời gọi TLU khi dashboard tải lạnh.
+
+Mô phỏng Dashboard bắn đồng thời /api/progress, /api/insight, /api/predict
+(3 lời gọi fetch_student_marks cùng token) cho nhiều sinh viên, với upstream
+giả lập có độ trễ cố định. So sánh số lời gọi upstream và độ trễ p99
+giữa phiên bản gốc (`__wrapped__`) và phiên bản đã gộp.
+
+    python benchmarks/bench_singleflight.py [--students 50] [--latency 0.2]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tlu_api  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    def __init__(self, latency, counter, lock):
+        self.latency, self.counter, self.lock = latency, counter, lock
+
+    def get(self, url, headers=None, **kwargs):
+        with self.lock:
+            self.counter[0] += 1
+        time.sleep(self.latency)
+        return FakeResponse([{"subject": {"subjectName": "mon a"}, "mark": 7.5}])
+
+
+def run(fetch, students, latency, concurrency):
+    counter, lock = [0], threading.Lock()
+    original_get_session = tlu_api.get_session
+    fake_session = FakeSession(latency, counter, lock)
+    tlu_api.get_session = lambda: fake_session
+    durations = []
+
+    def one_call(token):
+        start = time.perf_counter()
+        fetch(token)
+        durations.append(time.perf_counter() - start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            tokens = [f"token-{i}" for i in range(students) for _ in range(3)]
+            list(pool.map(one_call, tokens))
+    finally:
+        tlu_api.get_session = original_get_session
+    durations.sort()
+    return counter[0], durations[int(len(durations) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=24)
+    args = parser.parse_args()
+
+    variants = (
+        ("no coalescing", tlu_api.fetch_student_marks.__wrapped__),
+        ("single-flight", tlu_api.fetch_student_marks),
+    )
+    for name, fetch in variants:
+        calls, p99 = run(fetch, args.students, args.latency, args.concurrency)
+        print(f"{name:<14} upstream_calls={calls:4d}  p99={p99 * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
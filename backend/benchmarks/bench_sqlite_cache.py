@@ -0,0 +1,79 @@
+"""
+Benchmark: độ trễ cache-hit của bảng api_cache.
+
+So sánh cách cũ (mở/đóng sqlite3.connect cho mỗi lần đọc) với pool kết nối
+bền vững trong `storage.py`. Chạy từ thư mục backend/:
+
+    python benchmarks/bench_sqlite_cache.py [--iterations 5000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage  # noqa: E402
+
+SELECT_SQL = "SELECT json_data, timestamp FROM api_cache WHERE student_id = ? AND data_type = ?"
+
+
+def setup_db(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS api_cache (
+            student_id TEXT, data_type TEXT, json_data TEXT, timestamp REAL,
+            PRIMARY KEY (student_id, data_type)
+        )
+    """)
+    payload = '[' + ','.join('{"course":"Mon %d","progress":%d}' % (i, 50 + i) for i in range(40)) + ']'
+    conn.execute("INSERT OR REPLACE INTO api_cache VALUES (?, ?, ?, ?)", ("2251162052", "marks", payload, time.time()))
+    conn.commit()
+    conn.close()
+
+
+def legacy_hit(db_file):
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute(SELECT_SQL, ("2251162052", "marks"))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
+def pooled_hit(db_file):
+    return storage.fetchone(db_file, SELECT_SQL, ("2251162052", "marks"))
+
+
+def measure(fn, db_file, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(db_file)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench_cache.db")
+        setup_db(db_file)
+        for name, fn in (("connect-per-call", legacy_hit), ("pooled (storage)", pooled_hit)):
+            fn(db_file)  # warm-up
+            stats = measure(fn, db_file, args.iterations)
+            print(f"{name:<18} mean={stats['mean_us']:8.1f}us  p50={stats['p50_us']:8.1f}us  p99={stats['p99_us']:8.1f}us")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
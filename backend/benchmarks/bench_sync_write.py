@@ -0,0 +1,163 @@
+"""
+Benchmark: tốc độ ghi (dòng/giây) của data_synchronizer vào smart_learning.db
+cho một khóa sinh viên giả lập (mặc định 10k sinh viên, ~300k dòng điểm).
+
+So sánh cách cũ (2 lệnh execute cho mỗi môn, commit riêng cho students/grades/
+log_history) với StudentBatch + write_student_batches (executemany, một
+transaction cho mỗi sinh viên). Mỗi cách ghi vào một file CSDL mới (WAL,
+synchronous=NORMAL như storage.connect; --synchronous FULL để mỗi commit fsync,
+giống ổ đĩa mạng/ổ chậm hơn). Lượt 2 đồng bộ lại đúng dữ liệu đó vào CSDL đã có
+(trường hợp chạy định kỳ): với cách cũ, INSERT OR REPLACE vào students xóa dòng
+cũ nên khóa ngoại ON DELETE CASCADE xóa rồi ghi lại toàn bộ grades của sinh viên
+(và SET NULL student_id của log cũ); bản mới dùng upsert nên không còn việc đó.
+Chạy từ thư mục backend/:
+
+    python benchmarks/bench_sync_write.py [--students 10000] [--synchronous FULL]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import data_synchronizer  # noqa: E402
+from synthetic_data import make_cohort  # noqa: E402
+
+
+def make_payloads(num_students):
+    """ (student_info, bản ghi điểm rút gọn như tlu_stream.slim_mark) cho từng sinh viên. """
+    cohort = make_cohort(num_students=num_students)
+    payloads = []
+    for student_id, group in cohort.groupby('Mã SV', sort=False):
+        info = {"student_id": str(student_id), "name": f"Sinh viên {student_id}",
+                "email": "N/A", "major": "Hệ thống thông tin"}
+        marks = [
+            {"subject": {"subjectName": name, "subjectCode": f"MH{name.rsplit(' ', 1)[-1]}", "credit": 3},
+             "mark": score, "semesterName": "1_2024_2025"}
+            for name, score in zip(group['Tên Môn Học'], group['Điểm Tổng Kết (10)'].tolist())
+        ]
+        payloads.append((info, marks))
+    return payloads
+
+
+# --- Cách cũ: bản sao các hàm đồng bộ trước khi gom lô ---
+
+def legacy_sync_student_data(conn, student_info):
+    cursor = conn.cursor()
+    student_id = student_info.get('student_id')
+    email = student_info.get('email')
+    if email == 'N/A' or not email:
+        email = f"{student_id}@tlu.edu.vn"
+    cursor.execute("""
+        INSERT OR REPLACE INTO students (student_id, full_name, email, date_of_birth, major)
+        VALUES (?, ?, ?, ?, ?)
+    """, (student_id, student_info.get('name', 'N/A'), email, None, student_info.get('major', 'N/A')))
+    conn.commit()
+    return 1
+
+
+def legacy_sync_marks(conn, student_id, marks):
+    cursor = conn.cursor()
+    count = 0
+    for subject in marks:
+        try:
+            subject_details = subject.get("subject", {})
+            subject_id = subject_details.get("subjectCode", "N/A")
+            subject_name = subject_details.get("subjectName", "N/A")
+            credits = subject_details.get("credit", 0)
+            score = subject.get("mark")
+            semester = subject.get("semesterName", "N/A")
+            if subject_id == 'N/A' or score is None:
+                continue
+            cursor.execute("""
+                INSERT OR IGNORE INTO subjects (subject_id, subject_name, credits)
+                VALUES (?, ?, ?)
+            """, (subject_id, subject_name, credits))
+            cursor.execute("""
+                INSERT OR REPLACE INTO grades (student_id, subject_id, semester, score)
+                VALUES (?, ?, ?, ?)
+            """, (student_id, subject_id, semester, score))
+            count += 1
+        except sqlite3.Error as e:
+            print(f"❌ Lỗi đồng bộ điểm: {e}")
+    conn.commit()
+    return count
+
+
+def legacy_sync_logs(conn, student_id, log_type, data):
+    conn.cursor().execute("""
+        INSERT INTO log_history (student_id, action, timestamp, details)
+        VALUES (?, ?, ?, ?)
+    """, (student_id, f"API_Sync_{log_type}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+          json.dumps(data, ensure_ascii=False)))
+    conn.commit()
+
+
+def run_legacy(conn, payloads):
+    for info, marks in payloads:
+        legacy_sync_student_data(conn, info)
+        legacy_sync_marks(conn, info['student_id'], marks)
+        legacy_sync_logs(conn, info['student_id'], "SUCCESS", info)
+
+
+def build_batch(info, marks):
+    batch = data_synchronizer.StudentBatch()
+    batch.add_student(info)
+    batch.add_marks(marks)
+    batch.add_log("SUCCESS", info)
+    return batch
+
+
+def run_batched(conn, payloads):
+    data_synchronizer.write_student_batches(conn, (build_batch(info, marks) for info, marks in payloads))
+
+
+def snapshot(conn):
+    return [conn.execute(sql).fetchall() for sql in (
+        "SELECT * FROM students ORDER BY student_id",
+        "SELECT * FROM subjects ORDER BY subject_id",
+        "SELECT student_id, subject_id, semester, score FROM grades ORDER BY student_id, subject_id, semester",
+    )]
+
+
+def measure(label, fn, payloads, workdir, synchronous):
+    conn = data_synchronizer.create_connection(os.path.join(workdir, f"{label}.db"))
+    conn.execute(f"PRAGMA synchronous={synchronous};")
+    data_synchronizer.create_tables(conn)
+    rows = len(payloads) * 2 + sum(len(marks) for _, marks in payloads)  # students + log + grades
+    for sync_pass in (1, 2):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(conn, payloads)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:8} lượt {sync_pass}: {rows} dòng trong {elapsed:6.2f} s = {rows / elapsed:10,.0f} dòng/giây")
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--synchronous", default="NORMAL", choices=("OFF", "NORMAL", "FULL"))
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.students)
+    print(f"{len(payloads)} sinh viên, {sum(len(marks) for _, marks in payloads)} bản ghi điểm, "
+          f"synchronous={args.synchronous}")
+    workdir = tempfile.mkdtemp()
+    snapshots = []
+    for label, fn in (("legacy", run_legacy), ("batched", run_batched)):
+        conn = measure(label, fn, payloads, workdir, args.synchronous)
+        snapshots.append(snapshot(conn))
+        conn.close()
+    print(f"students/subjects/grades giống nhau: {snapshots[0] == snapshots[1]}")
+
+
+if __name__ == "__main__":
+    main()
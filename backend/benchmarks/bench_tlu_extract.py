@@ -0,0 +1,128 @@
+"""
+Benchmark: `process_tlu_data_to_progress` / `process_schedule_to_courses` — bản
+cũ (duyệt từng item, list các dict rồi mới tạo DataFrame) so với bản trích cột
+theo đường dẫn khai báo (tlu_extract) + lọc/kẹp/khử trùng vector hóa, trên
+bảng điểm giả lập 500 môn. Kiểm tra luôn hai bản cho cùng kết quả, kể cả khi
+dữ liệu có item hỏng.
+
+    python benchmarks/bench_tlu_extract.py [--subjects 500] [--iterations 300]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tlu_stub import make_marks, make_schedule  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import pandas as pd  # noqa: E402
+    from recommender import generate_mock_data, process_schedule_to_courses, process_tlu_data_to_progress  # noqa: E402
+
+
+def legacy_process_tlu_data_to_progress(tlu_marks_data, student_id):
+    """ Bản trước khi trích theo cột (giữ nguyên để so sánh). """
+    progress_list = []
+    found_real_data = False
+    if not isinstance(tlu_marks_data, list):
+        return generate_mock_data(student_id)
+    for subject in tlu_marks_data:
+        if not isinstance(subject, dict):
+            continue
+        try:
+            subject_name = subject.get("subject", {}).get("subjectName", "N/A").title()
+            score = subject.get("mark")
+            if (isinstance(score, (int, float))):
+                progress = int(score * 10)
+                found_real_data = True
+            else:
+                continue
+            progress_list.append({"course": subject_name, "progress": max(0, min(100, progress))})
+        except Exception:
+            pass
+    if not found_real_data:
+        return generate_mock_data(student_id)
+    return pd.DataFrame(progress_list)
+
+
+def legacy_process_schedule_to_courses(schedule_data, student_id):
+    processed_subjects, processed_list = set(), []
+    if not isinstance(schedule_data, list):
+        return pd.DataFrame(processed_list)
+    for subject in schedule_data:
+        try:
+            if subject is None:
+                continue
+            subject_details = subject.get("courseSubject", {}).get("semesterSubject", {}).get("subject", {}) or {}
+            subject_name = subject_details.get("subjectName", "N/A").title()
+            subject_code = subject_details.get("subjectCode", "N/A")
+            teacher_details = subject.get("courseSubject", {}).get("teacher", {}) or {}
+            teacher_name = teacher_details.get("displayName", "N/A")
+            if subject_name != "N/A" and subject_code != "N/A":
+                if subject_code not in processed_subjects:
+                    processed_subjects.add(subject_code)
+                    processed_list.append({"course": subject_name, "subjectCode": subject_code, "teacherName": teacher_name, "progress": 0})
+        except Exception:
+            pass
+    if not processed_list:
+        return generate_mock_data(student_id)
+    return pd.DataFrame(processed_list)
+
+
+MALFORMED_MARKS = [
+    None, "x", {"subject": None, "mark": 7}, {"subject": {"subjectName": None}, "mark": 7},
+    {"subject": {"subjectName": 5}, "mark": 7}, {"subject": {}, "mark": 6.5}, {"subject": {"subjectName": "a"}},
+    {"subject": {"subjectName": "b"}, "mark": "8"}, {"subject": {"subjectName": "c"}, "mark": True},
+    {"subject": {"subjectName": "d"}, "mark": float("nan")}, {"subject": {"subjectName": "e"}, "mark": -3},
+    {"subject": {"subjectName": "f"}, "mark": 12.34}, {"subject": {"subjectName": "g"}, "mark": 10 ** 400},
+    {"subject": {"subjectName": "h"}, "mark": float("inf")}, {"subject": {"subjectName": "i"}, "mark": 1e308},
+]
+MALFORMED_SCHEDULE = [
+    None, "x", {"courseSubject": None}, {"courseSubject": {"semesterSubject": None}},
+    {"courseSubject": {"semesterSubject": {"subject": None}}},
+    {"courseSubject": {"semesterSubject": {"subject": {"subjectName": "n/a", "subjectCode": "Z1"}}}},
+    {"courseSubject": {"semesterSubject": {"subject": {"subjectName": "k", "subjectCode": ["L"]}}}},
+    {"courseSubject": {"semesterSubject": {"subject": {"subjectName": "k", "subjectCode": "K1"}}, "teacher": None}},
+    {"courseSubject": {"semesterSubject": {"subject": {"subjectName": "k2", "subjectCode": "K1"}}, "teacher": {}}},
+    {"courseSubject": {"semesterSubject": {"subject": {"subjectName": "m", "subjectCode": 7}}, "teacher": "t"}},
+    {"courseSubject": {"semesterSubject": {"subject": {"subjectName": None, "subjectCode": "Q"}}}},
+]
+
+
+def measure(fn, data, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(data, "2251162052")
+    return (time.perf_counter() - start) / iterations * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subjects", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    marks = make_marks(args.subjects)
+    schedule = make_schedule(args.subjects)
+    schedule += schedule[: args.subjects // 5]  # lịch học có môn lặp lại (nhiều lớp/buổi)
+    cases = [
+        ("điểm", legacy_process_tlu_data_to_progress, process_tlu_data_to_progress, marks, MALFORMED_MARKS),
+        ("lịch học", legacy_process_schedule_to_courses, process_schedule_to_courses, schedule, MALFORMED_SCHEDULE),
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        parity = {
+            label: all(old(data, "1").equals(new(data, "1")) for data in (items, items + bad, bad, [], None))
+            for label, old, new, items, bad in cases
+        }
+    for label, old, new, items, _ in cases:
+        legacy_ms = measure(old, items, args.iterations)
+        new_ms = measure(new, items, args.iterations)
+        print(f"{label:8} ({len(items)} item): cũ {legacy_ms:7.3f} ms | mới {new_ms:7.3f} ms | "
+              f"nhanh hơn {legacy_ms / new_ms:4.1f}x | cùng kết quả: {parity[label]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: số lần bắt tay (kết nối TCP) và độ trễ của luồng đăng nhập + lấy
+điểm, giữa cách cũ (requests.get/post mở kết nối mới mỗi lần) và Session
+keep-alive dùng chung trong `http_client.py`. Chạy trên stub TLU cục bộ.
+
+    python benchmarks/bench_tlu_http.py [--logins 100] [--latency 0.005]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import requests  # noqa: E402
+
+import http_client  # noqa: E402
+import tlu_api  # noqa: E402
+from tlu_stub import start_stub  # noqa: E402
+
+
+def login_and_marks(i):
+    auth = tlu_api.authenticate_tlu(f"22511{i:05d}", "secret")
+    tlu_api.fetch_student_marks(auth["access_token"])
+
+
+def run(label, state, logins, session_factory):
+    original = tlu_api.get_session
+    tlu_api.get_session = session_factory
+    state.reset()
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for i in range(logins):
+                login_and_marks(i)
+    finally:
+        tlu_api.get_session = original
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} connections={state.connections:5d}  requests={state.requests:5d}  "
+          f"total={elapsed * 1000:8.1f}ms  per_login={elapsed / logins * 1000:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub(latency=args.latency)
+    http_client.TLU_BASE_URL = base_url
+
+    def fresh_session():
+        # Tương đương requests.get/post cấp module: mỗi lời gọi một Session mới
+        session = requests.Session()
+        session.verify = False
+        return session
+
+    try:
+        for label, factory in (("new connection/call", fresh_session), ("pooled keep-alive", http_client.get_session)):
+            run(label, state, args.logins, factory)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: cache YouTube trên đường gợi ý (recommender) — số lời gọi search.list
+thật và quota đã tiêu khi nhiều request gợi ý cùng chủ đề, chạy với stub YouTube
+cục bộ (có độ trễ giả lập).
+
+Mỗi "request" tìm video cho vài chủ đề lấy ngẫu nhiên từ một tập nhỏ, viết
+hoa/khoảng trắng khác nhau như Gemini hay trả về. Lượt 1 chạy với cache rỗng,
+lượt 2 lặp lại cùng tải (cache đã ấm).
+
+    python benchmarks/bench_youtube_cache.py [--requests 50] [--topics 30] [--latency 0.15]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tlu_stub import start_stub  # noqa: E402
+
+
+def make_workload(num_requests, num_topics, per_request, seed=0):
+    rng = random.Random(seed)
+    topics = [f"Cấu trúc dữ liệu chương {i}" for i in range(num_topics)]
+    variants = [str, str.lower, str.upper, lambda t: f"  {t} ", lambda t: t.replace(" ", "  ")]
+    return [
+        [rng.choice(variants)(rng.choice(topics)) for _ in range(per_request)]
+        for _ in range(num_requests)
+    ]
+
+
+async def run(recommender, workload):
+    # Một AsyncClient dùng chung như trong get_recommendation_logic_async (tạo client tốn ~50 ms)
+    async with httpx.AsyncClient(timeout=recommender.YOUTUBE_TIMEOUT) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            recommender.search_youtube_videos_many_async(queries, max_results=1, client=client)
+            for queries in workload
+        ))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--topics", type=int, default=30)
+    parser.add_argument("--per-request", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.15)
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub(latency=args.latency)
+    os.environ["YOUTUBE_API_BASE"] = f"{base_url}/youtube/v3"
+    os.environ["YOUTUBE_API_KEY"] = "stub"
+    os.environ["KV_CACHE_DB"] = os.path.join(tempfile.mkdtemp(), "kv_cache.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import recommender
+
+    workload = make_workload(args.requests, args.topics, args.per_request)
+    lookups = sum(len(queries) for queries in workload)
+    print(f"{args.requests} request x {args.per_request} chủ đề = {lookups} lượt tra "
+          f"({args.topics} chủ đề khác nhau), độ trễ stub {args.latency * 1000:.0f} ms")
+    print(f"Không cache (mỗi lượt 1 lời gọi): {lookups} lời gọi = {lookups * recommender.YOUTUBE_SEARCH_COST} đơn vị quota")
+    for label in ("cache lạnh", "cache ấm"):
+        before = state.youtube_searches
+        elapsed = asyncio.run(run(recommender, workload))
+        calls = state.youtube_searches - before
+        print(f"  {label:10}: {calls:4d} lời gọi = {calls * recommender.YOUTUBE_SEARCH_COST:6d} đơn vị quota | "
+              f"{elapsed * 1000:8.1f} ms")
+    print(f"Số liệu recommender: {recommender.youtube_stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
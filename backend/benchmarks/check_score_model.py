@@ -0,0 +1,26 @@
+"""
+Kiểm tra: suy luận NumPy của score_model (models/score_mlp.npz) cho cùng kết quả
+với mô hình Keras gốc, trên các đầu vào tham chiếu đã lưu trong
+models/score_mlp_reference.npz (điểm do Keras tính lúc xuất mô hình). Không cần
+cài keras; thoát với mã 1 nếu sai lệch vượt PARITY_TOLERANCE.
+
+    python benchmarks/check_score_model.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from export_score_model import PARITY_TOLERANCE, REFERENCE_PATH, check_reference  # noqa: E402
+
+
+def main():
+    diff = check_reference()
+    ok = diff <= PARITY_TOLERANCE
+    print(f"{'✅' if ok else '❌'} score_model (NumPy) vs Keras ({os.path.basename(REFERENCE_PATH)}): "
+          f"sai lệch lớn nhất {diff:.2e} (ngưỡng {PARITY_TOLERANCE:.0e})")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
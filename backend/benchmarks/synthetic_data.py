@@ -0,0 +1,19 @@
+"""
+Sinh dữ liệu giả lập (cùng định dạng tong_hop_diem_sinh_vien.csv) cho benchmark.
+"""
+import numpy as np
+import pandas as pd
+
+
+def make_cohort(num_students=10000, num_courses=120, courses_per_student=(15, 45), seed=42):
+    """ Bảng điểm giả lập: mỗi sinh viên học ngẫu nhiên một số môn, điểm 3.0–10.0. """
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(courses_per_student[0], courses_per_student[1] + 1, size=num_students)
+    student_col = np.repeat(2200000000 + np.arange(num_students, dtype=np.int64), counts)
+    course_col = np.concatenate([rng.choice(num_courses, size=c, replace=False) for c in counts])
+    scores = np.round(rng.uniform(3.0, 10.0, size=len(course_col)), 1)
+    return pd.DataFrame({
+        'Mã SV': student_col,
+        'Tên Môn Học': [f"môn học số {c}" for c in course_col],
+        'Điểm Tổng Kết (10)': scores,
+    })
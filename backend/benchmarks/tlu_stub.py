@@ -0,0 +1,217 @@
+"""
+Stub HTTP cục bộ giả lập các endpoint TLU dùng trong backend.
+
+Dùng cho benchmark/kiểm thử không cần mạng: đếm số kết nối TCP mở tới server
+(mỗi kết nối mới = một lần bắt tay) và số request, có thể thêm độ trễ giả lập.
+
+    python benchmarks/tlu_stub.py --port 8765
+    TLU_BASE_URL=http://127.0.0.1:8765 python app.py
+
+Stub cũng trả lời endpoint search của YouTube Data API (không cần mạng/quota):
+
+    YOUTUBE_API_BASE=http://127.0.0.1:8765/youtube/v3 YOUTUBE_API_KEY=stub python app.py
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _mark_details(i, mark):
+    """ Các trường chi tiết như bản ghi điểm thật của TLU (backend không dùng). """
+    return {
+        "subjectDetails": {
+            "id": 10_000 + i,
+            "subjectNameEng": f"subject {i}",
+            "departmentName": "Khoa Công nghệ thông tin",
+            "description": "Học phần cung cấp kiến thức nền tảng và kỹ năng thực hành. " * 4,
+        },
+        "semester": {
+            "id": 100 + i % 3,
+            "semesterName": f"{i % 3 + 1}_2024_2025",
+            "startDate": 1725148800000,
+            "endDate": 1735603200000,
+            "ordinalNumbers": i % 3 + 1,
+        },
+        "markDetails": [
+            {"id": i * 10 + k, "name": name, "ratio": ratio, "mark": mark, "createDate": 1735000000000}
+            for k, (name, ratio) in enumerate([("Chuyên cần", 10), ("Giữa kỳ", 20), ("Bài tập lớn", 20), ("Cuối kỳ", 50)])
+        ],
+        "mark4": round(mark / 2.5, 1),
+        "charMark": "A" if mark >= 8.5 else "B" if mark >= 7 else "C" if mark >= 5.5 else "D",
+        "isAccumulated": True,
+        "examRound": 1,
+        "createDate": 1735000000000,
+        "modifyDate": 1735000000000,
+    }
+
+
+def make_marks(num_subjects, student_id="2251162052", details=False):
+    """ Bảng điểm giả lập; `details=True` thêm các trường chi tiết như payload TLU đầy đủ. """
+    seed = sum(ord(ch) for ch in student_id)
+    marks = []
+    for i in range(num_subjects):
+        mark = round(4 + ((seed + i * 37) % 60) / 10, 1)
+        record = {
+            "id": i,
+            "subject": {
+                "subjectName": f"môn học {i}",
+                "subjectCode": f"MH{i:04d}",
+                "credit": 3,
+            },
+            "mark": mark,
+            "semesterName": f"{i % 3 + 1}_2024_2025",
+        }
+        if details:
+            extra = _mark_details(i, mark)
+            record["subject"].update(extra.pop("subjectDetails"))
+            record.update(extra)
+        marks.append(record)
+    return marks
+
+
+def make_schedule(num_subjects):
+    return [
+        {
+            "courseSubject": {
+                "semesterSubject": {"subject": {"subjectName": f"môn đang học {i}", "subjectCode": f"HK{i:04d}"}},
+                "teacher": {"displayName": f"Giảng viên {i}"},
+            }
+        }
+        for i in range(num_subjects)
+    ]
+
+
+def make_youtube_results(query, max_results):
+    return {
+        "kind": "youtube#searchListResponse",
+        "items": [
+            {
+                "id": {"kind": "youtube#video", "videoId": f"vid{zlib.crc32(f'{query}|{i}'.encode()):08x}"},
+                "snippet": {"title": f"{query.split(' học tập OR ')[0]} - bài {i + 1}"},
+            }
+            for i in range(max_results)
+        ],
+    }
+
+
+class StubState:
+    def __init__(self, latency=0.0, num_subjects=40, mark_details=False):
+        self.latency = latency
+        self.num_subjects = num_subjects
+        self.mark_details = mark_details
+        self.connections = 0
+        self.requests = 0
+        self.youtube_searches = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.youtube_searches = 0
+
+
+class TLUStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # cho phép keep-alive
+    disable_nagle_algorithm = True  # tránh trễ 40ms do Nagle + delayed ACK trên kết nối giữ lâu
+    state = None
+
+    def handle(self):
+        # handle() được gọi một lần cho mỗi kết nối TCP
+        with self.state.lock:
+            self.state.connections += 1
+        super().handle()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _begin(self):
+        with self.state.lock:
+            self.state.requests += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+    def _token_user(self):
+        auth = self.headers.get("Authorization", "")
+        return auth.replace("Bearer stub-", "", 1) if auth.startswith("Bearer stub-") else None
+
+    def do_POST(self):
+        self._begin()
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        if self.path == "/education/oauth/token":
+            username = form.get("username", [""])[0]
+            if not username or form.get("password", [""])[0] == "wrong":
+                return self._send_json({"error": "invalid_grant"}, status=400)
+            return self._send_json({"access_token": f"stub-{username}", "token_type": "bearer", "expires_in": 43199})
+        self._send_json({"error": "not found"}, status=404)
+
+    def _youtube_search(self, query):
+        params = parse_qs(query)
+        if not params.get("key", [""])[0]:
+            return self._send_json({"error": {"code": 403, "message": "API key missing"}}, status=403)
+        with self.state.lock:
+            self.state.youtube_searches += 1
+        max_results = int(params.get("maxResults", ["5"])[0])
+        return self._send_json(make_youtube_results(params.get("q", [""])[0], max_results))
+
+    def do_GET(self):
+        self._begin()
+        url = urlsplit(self.path)
+        if url.path == "/youtube/v3/search":
+            return self._youtube_search(url.query)
+        user = self._token_user()
+        if user is None:
+            return self._send_json({"error": "unauthorized"}, status=401)
+        if self.path == "/education/api/users/getCurrentUser":
+            return self._send_json({"username": user, "displayName": f"Sinh viên {user}", "email": f"{user}@tlu.edu.vn"})
+        if self.path == "/education/api/semester/semester_info":
+            return self._send_json([{"id": 12, "semesterName": "1_2025_2026"}])
+        if self.path.startswith("/education/api/StudentCourseSubject/studentLoginUser/"):
+            return self._send_json(make_schedule(6))
+        if self.path == "/education/api/studentsubjectmark/getListMarkDetailStudent":
+            return self._send_json(make_marks(self.state.num_subjects, user, details=self.state.mark_details))
+        self._send_json({"error": "not found"}, status=404)
+
+
+def start_stub(port=0, latency=0.0, num_subjects=40, mark_details=False):
+    """ Chạy stub trong thread nền. Trả về (server, state, base_url). """
+    state = StubState(latency=latency, num_subjects=num_subjects, mark_details=mark_details)
+    handler = type("BoundTLUStubHandler", (TLUStubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--subjects", type=int, default=40)
+    parser.add_argument("--mark-details", action="store_true", help="bảng điểm đầy đủ trường chi tiết như TLU thật")
+    args = parser.parse_args()
+    server, state, base_url = start_stub(args.port, args.latency, args.subjects, args.mark_details)
+    print(f"TLU stub đang chạy tại {base_url} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"connections={state.connections} requests={state.requests}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Mã hóa DataFrame cho bảng api_cache.
+
+Mỗi dòng cache ghi kèm tên codec (cột `encoding`) nên có thể đổi codec mà
+không phải xóa cache: dòng cũ vẫn đọc được bằng codec đã ghi ra nó.
+
+- "json"     : định dạng cũ (to_json records), chậm và mất kiểu dữ liệu.
+- "columnar" : nhị phân theo cột (v1) — cột số ghi thẳng buffer NumPy kèm
+               dtype, cột chuỗi ghi độ dài + UTF-8 nối liền. Chỉ cần numpy.
+- "arrow"    : Arrow IPC stream, dùng khi đã cài pyarrow.
+
+Chọn codec ghi mới bằng biến môi trường CACHE_CODEC (mặc định "columnar").
+"""
+import io
+import json
+import os
+import struct
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+COLUMNAR_MAGIC = b"SLC1"
+_HEADER_LEN = struct.Struct("<I")
+
+
+def encode_json(df):
+    return df.to_json(orient='records')
+
+
+def decode_json(blob):
+    if isinstance(blob, bytes):
+        blob = blob.decode("utf-8")
+    return pd.read_json(StringIO(blob), orient='records')
+
+
+def _is_string_column(values):
+    return all(isinstance(v, str) for v in values)
+
+
+def encode_columnar(df):
+    """ MAGIC | độ dài header (uint32) | header JSON | các buffer cột nối liền. """
+    columns, buffers, offset = [], [], 0
+    for name in df.columns:
+        series = df[name]
+        if series.dtype != object and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            data = np.ascontiguousarray(series.to_numpy()).tobytes()
+            meta = {"kind": "array", "dtype": series.dtype.str}
+        else:
+            values = series.tolist()
+            if _is_string_column(values):
+                encoded = [v.encode("utf-8") for v in values]
+                lengths = np.fromiter((len(b) for b in encoded), dtype="<u4", count=len(encoded))
+                data = lengths.tobytes() + b"".join(encoded)
+                meta = {"kind": "str"}
+            else:  # cột hỗn hợp/có None: giữ nguyên giá trị qua JSON
+                data = json.dumps(values, ensure_ascii=False, default=str).encode("utf-8")
+                meta = {"kind": "json"}
+        columns.append({"name": str(name), "offset": offset, "nbytes": len(data), **meta})
+        buffers.append(data)
+        offset += len(data)
+    header = json.dumps({"rows": len(df), "columns": columns}, ensure_ascii=False).encode("utf-8")
+    return COLUMNAR_MAGIC + _HEADER_LEN.pack(len(header)) + header + b"".join(buffers)
+
+
+def decode_columnar(blob):
+    if blob[:4] != COLUMNAR_MAGIC:
+        raise ValueError("Blob không phải định dạng columnar v1")
+    (header_len,) = _HEADER_LEN.unpack_from(blob, 4)
+    header = json.loads(blob[8:8 + header_len])
+    body = memoryview(blob)[8 + header_len:]
+    rows = header["rows"]
+    data = {}
+    for column in header["columns"]:
+        chunk = body[column["offset"]:column["offset"] + column["nbytes"]]
+        if column["kind"] == "array":
+            data[column["name"]] = np.frombuffer(chunk, dtype=np.dtype(column["dtype"]), count=rows).copy()
+        elif column["kind"] == "str":
+            lengths = np.frombuffer(chunk, dtype="<u4", count=rows)
+            raw = bytes(chunk[4 * rows:])
+            ends = np.cumsum(lengths)
+            starts = ends - lengths
+            strings = np.empty(rows, dtype=object)
+            strings[:] = [raw[s:e].decode("utf-8") for s, e in zip(starts.tolist(), ends.tolist())]
+            data[column["name"]] = strings
+        else:
+            data[column["name"]] = json.loads(bytes(chunk))
+    if not header["columns"]:
+        return pd.DataFrame()
+    return pd.DataFrame(data, copy=False)  # dict giữ thứ tự cột; truyền columns= sẽ chậm hơn ~5 lần
+
+
+def encode_arrow(df):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(blob):
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(io.BytesIO(blob)).read_all().to_pandas()
+
+
+CODECS = {
+    "json": (encode_json, decode_json),
+    "columnar": (encode_columnar, decode_columnar),
+    "arrow": (encode_arrow, decode_arrow),
+}
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _configured_codec():
+    name = os.getenv("CACHE_CODEC", "columnar")
+    if name not in CODECS:
+        print(f"⚠️ CẢNH BÁO: CACHE_CODEC '{name}' không hợp lệ, dùng 'columnar'.")
+        return "columnar"
+    if name == "arrow" and not arrow_available():
+        print("⚠️ CẢNH BÁO: CACHE_CODEC=arrow nhưng chưa cài pyarrow, dùng 'columnar'.")
+        return "columnar"
+    return name
+
+
+CACHE_CODEC = _configured_codec()
+
+
+def encode(df, codec=None):
+    """ Trả về (tên codec, blob) để ghi vào api_cache. """
+    codec = codec or CACHE_CODEC
+    return codec, CODECS[codec][0](df)
+
+
+def decode(blob, codec):
+    """ Giải mã blob theo tên codec đã ghi cùng dòng (dòng cũ không có cột này là "json"). """
+    return CODECS[codec or "json"][1](blob)
@@ -0,0 +1,437 @@
+"""
+Chỉ mục Collaborative Filtering (CF) dạng thưa, tính trước top-K hàng xóm.
+
+Thay cho pivot_table dày + ma trận cosine N×N: ma trận tiện ích (sinh viên ×
+môn học) được lưu dạng `scipy.sparse` CSR, và độ tương đồng cosine chỉ được
+tính theo từng khối hàng (chunk) để giữ lại K hàng xóm gần nhất của mỗi sinh
+viên. Bộ nhớ tăng tuyến tính theo N thay vì N². Chỉ mục được lưu ra đĩa dạng
+.npy để nạp lại bằng mmap (không cần xây lại khi khởi động).
+"""
+import contextlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+INDEX_VERSION = 2  # 2: các file .npy nằm trong thư mục generation do meta.json trỏ tới
+DEFAULT_TOP_K = int(os.getenv("CF_TOP_K", "20"))
+DEFAULT_CHUNK_SIZE = int(os.getenv("CF_CHUNK_SIZE", "1024"))
+NUM_NEIGHBORS = 5  # số hàng xóm dùng khi gợi ý (giống mô hình cũ: nlargest(5))
+
+STUDENT_COL = 'Mã SV'
+COURSE_COL = 'Tên Môn Học'
+SCORE_COL = 'Điểm Tổng Kết (10)'
+
+
+class CFIndex:
+    """
+    student_ids   : (N,)   mã sinh viên (int64), theo thứ tự hàng
+    courses       : list   tên môn học, theo thứ tự cột
+    utility       : CSR    (N, C) điểm tổng kết, 0 = chưa học
+    neighbors     : (N, K) chỉ số hàng của K hàng xóm, giảm dần theo độ tương đồng (-1 = trống)
+    neighbor_sims : (N, K) độ tương đồng cosine tương ứng
+    source_mtime  : mtime của file CSV mà chỉ mục được xây từ đó (None nếu không rõ)
+    """
+
+    def __init__(self, student_ids, courses, utility, neighbors, neighbor_sims,
+                 normalized=None, source_mtime=None):
+        self.student_ids = student_ids
+        self.courses = list(courses)
+        self.utility = utility
+        self.neighbors = neighbors
+        self.neighbor_sims = neighbor_sims
+        self.source_mtime = source_mtime
+        self._normalized = normalized
+        self._row_of = {int(sid): row for row, sid in enumerate(student_ids)}
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    @property
+    def top_k(self):
+        return self.neighbors.shape[1]
+
+    @property
+    def normalized(self):
+        """ utility đã chuẩn hóa theo hàng (CSR), tính một lần rồi giữ lại cho các lần cập nhật sau. """
+        if self._normalized is None:
+            self._normalized = _normalize_rows(self.utility).tocsr()
+        return self._normalized
+
+    def row_of(self, student_id):
+        return self._row_of.get(int(student_id))
+
+    def recommend(self, student_id, num_recs=5, num_neighbors=NUM_NEIGHBORS):
+        """ Gợi ý môn chưa học dựa trên điểm trung bình của các hàng xóm gần nhất. """
+        row = self.row_of(student_id)
+        if row is None:
+            return []
+        nbrs = np.asarray(self.neighbors[row, :num_neighbors])
+        nbrs = nbrs[nbrs >= 0]
+        if nbrs.size == 0:
+            return []
+        avg_scores = np.asarray(self.utility[nbrs].sum(axis=0)).ravel() / nbrs.size
+        user_scores = self.utility[row].toarray().ravel()
+        unseen = np.flatnonzero(user_scores == 0)
+        if unseen.size == 0:
+            return []
+        candidate_scores = avg_scores[unseen]
+        order = np.argsort(-candidate_scores, kind="stable")[:num_recs]
+        return [
+            {"course": self.courses[unseen[i]], "predicted_score": round(float(candidate_scores[i]), 1)}
+            for i in order if candidate_scores[i] > 0
+        ]
+
+    def recommend_batch(self, student_ids, num_recs=5, num_neighbors=NUM_NEIGHBORS, block_size=4096):
+        """
+        Bản vector hóa của `recommend` cho nhiều sinh viên cùng lúc.
+        Điểm trung bình hàng xóm được cộng dồn theo từng hạng hàng xóm trên cả
+        khối B sinh viên; môn chưa học được lọc bằng mặt nạ NumPy.
+        Trả về dict {student_id: [gợi ý...]} (sinh viên không có trong mô hình -> []).
+        """
+        results = {}
+        known = []
+        for sid in student_ids:
+            row = self.row_of(sid)
+            if row is None:
+                results[sid] = []
+            else:
+                known.append((sid, row))
+        for start in range(0, len(known), block_size):
+            block = known[start:start + block_size]
+            rows = np.fromiter((row for _, row in block), dtype=np.int64, count=len(block))
+            nbrs = np.asarray(self.neighbors[rows, :num_neighbors])
+            valid = nbrs >= 0
+            counts = valid.sum(axis=1)
+            # Cộng dồn theo thứ tự hạng hàng xóm (cùng thứ tự cộng với `recommend`)
+            neighbor_sums = np.zeros((len(rows), len(self.courses)))
+            for rank in range(nbrs.shape[1]):
+                has_neighbor = valid[:, rank]
+                neighbor_sums[has_neighbor] += self.utility[nbrs[has_neighbor, rank]].toarray()
+            avg_scores = neighbor_sums / np.maximum(counts, 1)[:, None]
+            unseen = self.utility[rows].toarray() == 0
+            scores = np.where(unseen, avg_scores, -np.inf)
+            order = np.argsort(-scores, axis=1, kind="stable")[:, :num_recs]
+            top_scores = np.take_along_axis(scores, order, axis=1)
+            for i, (sid, _) in enumerate(block):
+                if counts[i] == 0:
+                    results[sid] = []
+                    continue
+                results[sid] = [
+                    {"course": self.courses[course], "predicted_score": round(float(score), 1)}
+                    for course, score in zip(order[i], top_scores[i]) if score > 0
+                ]
+        return results
+
+
+def _normalize_rows(utility):
+    norms = np.sqrt(np.asarray(utility.multiply(utility).sum(axis=1)).ravel())
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inv) @ utility
+
+
+def _replace_rows(matrix, rows, replacement):
+    """
+    CSR mới cùng kích thước với `matrix`: các hàng `rows` lấy từ `replacement`
+    (CSR len(rows) × C), các hàng còn lại giữ nguyên giá trị (nhân với 1.0).
+    """
+    n_rows = matrix.shape[0]
+    keep = np.ones(n_rows)
+    keep[rows] = 0.0
+    place = sparse.csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(n_rows, len(rows)))
+    result = (sparse.diags(keep) @ matrix + place @ replacement).tocsr()
+    result.eliminate_zeros()
+    result.sort_indices()
+    return result
+
+
+def _top_k_block(block_sims, k):
+    """
+    Chọn top-k cột cho một khối hàng của ma trận tương đồng
+    (ô của chính sinh viên đó đã được gán -inf trước khi gọi).
+    """
+    n_rows, n_cols = block_sims.shape
+    k_eff = min(k, n_cols - 1)
+    neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+    sims = np.zeros((n_rows, k), dtype=np.float32)
+    if k_eff <= 0:
+        return neighbors, sims
+    if k_eff < n_cols:
+        candidates = np.argpartition(-block_sims, k_eff - 1, axis=1)[:, :k_eff]
+    else:
+        candidates = np.tile(np.arange(n_cols), (n_rows, 1))
+    # Sắp xếp theo chỉ số trước rồi sort ổn định theo độ tương đồng giảm dần:
+    # khi bằng nhau, hàng có chỉ số nhỏ đứng trước (giống pandas nlargest).
+    candidates.sort(axis=1)
+    cand_sims = np.take_along_axis(block_sims, candidates, axis=1)
+    order = np.argsort(-cand_sims, axis=1, kind="stable")
+    neighbors[:, :k_eff] = np.take_along_axis(candidates, order, axis=1)
+    sims[:, :k_eff] = np.take_along_axis(cand_sims, order, axis=1)
+    return neighbors, sims
+
+
+def compute_top_k(utility, k=DEFAULT_TOP_K, chunk_size=DEFAULT_CHUNK_SIZE, rows=None, normalized=None):
+    """
+    Tính top-k hàng xóm (cosine) cho các hàng `rows` (mặc định: tất cả),
+    từng khối `chunk_size` hàng để không bao giờ tạo ma trận N×N.
+    `normalized`: utility đã chuẩn hóa theo hàng nếu đã có sẵn.
+    """
+    if normalized is None:
+        normalized = _normalize_rows(utility).tocsr()
+    normalized_t = normalized.T.tocsc()
+    rows = np.arange(utility.shape[0]) if rows is None else np.asarray(rows)
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    sims = np.zeros((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), chunk_size):
+        block_rows = rows[start:start + chunk_size]
+        block_sims = (normalized[block_rows] @ normalized_t).toarray()
+        # Đặt self = -inf theo chỉ số hàng thật của từng dòng trong khối
+        block_sims[np.arange(len(block_rows)), block_rows] = -np.inf
+        block_neighbors, block_top = _top_k_block(block_sims, k)
+        neighbors[start:start + len(block_rows)] = block_neighbors
+        sims[start:start + len(block_rows)] = block_top
+    return neighbors, sims
+
+
+def build_utility_matrix(csv_data):
+    """ Từ bảng điểm CSV -> (student_ids, courses, CSR utility). Điểm trùng lấy trung bình. """
+    data = csv_data[[STUDENT_COL, COURSE_COL, SCORE_COL]].copy()
+    data = data.dropna(subset=[SCORE_COL])
+    data[COURSE_COL] = data[COURSE_COL].str.title()
+    grouped = data.groupby([STUDENT_COL, COURSE_COL], sort=False)[SCORE_COL].mean().reset_index()
+    student_codes, student_ids = pd.factorize(grouped[STUDENT_COL], sort=True)
+    course_codes, courses = pd.factorize(grouped[COURSE_COL], sort=True)
+    utility = sparse.csr_matrix(
+        (grouped[SCORE_COL].to_numpy(dtype=np.float64), (student_codes, course_codes)),
+        shape=(len(student_ids), len(courses)),
+    )
+    return np.asarray(student_ids, dtype=np.int64), list(courses), utility
+
+
+def build_cf_index(csv_data, k=DEFAULT_TOP_K, chunk_size=DEFAULT_CHUNK_SIZE):
+    student_ids, courses, utility = build_utility_matrix(csv_data)
+    normalized = _normalize_rows(utility).tocsr()
+    neighbors, sims = compute_top_k(utility, k=k, chunk_size=chunk_size, normalized=normalized)
+    return CFIndex(student_ids, courses, utility, neighbors, sims, normalized=normalized)
+
+
+# --- Cập nhật tăng dần (không dựng lại toàn bộ) ---
+
+def apply_updates(index, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Áp dụng các dòng điểm mới (student_id, course, score) lên `index` và trả
+    về một CFIndex MỚI (không sửa index cũ — index cũ vẫn phục vụ request).
+    Điểm mới thay thế điểm cũ của cặp (sinh viên, môn). Chỉ các hàng/cột
+    tương đồng bị ảnh hưởng được tính lại:
+      - sinh viên có điểm thay đổi: tính lại toàn bộ top-K của họ;
+      - sinh viên khác có hàng xóm nằm trong nhóm thay đổi: tính lại top-K;
+      - các sinh viên còn lại: chỉ trộn độ tương đồng mới với nhóm thay đổi
+        vào danh sách top-K hiện có.
+    Chỉ các hàng thay đổi được chuẩn hóa lại; ma trận chuẩn hóa của các hàng
+    khác được lấy lại từ `index.normalized`.
+    """
+    courses = list(index.courses)
+    course_col = {course: col for col, course in enumerate(courses)}
+    row_of = dict(index._row_of)
+    student_ids = [int(sid) for sid in index.student_ids]
+    utility = index.utility
+
+    changes = {}
+    for student_id, course, score in rows:
+        if score is None:
+            continue
+        student_id, course, score = int(student_id), str(course).title(), float(score)
+        col = course_col.get(course)
+        if col is None:
+            col = course_col[course] = len(courses)
+            courses.append(course)
+        row = row_of.get(student_id)
+        if row is None:
+            row = row_of[student_id] = len(student_ids)
+            student_ids.append(student_id)
+        changes[(row, col)] = score
+
+    old_shape = utility.shape
+    changes = {
+        (row, col): score for (row, col), score in changes.items()
+        if row >= old_shape[0] or col >= old_shape[1] or utility[row, col] != score
+    }
+    if not changes:
+        return index
+
+    k = index.top_k
+    n_students = len(student_ids)
+    new_shape = (n_students, len(courses))
+    changed = np.array(sorted({row for row, _ in changes}), dtype=np.int64)
+
+    # Chỉ dựng lại (và chuẩn hóa lại) các hàng thay đổi, rồi ghép vào bản sao ma trận cũ
+    new_utility = utility.tocsr(copy=True).astype(np.float64)
+    new_utility.resize(new_shape)
+    changed_rows = new_utility[changed].toarray()
+    position = {row: i for i, row in enumerate(changed.tolist())}
+    for (row, col), score in changes.items():
+        changed_rows[position[row], col] = score
+    changed_rows = sparse.csr_matrix(changed_rows)
+    new_utility = _replace_rows(new_utility, changed, changed_rows)
+    normalized = index.normalized.copy()
+    normalized.resize(new_shape)
+    normalized = _replace_rows(normalized, changed, _normalize_rows(changed_rows).tocsr())
+    old_neighbors = np.full((n_students, k), -1, dtype=np.int32)
+    old_sims = np.zeros((n_students, k), dtype=np.float32)
+    old_neighbors[:old_shape[0]] = index.neighbors
+    old_sims[:old_shape[0]] = index.neighbor_sims
+
+    # Sinh viên (không thuộc nhóm thay đổi) đang có hàng xóm trong nhóm thay đổi
+    affected = np.isin(old_neighbors, changed).any(axis=1)
+    affected[changed] = False
+    recompute = np.concatenate([changed, np.flatnonzero(affected)])
+
+    neighbors = old_neighbors.copy()
+    sims = old_sims.copy()
+    neighbors[recompute], sims[recompute] = compute_top_k(new_utility, k=k, chunk_size=chunk_size, rows=recompute,
+                                                          normalized=normalized)
+
+    # Các hàng còn lại: trộn độ tương đồng mới với nhóm thay đổi
+    merge_rows = np.setdiff1d(np.arange(n_students), recompute)
+    if merge_rows.size:
+        changed_t = normalized[changed].T.tocsc()
+        for start in range(0, merge_rows.size, chunk_size):
+            block = merge_rows[start:start + chunk_size]
+            new_sims = (normalized[block] @ changed_t).toarray()
+            cand_idx = np.hstack([neighbors[block], np.broadcast_to(changed, (len(block), len(changed)))])
+            cand_sims = np.hstack([
+                np.where(neighbors[block] >= 0, sims[block], -np.inf),
+                new_sims,
+            ])
+            order = np.lexsort((cand_idx, -cand_sims), axis=1)[:, :k]
+            top_idx = np.take_along_axis(cand_idx, order, axis=1)
+            top_sims = np.take_along_axis(cand_sims, order, axis=1)
+            empty = np.isneginf(top_sims)
+            neighbors[block] = np.where(empty, -1, top_idx)
+            sims[block] = np.where(empty, 0, top_sims)
+
+    return CFIndex(np.asarray(student_ids, dtype=np.int64), courses, new_utility, neighbors, sims,
+                   normalized=normalized, source_mtime=index.source_mtime)
+
+
+# --- Lưu / nạp chỉ mục (mmap) ---
+
+GENERATION_PREFIX = "gen-"
+META_FILE = "meta.json"
+
+
+def _read_meta(directory):
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_old_generations(directory, previous):
+    """
+    Xóa các generation cũ hơn `previous` (generation ngay trước bản vừa ghi,
+    được giữ lại cho người đọc đang nạp dở) và các file .npy của bố cục cũ
+    (version 1, nằm thẳng trong `directory`).
+    """
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(GENERATION_PREFIX):
+            if previous is not None and name < previous:
+                shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".npy"):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+
+def save_cf_index(index, directory, source_mtime=None):
+    """
+    Ghi chỉ mục theo kiểu nguyên tử: các file .npy được ghi vào một thư mục
+    generation mới, sau cùng meta.json (trỏ tới generation đó) mới được thay
+    bằng os.replace. Người đọc luôn thấy trọn một phiên bản, không bao giờ thấy
+    file của hai phiên bản trộn lẫn.
+    """
+    if source_mtime is None:
+        source_mtime = index.source_mtime
+    os.makedirs(directory, exist_ok=True)
+    old_meta = None
+    with contextlib.suppress(OSError, ValueError):
+        old_meta = _read_meta(directory)
+    previous = old_meta.get("generation") if old_meta else None
+
+    # time_ns có độ dài cố định nên tên generation sắp xếp được theo thời gian
+    generation = f"{GENERATION_PREFIX}{time.time_ns()}-{os.getpid()}"
+    gen_dir = os.path.join(directory, generation)
+    os.makedirs(gen_dir)
+    utility = index.utility.tocsr()
+    np.save(os.path.join(gen_dir, "student_ids.npy"), np.asarray(index.student_ids, dtype=np.int64))
+    np.save(os.path.join(gen_dir, "neighbors.npy"), np.asarray(index.neighbors, dtype=np.int32))
+    np.save(os.path.join(gen_dir, "neighbor_sims.npy"), np.asarray(index.neighbor_sims, dtype=np.float32))
+    np.save(os.path.join(gen_dir, "utility_data.npy"), utility.data)
+    np.save(os.path.join(gen_dir, "utility_indices.npy"), utility.indices)
+    np.save(os.path.join(gen_dir, "utility_indptr.npy"), utility.indptr)
+    meta = {
+        "version": INDEX_VERSION,
+        "generation": generation,
+        "courses": index.courses,
+        "shape": list(utility.shape),
+        "top_k": index.top_k,
+        "source_mtime": source_mtime,
+    }
+    tmp_path = os.path.join(directory, f"{META_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+    _remove_old_generations(directory, previous)
+
+
+def load_cf_index(directory, mmap=True):
+    """ Nạp chỉ mục từ đĩa (mmap_mode='r'). Trả về (CFIndex, meta) hoặc (None, None). """
+    try:
+        meta = _read_meta(directory)
+    except (OSError, ValueError):
+        return None, None
+    if meta is None or meta.get("version") != INDEX_VERSION:
+        return None, None
+    gen_dir = os.path.join(directory, meta["generation"])
+    mode = "r" if mmap else None
+
+    def load(name):
+        return np.load(os.path.join(gen_dir, name), mmap_mode=mode)
+
+    try:
+        utility = sparse.csr_matrix(
+            (load("utility_data.npy"), load("utility_indices.npy"), load("utility_indptr.npy")),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        index = CFIndex(load("student_ids.npy"), meta["courses"], utility,
+                        load("neighbors.npy"), load("neighbor_sims.npy"), source_mtime=meta.get("source_mtime"))
+    except OSError:  # generation đã bị một tiến trình ghi khác dọn đi
+        return None, None
+    return index, meta
+
+
+def load_or_build_cf_index(csv_path, index_dir, k=DEFAULT_TOP_K):
+    """
+    Dùng chỉ mục đã lưu nếu nó được xây từ đúng phiên bản CSV hiện tại
+    (so mtime); nếu không thì xây lại từ CSV và lưu ra đĩa.
+    """
+    csv_mtime = os.path.getmtime(csv_path)
+    index, meta = load_cf_index(index_dir)
+    if index is not None and meta.get("source_mtime") == csv_mtime and meta.get("top_k") == k:
+        print(f"✅ Nạp chỉ mục CF (mmap) từ '{index_dir}'.")
+        return index
+    index = build_cf_index(pd.read_csv(csv_path), k=k)
+    index.source_mtime = csv_mtime
+    try:
+        save_cf_index(index, index_dir, source_mtime=csv_mtime)
+    except OSError as e:
+        print(f"⚠️ Không thể lưu chỉ mục CF ra đĩa: {e}")
+    return index
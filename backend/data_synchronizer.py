@@ -1,5 +1,8 @@
 import sqlite3
 import os
+import hashlib
+import requests
+import storage
 import json
 import getpass
 from datetime import datetime
@@ -11,20 +14,18 @@ sys.stdout.reconfigure(encoding='utf-8')
 from tlu_api_handler import (
     authenticate_tlu,
     fetch_student_data,
-    fetch_student_marks
+    iter_student_marks
 )
+from grade_feed import SQL_CREATE_GRADE_CHANGES, SQL_INSERT_GRADE_CHANGE
 
 DATABASE_NAME = 'smart_learning.db'
 
 # --- 1. HÀM QUẢN LÝ CƠ SỞ DỮ LIỆU ---
 
 def create_connection(db_file):
-    """Tạo kết nối CSDL và bật khóa ngoại."""
-    conn = None
+    """Tạo kết nối CSDL (WAL, synchronous=NORMAL) và bật khóa ngoại."""
     try:
-        conn = sqlite3.connect(db_file)
-        conn.execute("PRAGMA foreign_keys = ON;")
-        return conn
+        return storage.connect(db_file, foreign_keys=True)
     except sqlite3.Error as e:
         print(f"Lỗi kết nối cơ sở dữ liệu: {e}")
         return None
@@ -92,111 +93,299 @@ def create_tables(conn):
     );
     """
 
+    # 6. Bảng SYNC_STATE (Hash bảng điểm lần đồng bộ gần nhất) - bỏ qua SV không đổi
+    sql_create_sync_state_table = """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        student_id TEXT PRIMARY KEY,
+        marks_hash TEXT NOT NULL,
+        synced_at TEXT NOT NULL,
+        FOREIGN KEY (student_id) REFERENCES students (student_id) ON DELETE CASCADE
+    );
+    """
+
     try:
         cursor.execute(sql_create_students_table)
         cursor.execute(sql_create_subjects_table)
         cursor.execute(sql_create_grades_table)
         cursor.execute(sql_create_log_history_table)
         cursor.execute(sql_create_chatbot_logs_table)
+        cursor.execute(sql_create_sync_state_table)
+        # 7. Bảng GRADE_CHANGES (Nhật ký thay đổi điểm, xem grade_feed.py) - cache/mô hình CF đọc để làm mới đúng chỗ
+        cursor.execute(SQL_CREATE_GRADE_CHANGES)
         conn.commit()
     except sqlite3.Error as e:
         print(f"Lỗi khi tạo bảng: {e}")
 
 # --- 2. HÀM ĐỒNG BỘ DỮ LIỆU ---
+# Các hàm đồng bộ chỉ DỰNG lô dòng (tuple) trong Python (StudentBatch); việc ghi
+# dồn vào write_student_batch: một executemany cho mỗi bảng trong MỘT transaction
+# cho mỗi sinh viên, thay vì 2 lệnh execute cho mỗi môn và commit riêng cho từng
+# bước students/grades/log_history.
+# Đồng bộ theo delta: bảng điểm trùng hash lần trước (sync_state) thì bỏ qua;
+# ngược lại chỉ ghi các điểm mới/khác điểm đang lưu và ghi lại vào grade_changes.
 
-def sync_student_data(conn, student_info):
-    """Lưu thông tin cá nhân sinh viên vào bảng students."""
-    cursor = conn.cursor()
-    student_id = student_info.get('student_id')
-    
-    if student_id == 'N/A':
-        return 0
+SQL_UPSERT_STUDENT = """
+    INSERT INTO students (student_id, full_name, email, date_of_birth, major)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (student_id) DO UPDATE SET
+        full_name = excluded.full_name,
+        email = excluded.email,
+        date_of_birth = excluded.date_of_birth,
+        major = excluded.major
+    WHERE (students.full_name, students.email, students.date_of_birth, students.major)
+          IS NOT (excluded.full_name, excluded.email, excluded.date_of_birth, excluded.major)
+"""
+# INSERT OR IGNORE: Chỉ chèn nếu subject_id chưa tồn tại
+SQL_INSERT_SUBJECT = """
+    INSERT OR IGNORE INTO subjects (subject_id, subject_name, credits)
+    VALUES (?, ?, ?)
+"""
+# Upsert tại chỗ (giữ nguyên grade_id) và chỉ khi điểm thực sự khác
+SQL_UPSERT_GRADE = """
+    INSERT INTO grades (student_id, subject_id, semester, score)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (student_id, subject_id, semester) DO UPDATE SET score = excluded.score
+    WHERE grades.score IS NOT excluded.score
+"""
+SQL_SELECT_GRADES = "SELECT subject_id, semester, score FROM grades WHERE student_id = ?"
+SQL_SELECT_MARKS_HASH = "SELECT marks_hash FROM sync_state WHERE student_id = ?"
+SQL_UPSERT_SYNC_STATE = """
+    INSERT INTO sync_state (student_id, marks_hash, synced_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT (student_id) DO UPDATE SET
+        marks_hash = excluded.marks_hash,
+        synced_at = excluded.synced_at
+"""
+SQL_INSERT_LOG = """
+    INSERT INTO log_history (student_id, action, timestamp, details)
+    VALUES (?, ?, ?, ?)
+"""
 
-    full_name = student_info.get('name', 'N/A')
-    email = student_info.get('email')
-    major = student_info.get('major', 'N/A')
-    
-    # Xử lý nếu email không có, tạo email giả định để tránh lỗi UNIQUE
-    if email == 'N/A' or not email:
-        email = f"{student_id}@tlu.edu.vn" 
 
-    try:
-        # INSERT OR REPLACE: Chèn hoặc thay thế nếu student_id đã tồn tại
-        cursor.execute("""
-            INSERT OR REPLACE INTO students (student_id, full_name, email, date_of_birth, major)
-            VALUES (?, ?, ?, ?, ?)
-        """, (student_id, full_name, email, None, major))
-        conn.commit()
-        print(f"✅ Lưu thông tin sinh viên {student_id} thành công.")
-        return 1
-    except sqlite3.Error as e:
-        print(f"❌ Lỗi lưu thông tin sinh viên: {e}")
-        return 0
+class StudentBatch:
+    """
+    Các dòng cần ghi cho một sinh viên (thông tin, môn học, điểm, log), gom sẵn
+    để write_student_batch ghi bằng executemany trong một transaction.
+    `synced_rows` là (student_id, subject_name, score) cho cf_index.apply_updates;
+    sau khi ghi chỉ còn các dòng điểm thực sự thay đổi (`changes` là số dòng đó,
+    `unchanged` = True nếu cả bảng điểm trùng hash lần trước).
+    """
 
-def sync_marks_and_subjects(conn, student_id, access_token):
-    """Lấy điểm số và cập nhật bảng subjects/grades."""
-    marks_data = fetch_student_marks(access_token)
-    
-    if not marks_data:
-        print("⚠️ Không có dữ liệu điểm số để đồng bộ.")
-        return
+    def __init__(self, student_id=None):
+        self.student_id = student_id
+        self.students = []
+        self.subjects = {}  # subject_id -> dòng; giữ dòng gặp đầu tiên như INSERT OR IGNORE
+        self.grades = []
+        self.logs = []
+        self.synced_rows = []
+        self.marks_hash = None  # None: lô không chứa bảng điểm (chỉ thông tin/log)
+        self.changes = 0
+        self.unchanged = False
 
-    cursor = conn.cursor()
-    count = 0
-    
-    # Duyệt qua từng môn học đã có điểm
-    for subject in marks_data:
-        try:
-            # 1. TRÍCH XUẤT THÔNG TIN MÔN HỌC
-            subject_details = subject.get("subject", {})
-            subject_id = subject_details.get("subjectCode", "N/A") 
+    @property
+    def row_count(self):
+        return len(self.students) + len(self.subjects) + len(self.grades) + len(self.logs)
+
+    def add_student(self, student_info):
+        """ Thêm dòng students. Trả về False nếu thiếu student_id. """
+        student_id = student_info.get('student_id')
+        if student_id == 'N/A':
+            return False
+
+        # Xử lý nếu email không có, tạo email giả định để tránh lỗi UNIQUE
+        email = student_info.get('email')
+        if email == 'N/A' or not email:
+            email = f"{student_id}@tlu.edu.vn"
+
+        self.student_id = student_id
+        self.students.append((student_id, student_info.get('name', 'N/A'), email, None,
+                              student_info.get('major', 'N/A')))
+        return True
+
+    def add_marks(self, marks):
+        """ Thêm dòng subjects/grades từ các bản ghi điểm TLU. Trả về số bản ghi đã duyệt. """
+        student_id = self.student_id
+        subjects, grades, synced_rows = self.subjects, self.grades, self.synced_rows
+        seen = 0
+        for subject in marks:
+            seen += 1
+            if not isinstance(subject, dict):
+                continue
+            subject_details = subject.get("subject") or {}
+            if not isinstance(subject_details, dict):
+                continue
+            subject_id = subject_details.get("subjectCode", "N/A")
             subject_name = subject_details.get("subjectName", "N/A")
-            credits = subject_details.get("credit", 0)
-            
-            # 2. TRÍCH XUẤT ĐIỂM VÀ HỌC KỲ
-            score = subject.get("mark") # Điểm cuối cùng
-            semester = subject.get("semesterName", "N/A")
+            score = subject.get("mark")  # Điểm cuối cùng
 
             if subject_id == 'N/A' or score is None:
                 continue
 
-            # --- INSERT/UPDATE SUBJECTS ---
-            # INSERT OR IGNORE: Chỉ chèn nếu subject_id chưa tồn tại
-            cursor.execute("""
-                INSERT OR IGNORE INTO subjects (subject_id, subject_name, credits)
-                VALUES (?, ?, ?)
-            """, (subject_id, subject_name, credits))
-
-            # --- INSERT/UPDATE GRADES ---
-            # INSERT OR REPLACE: Thay thế điểm nếu đã tồn tại cho SV/Môn/Kỳ này
-            cursor.execute("""
-                INSERT OR REPLACE INTO grades (student_id, subject_id, semester, score)
-                VALUES (?, ?, ?, ?)
-            """, (student_id, subject_id, semester, score))
-            count += 1
-            
-        except sqlite3.Error as e:
-            subject_name_log = subject.get("subject", {}).get("subjectName", "Unknown Subject")
-            print(f"❌ Lỗi đồng bộ điểm cho {subject_name_log}: {e}")
-
-    conn.commit()
-    print(f"✅ Đồng bộ thành công {count} mục điểm số và môn học.")
+            if subject_id not in subjects:
+                subjects[subject_id] = (subject_id, subject_name, subject_details.get("credit", 0))
+            grades.append((student_id, subject_id, subject.get("semesterName", "N/A"), score))
+            synced_rows.append((student_id, subject_name, score))
+        # Hash trên chính các dòng sẽ ghi: trường TLU mà backend không lưu có đổi cũng không tính là thay đổi
+        self.marks_hash = hashlib.sha256(repr((grades, list(subjects.values()))).encode("utf-8")).hexdigest()
+        return seen
 
-def sync_logs(conn, student_id, log_type, data):
-    """Lưu log đồng bộ vào bảng log_history."""
-    cursor = conn.cursor()
-    action = f"API_Sync_{log_type}"
+    def add_log(self, log_type, data):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Lưu trữ toàn bộ dữ liệu (JSON.dumps) để debugging sau này
+        self.logs.append((self.student_id, f"API_Sync_{log_type}", timestamp,
+                          json.dumps(data, ensure_ascii=False)))
+
+
+def _same_score(stored, score):
+    """ So điểm như SQLite lưu (cột REAL): "7.5" từ TLU trùng với 7.5 đã lưu. """
+    try:
+        return float(stored) == float(score)
+    except (TypeError, ValueError):
+        return stored == score
+
+
+def _write_grade_delta(conn, batch):
+    """
+    Ghi các điểm mới/thay đổi của lô (so với bảng grades hiện tại) và ghi nhật ký
+    vào grade_changes. Bảng điểm trùng hash lần đồng bộ trước thì bỏ qua hẳn.
+    """
+    student_id = batch.student_id
+    stored_hash = conn.execute(SQL_SELECT_MARKS_HASH, (student_id,)).fetchone()
+    if stored_hash and stored_hash[0] == batch.marks_hash:
+        batch.unchanged, batch.synced_rows = True, []
+        return
+
+    current = {(subject_id, semester): score
+               for subject_id, semester, score in conn.execute(SQL_SELECT_GRADES, (student_id,))}
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    changed, feed, synced_rows = [], [], []
+    for row, synced in zip(batch.grades, batch.synced_rows):
+        _, subject_id, semester, score = row
+        key = (subject_id, semester)
+        if key in current and _same_score(current[key], score):
+            continue
+        changed.append(row)
+        feed.append((student_id, subject_id, semester, current.get(key), score, timestamp))
+        synced_rows.append(synced)
+        current[key] = score  # môn lặp lại trong cùng bảng điểm: dòng sau thắng như trước
+
+    if changed:
+        conn.executemany(SQL_INSERT_SUBJECT, batch.subjects.values())
+        conn.executemany(SQL_UPSERT_GRADE, changed)
+        conn.executemany(SQL_INSERT_GRADE_CHANGE, feed)
+    conn.execute(SQL_UPSERT_SYNC_STATE, (student_id, batch.marks_hash, timestamp))
+    batch.changes, batch.synced_rows = len(changed), synced_rows
+
 
+def write_student_batch(conn, batch):
+    """
+    Ghi cả lô của một sinh viên trong MỘT transaction (BEGIN IMMEDIATE lấy khóa ghi
+    ngay từ đầu). Lỗi ở bất kỳ bảng nào thì rollback toàn bộ lô và trả về False.
+    """
     try:
-        # Lưu trữ toàn bộ dữ liệu (JSON.dumps) để debugging sau này
-        cursor.execute("""
-            INSERT INTO log_history (student_id, action, timestamp, details) 
-            VALUES (?, ?, ?, ?)
-        """, (student_id, action, timestamp, json.dumps(data, ensure_ascii=False)))
-        conn.commit()
+        with conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            if batch.students:
+                conn.executemany(SQL_UPSERT_STUDENT, batch.students)
+            if batch.marks_hash is not None:
+                _write_grade_delta(conn, batch)
+            if batch.logs:
+                conn.executemany(SQL_INSERT_LOG, batch.logs)
+        return True
     except sqlite3.Error as e:
-        print(f"❌ Lỗi lưu log: {e}")
+        print(f"❌ Lỗi ghi dữ liệu sinh viên {batch.student_id}: {e}")
+        return False
+
+
+def write_student_batches(conn, batches):
+    """ Ghi nhiều sinh viên trong một lượt, mỗi sinh viên một transaction. Trả về (số SV ghi được, số dòng). """
+    students = rows = 0
+    for batch in batches:
+        if write_student_batch(conn, batch):
+            students += 1
+            rows += batch.row_count
+    return students, rows
+
+
+def sync_student_data(conn, student_info):
+    """Lưu thông tin cá nhân sinh viên vào bảng students."""
+    batch = StudentBatch()
+    if not batch.add_student(student_info):
+        return 0
+    if not write_student_batch(conn, batch):
+        return 0
+    print(f"✅ Lưu thông tin sinh viên {batch.student_id} thành công.")
+    return 1
+
+def _collect_marks(batch, access_token):
+    """
+    Đọc dần điểm (iter_student_marks) vào lô. Trả về số bản ghi đã duyệt,
+    hoặc None nếu gọi API/đọc JSON lỗi (kể cả giữa chừng).
+    """
+    try:
+        seen = batch.add_marks(iter_student_marks(access_token))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"❌ LỖI TLU API (StudentMark): {e}")
+        return None
+    if not seen:
+        print("⚠️ Không có dữ liệu điểm số để đồng bộ.")
+    return seen
+
+def sync_marks_and_subjects(conn, student_id, access_token):
+    """
+    Lấy điểm số và cập nhật bảng subjects/grades.
+    Trả về các dòng (student_id, subject_name, score) có điểm mới/thay đổi — dùng để
+    cập nhật tăng dần mô hình CF (cf_index.apply_updates).
+    Điểm được đọc dần trong lúc response đang tải (iter_student_marks) vào lô; lô
+    chỉ được ghi khi đã đọc trọn, nên lỗi giữa chừng không để lại dòng nào.
+    """
+    batch = StudentBatch(student_id)
+    if not _collect_marks(batch, access_token) or not write_student_batch(conn, batch):
+        return []
+    if batch.unchanged:
+        print(f"⏭️ Bảng điểm của {student_id} không đổi từ lần đồng bộ trước, bỏ qua.")
+    else:
+        print(f"✅ Đồng bộ thành công {len(batch.grades)} mục điểm số và môn học ({batch.changes} mục thay đổi).")
+    return batch.synced_rows
+
+def sync_logs(conn, student_id, log_type, data):
+    """Lưu log đồng bộ vào bảng log_history."""
+    batch = StudentBatch(student_id)
+    batch.add_log(log_type, data)
+    write_student_batch(conn, batch)
+
+def sync_student(conn, access_token, student_info=None):
+    """
+    Đồng bộ trọn một sinh viên (thông tin, điểm/môn học, log) trong MỘT transaction.
+    Trả về các dòng (student_id, subject_name, score) có điểm mới/thay đổi, hoặc None nếu lỗi.
+    """
+    student_info = student_info or fetch_student_data(access_token)
+    batch = StudentBatch()
+    if not student_info or not batch.add_student(student_info):
+        print("❌ Lỗi: Không lấy được thông tin người dùng (student_id). Bỏ qua sinh viên.")
+        return None
+    if _collect_marks(batch, access_token) is None:
+        return None
+    batch.add_log("SUCCESS", student_info)
+    if not write_student_batch(conn, batch):
+        return None
+    print(f"✅ Đồng bộ sinh viên {batch.student_id}: {len(batch.grades)} mục điểm số, "
+          f"{'bảng điểm không đổi' if batch.unchanged else f'{batch.changes} mục thay đổi'}.")
+    return batch.synced_rows
+
+def sync_students(conn, access_tokens):
+    """
+    Đồng bộ nhiều sinh viên trong một lượt (mỗi sinh viên một transaction, lỗi của
+    một sinh viên không ảnh hưởng người khác). Trả về (số SV thành công, các dòng đã ghi).
+    """
+    succeeded, synced_rows = 0, []
+    for access_token in access_tokens:
+        rows = sync_student(conn, access_token)
+        if rows is not None:
+            succeeded += 1
+            synced_rows.extend(rows)
+    return succeeded, synced_rows
 
 # --- KHỐI CHẠY CHÍNH ---
 
@@ -227,16 +416,8 @@ def initial_setup_and_sync(username, password):
         conn.close()
         return
 
-    student_id = student_info['student_id']
-
-    # 3. LƯU THÔNG TIN SINH VIÊN VÀO BẢNG STUDENTS
-    sync_student_data(conn, student_info)
-    
-    # 4. LƯU ĐIỂM VÀ MÔN HỌC VÀO BẢNG SUBJECTS VÀ GRADES
-    sync_marks_and_subjects(conn, student_id, access_token)
-
-    # 5. GHI LẠI LOG ĐỒNG BỘ
-    sync_logs(conn, student_id, "SUCCESS", student_info)
+    # 3-5. LƯU THÔNG TIN SINH VIÊN, ĐIỂM/MÔN HỌC VÀ LOG TRONG MỘT TRANSACTION
+    sync_student(conn, access_token, student_info)
 
     conn.close()
     print("\n--- ĐỒNG BỘ KẾT THÚC THÀNH CÔNG ---")
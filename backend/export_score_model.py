@@ -0,0 +1,161 @@
+"""
+Bước build: chuyển models/score_mlp.keras (+ scaler.joblib, le_course.joblib)
+thành models/score_mlp.npz để app suy luận bằng NumPy, không cần TensorFlow.
+
+    python export_score_model.py            # xuất + kiểm tra lại bằng bản NumPy
+    python export_score_model.py --check    # chỉ so khớp số học với Keras (cần keras)
+    python export_score_model.py --write-reference   # ghi lại đầu ra mẫu của Keras (cần keras)
+
+Cần h5py, joblib (và keras cho --check/--write-reference) lúc build; lúc chạy app
+chỉ cần numpy. models/score_mlp_reference.npz (đầu vào mẫu + điểm do chính mô hình
+Keras tính) được commit cùng score_mlp.npz để benchmarks/check_score_model.py
+so khớp bản NumPy mà không cần cài keras; xuất lại mô hình thì ghi lại tệp này.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+from score_model import MODEL_DIR, NUMPY_MODEL_PATH, load_numpy_artifacts
+
+KERAS_PATH = os.path.join(MODEL_DIR, "score_mlp.keras")
+REFERENCE_PATH = os.path.join(MODEL_DIR, "score_mlp_reference.npz")
+REFERENCE_ROWS = 256
+PARITY_TOLERANCE = 1e-4  # thang điểm 10
+
+
+def read_keras_dense_layers(keras_path=KERAS_PATH):
+    """ Đọc các lớp Dense (kernel, bias, activation) theo thứ tự từ tệp .keras (Keras 3). """
+    import h5py
+
+    with zipfile.ZipFile(keras_path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights = io.BytesIO(archive.read("model.weights.h5"))
+
+    layers = []
+    with h5py.File(weights, "r") as h5:
+        for layer in config["config"]["layers"]:
+            kind, layer_config = layer["class_name"], layer["config"]
+            if kind in ("InputLayer", "Dropout"):  # Dropout không có tác dụng khi suy luận
+                continue
+            if kind != "Dense":
+                raise ValueError(f"Chưa hỗ trợ lớp {kind} ({layer_config['name']})")
+            variables = h5[f"layers/{layer_config['name']}/vars"]
+            kernel = np.asarray(variables["0"], dtype=np.float32)
+            bias = np.asarray(variables["1"], dtype=np.float32) if layer_config["use_bias"] else np.zeros(kernel.shape[1], np.float32)
+            layers.append((kernel, bias, layer_config["activation"]))
+    return layers
+
+
+def export(output_path=NUMPY_MODEL_PATH):
+    import joblib
+
+    layers = read_keras_dense_layers()
+    scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.joblib"))
+    label_encoder = joblib.load(os.path.join(MODEL_DIR, "le_course.joblib"))
+
+    arrays = {
+        "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "classes": np.asarray(label_encoder.classes_, dtype=str),
+        "activations": np.asarray([activation for _, _, activation in layers], dtype=str),
+    }
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays[f"kernel_{i}"] = kernel
+        arrays[f"bias_{i}"] = bias
+    np.savez(output_path, **arrays)
+    print(f"✅ Đã xuất {len(layers)} lớp Dense -> {output_path}")
+
+
+def sample_inputs(classes, num_rows=2000, seed=0):
+    """ Đầu vào kiểm tra: mọi mã môn + các giá trị ngẫu nhiên quanh miền huấn luyện. """
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([
+        rng.integers(0, len(classes), num_rows),
+        rng.choice([0, 20222023, 20232024, 20242025, 20252026], num_rows),
+        rng.uniform(4, 10, num_rows),
+        rng.integers(0, 60, num_rows),
+        rng.integers(1, 5, num_rows),
+    ]).astype(np.float64)
+    covered = min(len(classes), num_rows)
+    features[:covered, 0] = np.arange(covered)
+    return features
+
+
+def check_parity():
+    """ So khớp đầu ra NumPy với Keras trên cùng đầu vào; trả về sai lệch tuyệt đối lớn nhất. """
+    from score_model import load_keras_artifacts
+
+    numpy_predict, standardizer, label_encoder = load_numpy_artifacts()
+    keras_predict, scaler, keras_encoder = load_keras_artifacts()
+    if list(label_encoder.classes_) != list(keras_encoder.classes_):
+        raise AssertionError("Danh sách mã môn khác với le_course.joblib")
+    if not (np.allclose(standardizer.mean_, scaler.mean_) and np.allclose(standardizer.scale_, scaler.scale_)):
+        raise AssertionError("Tham số chuẩn hóa khác với scaler.joblib")
+
+    x = (sample_inputs(label_encoder.classes_) - scaler.mean_) / scaler.scale_
+    diff = float(np.max(np.abs(numpy_predict(x) - keras_predict(x))))
+    print(f"Sai lệch lớn nhất NumPy vs Keras: {diff:.2e} (ngưỡng {PARITY_TOLERANCE:.0e})")
+    return diff
+
+
+def write_reference(path=REFERENCE_PATH, num_rows=REFERENCE_ROWS):
+    """ Ghi đầu vào mẫu (chưa chuẩn hóa) và điểm do mô hình Keras dự đoán cho chúng. """
+    from score_model import load_keras_artifacts
+
+    keras_predict, scaler, label_encoder = load_keras_artifacts()
+    features = sample_inputs(label_encoder.classes_, num_rows=num_rows)
+    scores = keras_predict((features - scaler.mean_) / scaler.scale_)
+    np.savez(path, features=features, scores=np.asarray(scores, dtype=np.float32))
+    print(f"✅ Đã ghi {len(features)} dòng tham chiếu của Keras -> {path}")
+
+
+def check_reference(path=REFERENCE_PATH, predict=None):
+    """
+    So khớp dự đoán của score_model (bản NumPy, gồm cả bước chuẩn hóa) với đầu ra
+    Keras đã lưu trong `path`; không cần keras. Trả về sai lệch tuyệt đối lớn nhất.
+    """
+    from score_model import ScoreModelService
+
+    with np.load(path) as data:
+        features, expected = data["features"], data["scores"]
+    if predict is None:
+        predict = ScoreModelService(loader=load_numpy_artifacts).predict
+    return float(np.max(np.abs(np.asarray(predict(features)) - expected)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="chỉ kiểm tra khớp số học với Keras")
+    parser.add_argument("--write-reference", action="store_true",
+                        help="ghi lại models/score_mlp_reference.npz từ mô hình Keras")
+    parser.add_argument("--output", default=NUMPY_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.write_reference:
+        write_reference()
+        return
+
+    if not args.check:
+        export(args.output)
+        predict, standardizer, label_encoder = load_numpy_artifacts(args.output)
+        x = (sample_inputs(label_encoder.classes_) - standardizer.mean_) / standardizer.scale_
+        print(f"Kiểm tra nhanh: {len(x)} dòng, điểm dự đoán {predict(x).min():.2f}..{predict(x).max():.2f}")
+
+    try:
+        diff = check_parity()
+    except ImportError as e:
+        print(f"⚠️ Bỏ qua so khớp với Keras ({e}).")
+        if args.check:
+            sys.exit(2)
+        return
+    if diff > PARITY_TOLERANCE:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Nhật ký thay đổi điểm (bảng grade_changes trong smart_learning.db).
+
+Bên ghi là tiến trình đồng bộ (data_synchronizer / batch_sync): mỗi điểm mới
+hoặc khác điểm đang lưu được ghi thêm một dòng. Bên đọc là server (app.py):
+đọc các dòng sau con trỏ change_id để xóa cache và cập nhật mô hình CF đúng chỗ.
+
+Module chỉ chứa SQL và các hàm đọc/dọn, không có tác dụng phụ khi import, để
+server dùng được mà không kéo theo CLI đồng bộ.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+GRADE_CHANGES_RETENTION_DAYS = 30
+
+SQL_CREATE_GRADE_CHANGES = """
+    CREATE TABLE IF NOT EXISTS grade_changes (
+        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT NOT NULL,
+        subject_id TEXT NOT NULL,
+        semester TEXT NOT NULL,
+        old_score REAL,
+        new_score REAL,
+        changed_at TEXT NOT NULL
+    );
+"""
+SQL_INSERT_GRADE_CHANGE = """
+    INSERT INTO grade_changes (student_id, subject_id, semester, old_score, new_score, changed_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_READ_GRADE_CHANGES = """
+    SELECT c.change_id, c.student_id, c.subject_id, s.subject_name, c.semester,
+           c.old_score, c.new_score, c.changed_at
+    FROM grade_changes c LEFT JOIN subjects s ON s.subject_id = c.subject_id
+    WHERE c.change_id > ?
+    ORDER BY c.change_id
+    LIMIT ?
+"""
+
+
+def read_grade_changes(conn, since_id=0, limit=1000):
+    """
+    Đọc nhật ký thay đổi điểm sau `since_id` (theo thứ tự ghi), tối đa `limit` dòng:
+    (change_id, student_id, subject_id, subject_name, semester, old_score, new_score, changed_at).
+    Bên đọc giữ change_id lớn nhất đã xử lý làm con trỏ cho lần đọc sau;
+    old_score là None nếu đó là điểm mới.
+    """
+    return conn.execute(SQL_READ_GRADE_CHANGES, (since_id, limit)).fetchall()
+
+
+def prune_grade_changes(conn, keep_days=GRADE_CHANGES_RETENTION_DAYS):
+    """
+    Xóa nhật ký thay đổi cũ hơn `keep_days` ngày. change_id là AUTOINCREMENT nên
+    không bị dùng lại: con trỏ của bên đọc vẫn đúng sau khi xóa. Trả về số dòng đã xóa.
+    """
+    cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        with conn:
+            return conn.execute("DELETE FROM grade_changes WHERE changed_at < ?", (cutoff,)).rowcount
+    except sqlite3.Error as e:
+        print(f"❌ Lỗi dọn nhật ký thay đổi điểm: {e}")
+        return 0
+
+
+# --- Con trỏ của bên đọc (lưu trong CSDL của bên đọc, ví dụ tlu_cache.db) ---
+
+SQL_CREATE_FEED_CURSORS = """
+    CREATE TABLE IF NOT EXISTS feed_cursors (
+        name TEXT PRIMARY KEY,
+        change_id INTEGER NOT NULL
+    )
+"""
+SQL_SAVE_FEED_CURSOR = """
+    INSERT INTO feed_cursors (name, change_id) VALUES (?, ?)
+    ON CONFLICT (name) DO UPDATE SET change_id = MAX(feed_cursors.change_id, excluded.change_id)
+"""
+
+
+def load_cursor(conn, name):
+    """ change_id lớn nhất đã xử lý của bên đọc `name` (0 nếu chưa từng đọc). """
+    conn.execute(SQL_CREATE_FEED_CURSORS)
+    row = conn.execute("SELECT change_id FROM feed_cursors WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def save_cursor(conn, name, change_id):
+    """ Ghi con trỏ (chỉ tiến lên, không lùi); gọi trong cùng transaction với việc xử lý thay đổi. """
+    conn.execute(SQL_CREATE_FEED_CURSORS)
+    conn.execute(SQL_SAVE_FEED_CURSOR, (name, change_id))
@@ -0,0 +1,139 @@
+"""
+HTTP client dùng chung (keep-alive) cho các lời gọi tới TLU.
+
+Một `requests.Session` duy nhất với HTTPAdapter có pool kết nối, nên các lời
+gọi liên tiếp (đăng nhập -> lấy user info -> lấy điểm...) dùng lại cùng một
+kết nối TCP+TLS thay vì bắt tay lại từ đầu. Có timeout mặc định (connect/read)
+và tự thử lại với backoff khi TLU trả về 5xx cho các request GET.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TLU_BASE_URL = os.getenv("TLU_BASE_URL", "https://sinhvien1.tlu.edu.vn").rstrip("/")
+
+CONNECT_TIMEOUT = float(os.getenv("TLU_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("TLU_READ_TIMEOUT", "20"))
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = int(os.getenv("TLU_POOL_MAXSIZE", "32"))
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def tlu_url(path):
+    """ Ghép đường dẫn API với TLU_BASE_URL (đổi được qua env để trỏ tới stub). """
+    return f"{TLU_BASE_URL}{path}"
+
+
+class TimeoutSession(requests.Session):
+    """ Session gán timeout mặc định cho mọi request chưa chỉ định timeout. """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+
+def build_session(pool_maxsize=POOL_MAXSIZE, retries=RETRY_TOTAL):
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),  # POST /oauth/token không idempotent
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = TimeoutSession(timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.verify = False  # Chứng chỉ TLU không hợp lệ (giữ nguyên hành vi cũ)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """ Trả về Session dùng chung của tiến trình (tạo lười ở lần gọi đầu). """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def reset_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+class RateLimiter:
+    """ Token bucket: trung bình tối đa `rate` lượt gọi/giây, dồn được tối đa `burst` lượt. """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """ Chờ tới khi đủ `tokens` lượt rồi trừ đi (chặn thread gọi). """
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+                self.waited_seconds += wait
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """ Một RateLimiter riêng cho mỗi host (tạo lười), để giới hạn từng máy chủ độc lập. """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host):
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(host, RateLimiter(self.rate, self.burst))
+        return limiter
+
+    def acquire(self, url, tokens=1):
+        """ Chờ lượt của host trong `url` (chặn thread gọi). """
+        self.for_host(urlsplit(url).netloc).acquire(tokens)
+
+    @property
+    def waited_seconds(self):
+        return sum(limiter.waited_seconds for limiter in list(self._limiters.values()))
@@ -0,0 +1,309 @@
+"""
+Cache key-value nhiều tầng dùng chung cho app.py và recommender.py (AI, YouTube...).
+
+- Tầng L1: MemoryCache trong tiến trình; tầng L2: bảng `kv_cache` trong SQLite
+  (dùng chung giữa các worker).
+- Mỗi namespace có TTL và giới hạn kích thước riêng (số mục, tổng byte);
+  vượt giới hạn thì bỏ các mục sắp hết hạn nhất. Cột `expires_at` có index
+  nên dọn mục hết hạn không phải quét cả bảng.
+- `get_or_compute` gộp các lời gọi upstream đồng thời cho cùng một khóa
+  (single-flight), nên cùng một truy vấn chỉ gọi API một lần.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import storage
+from memory_cache import MemoryCache
+from singleflight import SingleFlight
+
+CACHE_DB = os.getenv("KV_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_youtube_cache.db"))
+EVICT_EVERY = 64  # số lần ghi vào một namespace giữa hai lần kiểm tra giới hạn
+
+
+@dataclass
+class Namespace:
+    ttl: float
+    max_entries: int = 10000
+    max_bytes: int = 50 * 1024 * 1024
+
+
+DEFAULT_NAMESPACES = {
+    "ai": Namespace(ttl=float(os.getenv("AI_CACHE_TTL", str(24 * 3600)))),
+    "youtube": Namespace(ttl=float(os.getenv("YOUTUBE_CACHE_TTL", str(24 * 3600)))),
+}
+
+
+class TieredCache:
+    def __init__(self, db_file=CACHE_DB, namespaces=None, l1_size=1024):
+        self.db_file = db_file
+        self.namespaces = dict(namespaces or DEFAULT_NAMESPACES)
+        self.l1 = MemoryCache(maxsize=l1_size)
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = {name: self._empty_stats() for name in self.namespaces}
+        self._writes_since_evict = {name: 0 for name in self.namespaces}
+        self.init_db()
+
+    @staticmethod
+    def _empty_stats():
+        return {"hits_l1": 0, "hits_l2": 0, "misses": 0, "sets": 0, "evictions": 0, "expired_purged": 0}
+
+    def _count(self, namespace, name, n=1):
+        with self._lock:
+            self._stats[namespace][name] += n
+
+    def _config(self, namespace):
+        config = self.namespaces.get(namespace)
+        if config is None:
+            raise KeyError(f"Namespace cache chưa khai báo: {namespace}")
+        return config
+
+    def init_db(self):
+        with storage.transaction(self.db_file) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS kv_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_kv_cache_expires_at ON kv_cache (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_kv_cache_ns_expires ON kv_cache (namespace, expires_at)")
+
+    # --- đọc/ghi ---
+
+    def _lookup(self, namespace, key):
+        """ (giá trị, tầng) với tầng là "l1" | "l2", hoặc (None, None) nếu không có/hết hạn. """
+        value = self.l1.get((namespace, key))
+        if value is not None:
+            return value, "l1"
+        row = storage.fetchone(
+            self.db_file,
+            "SELECT value, expires_at FROM kv_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        )
+        if row is None:
+            return None, None
+        value = json.loads(row[0])
+        self.l1.set((namespace, key), value, expires_at=row[1])
+        return value, "l2"
+
+    def get(self, namespace, key):
+        """ Trả về giá trị còn hạn hoặc None (L1 trước, rồi SQLite). """
+        self._config(namespace)
+        value, tier = self._lookup(namespace, key)
+        self._count(namespace, f"hits_{tier}" if tier else "misses")
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        config = self._config(namespace)
+        expires_at = time.time() + (ttl if ttl is not None else config.ttl)
+        payload = json.dumps(value, ensure_ascii=False)
+        storage.execute(
+            self.db_file,
+            "INSERT OR REPLACE INTO kv_cache (namespace, key, value, expires_at, size) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, payload, expires_at, len(payload.encode("utf-8")))
+        )
+        self.l1.set((namespace, key), value, expires_at=expires_at)
+        self._count(namespace, "sets")
+        with self._lock:
+            self._writes_since_evict[namespace] += 1
+            due = self._writes_since_evict[namespace] >= EVICT_EVERY
+            if due:
+                self._writes_since_evict[namespace] = 0
+        if due:
+            self.evict(namespace)
+
+    def delete(self, namespace, key):
+        self.l1.invalidate((namespace, key))
+        storage.execute(self.db_file, "DELETE FROM kv_cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def get_or_compute(self, namespace, key, compute, ttl=None, should_cache=bool):
+        """
+        Trả về giá trị trong cache, hoặc gọi `compute()` (một lần cho mỗi khóa dù
+        có nhiều request đồng thời) rồi lưu lại nếu `should_cache(giá trị)` đúng.
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+
+        def load():
+            cached, _ = self._lookup(namespace, key)  # có thể vừa được lượt trước ghi xong
+            if cached is not None:
+                return cached
+            fresh = compute()
+            if should_cache(fresh):
+                self.set(namespace, key, fresh, ttl=ttl)
+            return fresh
+
+        return self.flight.do((namespace, key), load)
+
+    async def get_or_compute_async(self, namespace, key, compute, ttl=None, should_cache=bool):
+        """ Như `get_or_compute` nhưng `compute()` là coroutine (gộp chung với lời gọi sync cùng khóa). """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+        return await self.fill_async(namespace, key, compute, ttl=ttl, should_cache=should_cache)
+
+    async def fill_async(self, namespace, key, compute, ttl=None, should_cache=bool):
+        """
+        Phần "compute" của `get_or_compute_async` cho khóa mà người gọi đã `get`
+        và thấy miss (ví dụ khi tra trước cả lô khóa rồi mới gọi upstream cho phần thiếu).
+        """
+        async def load():
+            cached, _ = self._lookup(namespace, key)
+            if cached is not None:
+                return cached
+            fresh = await compute()
+            if should_cache(fresh):
+                self.set(namespace, key, fresh, ttl=ttl)
+            return fresh
+
+        return await self.flight.do_async((namespace, key), load)
+
+    # --- dọn dẹp ---
+
+    def purge_expired(self):
+        now = time.time()
+        with storage.transaction(self.db_file) as conn:
+            rows = conn.execute(
+                "SELECT namespace, COUNT(*) FROM kv_cache WHERE expires_at <= ? GROUP BY namespace", (now,)
+            ).fetchall()
+            conn.execute("DELETE FROM kv_cache WHERE expires_at <= ?", (now,))
+        for namespace, count in rows:
+            if namespace in self._stats:
+                self._count(namespace, "expired_purged", count)
+        return sum(count for _, count in rows)
+
+    def evict(self, namespace):
+        """ Dọn mục hết hạn rồi giữ lại các mục còn hạn lâu nhất trong giới hạn số mục/byte. """
+        config = self._config(namespace)
+        self.purge_expired()
+        with storage.transaction(self.db_file) as conn:
+            evicted = conn.execute("""
+                DELETE FROM kv_cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM (
+                        SELECT key,
+                               ROW_NUMBER() OVER (ORDER BY expires_at DESC) AS position,
+                               SUM(size) OVER (ORDER BY expires_at DESC ROWS UNBOUNDED PRECEDING) AS running_bytes
+                        FROM kv_cache WHERE namespace = ?
+                    ) WHERE position > ? OR running_bytes > ?
+                )
+            """, (namespace, namespace, config.max_entries, config.max_bytes)).rowcount
+        if evicted:
+            self.l1.clear()  # không biết khóa nào bị bỏ; L1 sẽ tự nạp lại từ SQLite
+            self._count(namespace, "evictions", evicted)
+        return evicted
+
+    # --- chuyển dữ liệu từ các bảng cache cũ ---
+
+    def import_legacy_table(self, db_file, table, key_column, value_column, namespace, iso_expiry=False):
+        """
+        Chép các mục còn hạn của bảng cache cũ (ai_cache/youtube_cache) sang kv_cache
+        rồi xóa bảng cũ. Chạy lại nhiều lần không sao: bảng đã xóa thì bỏ qua, mục
+        đã chép không bị ghi đè (INSERT OR IGNORE). Trả về số mục đã chép.
+        """
+        if not os.path.exists(db_file):  # không tạo file CSDL rỗng chỉ để kiểm tra
+            return 0
+        exists = storage.fetchone(db_file, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if not exists:
+            return 0
+        now = time.time()
+        rows = storage.fetchall(db_file, f"SELECT {key_column}, {value_column}, expires_at FROM {table}")
+        imported = []
+        for key, value, expires_at in rows:
+            try:
+                expires_at = datetime.fromisoformat(expires_at).timestamp() if iso_expiry else float(expires_at)
+                json.loads(value)
+            except (TypeError, ValueError):
+                continue
+            if expires_at > now:
+                imported.append((namespace, key, value, expires_at, len(value.encode("utf-8"))))
+        with storage.transaction(self.db_file) as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO kv_cache (namespace, key, value, expires_at, size) VALUES (?, ?, ?, ?, ?)",
+                imported
+            )
+        storage.execute(db_file, f"DROP TABLE IF EXISTS {table}")
+        if imported:
+            print(f"✅ Đã chuyển {len(imported)} mục từ {table} ({os.path.basename(db_file)}) sang kv_cache[{namespace}].")
+        return len(imported)
+
+    def drop_legacy_table(self, db_file, table):
+        """ Xóa bảng cache cũ không còn dùng được (khóa/dạng dữ liệu đã đổi). Trả về True nếu có xóa. """
+        if not os.path.exists(db_file):
+            return False
+        exists = storage.fetchone(db_file, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if exists:
+            storage.execute(db_file, f"DROP TABLE IF EXISTS {table}")
+        return exists is not None
+
+    def rekey(self, namespace, prefix, new_key):
+        """
+        Đổi khóa các mục của `namespace` có khóa bắt đầu bằng `prefix` theo
+        `new_key(khóa cũ)` (trả về None để bỏ mục; khóa mới không được bắt đầu bằng
+        `prefix`). Nhiều khóa cũ gộp về cùng một khóa mới thì giữ mục còn hạn lâu
+        nhất. Trả về số mục đã ghi vào khóa mới.
+        """
+        with storage.transaction(self.db_file) as conn:
+            rows = conn.execute(
+                "SELECT key, value, expires_at, size FROM kv_cache "
+                "WHERE namespace = ? AND substr(key, 1, ?) = ? AND expires_at > ? ORDER BY expires_at DESC",
+                (namespace, len(prefix), prefix, time.time())
+            ).fetchall()
+            moved = []
+            for key, value, expires_at, size in rows:
+                target = new_key(key)
+                if target is not None:
+                    moved.append((namespace, target, value, expires_at, size))
+            inserted = conn.executemany(
+                "INSERT OR IGNORE INTO kv_cache (namespace, key, value, expires_at, size) VALUES (?, ?, ?, ?, ?)",
+                moved
+            ).rowcount
+            conn.execute("DELETE FROM kv_cache WHERE namespace = ? AND substr(key, 1, ?) = ?", (namespace, len(prefix), prefix))
+        self.l1.clear()
+        return max(inserted, 0)
+
+    # --- thống kê ---
+
+    def stats(self):
+        rows = storage.fetchall(
+            self.db_file,
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM kv_cache WHERE expires_at > ? GROUP BY namespace",
+            (time.time(),)
+        )
+        stored = {namespace: (count, size) for namespace, count, size in rows}
+        with self._lock:
+            result = {}
+            for namespace, counters in self._stats.items():
+                lookups = counters["hits_l1"] + counters["hits_l2"] + counters["misses"]
+                count, size = stored.get(namespace, (0, 0))
+                result[namespace] = {
+                    **counters,
+                    "hit_rate": round((counters["hits_l1"] + counters["hits_l2"]) / lookups, 4) if lookups else 0.0,
+                    "entries": count,
+                    "bytes": size,
+                    "ttl": self.namespaces[namespace].ttl,
+                }
+        return {"namespaces": result, "l1": self.l1.stats(), "upstream": self.flight.stats()}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_cache():
+    """ Cache dùng chung của tiến trình (tạo lười ở lần gọi đầu). """
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = TieredCache()
+    return _shared
@@ -0,0 +1,77 @@
+"""
+Giữ một mô hình được nạp nền (background) và hoán đổi nguyên tử.
+
+Request đọc `get()` không cần khóa; trong lúc mô hình chưa nạp xong,
+`status()` trả về "warming" để route trả lời rõ ràng thay vì chặn.
+Các cập nhật (`update`) được tuần tự hóa và chỉ thay tham chiếu một lần.
+"""
+import threading
+import time
+
+
+class ModelHolder:
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, name):
+        self.name = name
+        self._model = None
+        self._write_lock = threading.Lock()
+        self._ready = threading.Event()
+        self.error = None
+        self.load_seconds = None
+        self.updates_applied = 0
+
+    def get(self):
+        return self._model
+
+    def status(self):
+        if self._ready.is_set():
+            return self.READY if self._model is not None else self.FAILED
+        return self.WARMING
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def swap(self, model):
+        with self._write_lock:
+            self._model = model
+        self._ready.set()
+
+    def update(self, fn):
+        """ Tính mô hình mới bằng `fn(mô hình hiện tại)` rồi hoán đổi nếu có thay đổi. """
+        with self._write_lock:
+            current = self._model
+            if current is None:
+                return None
+            updated = fn(current)
+            if updated is not current:
+                self._model = updated
+                self.updates_applied += 1
+            return updated
+
+    def load_in_background(self, loader):
+        """ Chạy `loader()` trong thread nền; kết quả None hoặc lỗi -> trạng thái failed. """
+        def run():
+            start = time.perf_counter()
+            try:
+                model = loader()
+            except Exception as e:
+                print(f"❌ LỖI: Không thể nạp mô hình {self.name}. Lý do: {e}")
+                self.error = str(e)
+                model = None
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self.swap(model)
+
+        thread = threading.Thread(target=run, name=f"load-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {
+            "status": self.status(),
+            "load_seconds": self.load_seconds,
+            "updates_applied": self.updates_applied,
+            "error": self.error,
+        }
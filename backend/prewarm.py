@@ -0,0 +1,158 @@
+"""
+Làm nóng trước (pre-warm) cache TLU cho các sinh viên đang hoạt động.
+
+Một thread nền định kỳ duyệt danh sách sinh viên (phiên đăng nhập đang có +
+bảng students), tìm các mục api_cache sắp hết CACHE_DURATION và làm mới chúng
+TRƯỚC khi hết hạn, để request của người dùng luôn trúng cache kể cả lúc đầu
+học kỳ khi mọi người cùng đăng nhập.
+
+- Lời gọi tới TLU đi qua một RateLimiter (token bucket) dùng chung.
+- Có jitter ở chu kỳ quét và ở thời điểm coi một mục là "đến hạn" để các
+  worker/tiến trình không dồn lời gọi vào cùng một lúc.
+- Nếu truyền `lease`, chỉ tiến trình đang giữ lease mới quét (nhiều worker
+  gunicorn không nhân bản ngân sách rate limit); lease được gia hạn trong lúc quét.
+- Độ trễ làm mới (refresh lag) = lúc làm mới xong - lúc mục đến hạn.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class PrewarmScheduler:
+    def __init__(self, list_students, get_timestamps, refresh, rate_limiter, can_refresh=None,
+                 data_types=("marks", "schedule"), call_cost=None,
+                 ttl=3600, lead_time=300, interval=60, jitter=0.2, lease=None):
+        """
+        list_students() -> danh sách student_id cần giữ ấm.
+        get_timestamps() -> {(student_id, data_type): timestamp lần ghi cache}.
+        refresh(student_id, data_type) -> "refreshed" | "failed" | "no_session" | "inflight".
+        can_refresh(student_id) -> False nếu chắc chắn không làm mới được (ví dụ chưa có token),
+            để không tốn lượt rate limit.
+        call_cost: số lời gọi TLU của mỗi loại dữ liệu (để trừ đúng số lượt rate limit).
+        lease() -> True nếu tiến trình này được phép quét (giành/gia hạn lease dùng chung).
+        """
+        self._list_students = list_students
+        self._get_timestamps = get_timestamps
+        self._refresh = refresh
+        self._can_refresh = can_refresh or (lambda student_id: True)
+        self.rate_limiter = rate_limiter
+        self.data_types = data_types
+        self.call_cost = call_cost or {}
+        self.ttl = ttl
+        self.lead_time = lead_time
+        self.interval = interval
+        self.jitter = jitter
+        self._lease = lease
+        self._lease_checked_at = None
+        self.is_leader = lease is None
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.skipped_runs = 0  # vòng bỏ qua vì tiến trình khác đang giữ lease
+        self.last_run_at = None
+        self.last_run_seconds = None
+        self.outcomes = {"refreshed": 0, "failed": 0, "no_session": 0, "inflight": 0}
+        self.expired_before_refresh = 0  # làm mới khi mục đã quá TTL (người dùng có thể đã nhận dữ liệu cũ)
+        self._lags = deque(maxlen=1000)  # giây
+
+    # --- vòng đời ---
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)):
+            try:
+                if self._hold_lease():
+                    self.run_once()
+                else:
+                    with self._lock:
+                        self.skipped_runs += 1
+            except Exception as e:
+                print(f"LỖI: Vòng làm nóng cache thất bại. Lý do: {e}")
+
+    def _hold_lease(self):
+        """ Giành/gia hạn lease (tối đa mỗi nửa `interval` một lần). Không có lease -> luôn True. """
+        if self._lease is None:
+            return True
+        now = time.monotonic()
+        if self._lease_checked_at is None or now - self._lease_checked_at >= self.interval / 2:
+            self._lease_checked_at = now
+            try:
+                self.is_leader = bool(self._lease())
+            except Exception as e:
+                print(f"LỖI: Không thể giành lease làm nóng cache. Lý do: {e}")
+                self.is_leader = False
+        return self.is_leader
+
+    # --- một vòng quét ---
+
+    def due_entries(self, now=None):
+        """ Các (student_id, data_type, due_at, expires_at) cần làm mới, mục đến hạn sớm nhất trước. """
+        now = now or time.time()
+        timestamps = self._get_timestamps()
+        due = []
+        for student_id in dict.fromkeys(self._list_students()):
+            for data_type in self.data_types:
+                written_at = timestamps.get((student_id, data_type))
+                if written_at is None:
+                    due.append((student_id, data_type, now, None))  # chưa có trong cache: làm ngay
+                    continue
+                due_at = written_at + self.ttl - self.lead_time - random.uniform(0, self.jitter * self.lead_time)
+                if due_at <= now:
+                    due.append((student_id, data_type, due_at, written_at + self.ttl))
+        due.sort(key=lambda entry: entry[2])
+        return due
+
+    def run_once(self):
+        start = time.time()
+        for student_id, data_type, due_at, expires_at in self.due_entries(start):
+            if self._stop.is_set() or not self._hold_lease():
+                break
+            if self._can_refresh(student_id):
+                self.rate_limiter.acquire(self.call_cost.get(data_type, 1))
+                outcome = self._refresh(student_id, data_type)
+            else:
+                outcome = "no_session"
+            finished = time.time()
+            with self._lock:
+                self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+                if outcome == "refreshed":
+                    self._lags.append(max(0.0, finished - due_at))
+                    if expires_at is not None and finished > expires_at:
+                        self.expired_before_refresh += 1
+        with self._lock:
+            self.runs += 1
+            self.last_run_at = start
+            self.last_run_seconds = round(time.time() - start, 3)
+
+    def stats(self):
+        with self._lock:
+            lags = np.array(self._lags)
+            return {
+                "running": self._thread is not None and not self._stop.is_set(),
+                "leader": self.is_leader,
+                "runs": self.runs,
+                "skipped_runs": self.skipped_runs,
+                "last_run_at": self.last_run_at,
+                "last_run_seconds": self.last_run_seconds,
+                **self.outcomes,
+                "expired_before_refresh": self.expired_before_refresh,
+                "lag_seconds_p50": round(float(np.percentile(lags, 50)), 3) if len(lags) else None,
+                "lag_seconds_p95": round(float(np.percentile(lags, 95)), 3) if len(lags) else None,
+                "lag_seconds_max": round(float(lags.max()), 3) if len(lags) else None,
+                "rate_limit_wait_seconds": round(self.rate_limiter.waited_seconds, 3),
+            }
@@ -1,18 +1,20 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sklearn.linear_model import LinearRegression
 import random
 import hashlib
 import pandas as pd
 import requests
+import httpx
 import os
 from dotenv import load_dotenv
 import json
-import sqlite3
-from datetime import datetime, timedelta
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-import google.generativeai as genai
+import storage
+import threading
+import unicodedata
+from memory_cache import MemoryCache
+from kv_cache import get_cache
+from tlu_extract import compile_fields, extract_columns
 
 # Đã nạp file .env để lấy key
 load_dotenv()
@@ -23,145 +25,188 @@ if not YOUTUBE_API_KEY:
     print("⚠️ CẢNH BÁO: Chưa nạp đủ YOUTUBE_API_KEY")
 if not GEMINI_API_KEY:
     print("⚠️ CẢNH BÁO: Chưa nạp đủ GEMINI_API_KEY. AI trình gửi sẽ bị Tắt.")
-else:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("✅ Đã nạp thành công Google Gemini AI.")
-    except Exception as e:
-        print(f"❌ Lỗi khi cấu hình Gemini AI: {e}")
-        GEMINI_API_KEY = None
+
+# SDK Gemini nặng (~1s import) nên chỉ nạp và cấu hình ở lần gọi AI đầu tiên
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """ Trả về module google.generativeai đã cấu hình, hoặc None nếu AI bị tắt. """
+    global _genai, GEMINI_API_KEY
+    if _genai is not None or not GEMINI_API_KEY:
+        return _genai
+    with _genai_lock:
+        if _genai is None and GEMINI_API_KEY:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                print("✅ Đã nạp thành công Google Gemini AI.")
+                _genai = genai
+            except Exception as e:
+                print(f"❌ Lỗi khi cấu hình Gemini AI: {e}")
+                GEMINI_API_KEY = None
+    return _genai
 
 # =========================================================
-# Khởi tạo hệ thống cache (AI + YouTube)
+# Cache AI + YouTube: dùng chung kv_cache với app.py
 # =========================================================
-DB_NAME = os.path.join(os.path.dirname(__file__), "ai_youtube_cache.db")
-
-def init_cache_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS ai_cache (
-            prompt TEXT PRIMARY KEY,
-            response TEXT,
-            expires_at TEXT
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS youtube_cache (
-            query TEXT PRIMARY KEY,
-            result TEXT,
-            expires_at TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-    print("✅ Cache DB sẵn sàng (ai_cache + youtube_cache).")
-
-init_cache_db()
-
-# --- Hàm cache AI ---
-def get_ai_cache(prompt):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT response, expires_at FROM ai_cache WHERE prompt=?", (prompt,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        response, expires_at = row
-        if datetime.now() < datetime.fromisoformat(expires_at):
-            print(f"CACHE HIT: AI cache cho '{prompt[:40]}...'")
-            return json.loads(response)
-        else:
-            print(f"CACHE EXPIRED: AI cache cho '{prompt[:40]}...'")
-    return None
-
-def set_ai_cache(prompt, response):
-    expires_at = (datetime.now() + timedelta(hours=12)).isoformat()
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        INSERT OR REPLACE INTO ai_cache (prompt, response, expires_at)
-        VALUES (?, ?, ?)
-    """, (prompt, json.dumps(response), expires_at))
-    conn.commit()
-    conn.close()
-    print(f"CACHE SET: AI cache cho '{prompt[:40]}...'")
-
-# --- Hàm cache YouTube ---
-def get_youtube_cache(query):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT result, expires_at FROM youtube_cache WHERE query=?", (query,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        result, expires_at = row
-        if datetime.now() < datetime.fromisoformat(expires_at):
-            print(f"CACHE HIT: YouTube cache cho '{query[:40]}...'")
-            return json.loads(result)
-        else:
-            print(f"CACHE EXPIRED: YouTube cache cho '{query[:40]}...'")
-    return None
-
-def set_youtube_cache(query, result):
-    expires_at = (datetime.now() + timedelta(hours=12)).isoformat()
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        INSERT OR REPLACE INTO youtube_cache (query, result, expires_at)
-        VALUES (?, ?, ?)
-    """, (query, json.dumps(result), expires_at))
-    conn.commit()
-    conn.close()
-    print(f"CACHE SET: YouTube cache cho '{query[:40]}...'")
+LEGACY_CACHE_DB = os.path.join(os.path.dirname(__file__), "ai_youtube_cache.db")
+
+# Khóa cache Gemini: tên môn chuẩn hóa + dải tiến độ + phiên bản mẫu prompt, để các
+# request gần giống nhau (61% và 62% cùng một môn) dùng chung một lần sinh nội dung.
+# Đổi mẫu prompt trong _call_gemini thì tăng AI_PROMPT_VERSION để bỏ cache cũ.
+AI_PROMPT_VERSION = "v2"
+AI_PROGRESS_BAND = int(os.getenv("AI_PROGRESS_BAND", "10"))
+LEGACY_AI_KEY_PREFIX = "AI_GEMINI_"
+
+_ai_lock = threading.Lock()
+ai_metrics = {"lookups": 0, "gemini_calls": 0, "unavailable": 0, "errors": 0}
+
+def _count_ai(name, n=1):
+    with _ai_lock:
+        ai_metrics[name] += n
+
+def ai_stats():
+    """
+    Số lần tra nội dung AI, số lần gọi Gemini thật (chỉ tính khi request thực sự
+    được gửi đi), số lần trượt cache mà Gemini không khả dụng và tỉ lệ dùng lại từ cache.
+    """
+    with _ai_lock:
+        stats = dict(ai_metrics)
+    misses = stats["gemini_calls"] + stats["unavailable"]
+    stats["hit_rate"] = round(1 - misses / stats["lookups"], 4) if stats["lookups"] else 0.0
+    return stats
+
+def normalize_course_name(course_name):
+    """ Chữ thường, bỏ dấu tiếng Việt (kể cả đ), gộp khoảng trắng: "Giải  Tích 1" -> "giai tich 1". """
+    text = unicodedata.normalize("NFKD", str(course_name).replace("đ", "d").replace("Đ", "D"))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+def progress_band(progress):
+    """ Dải tiến độ (AI_PROGRESS_BAND điểm phần trăm) chứa `progress`, ví dụ (60, 69). """
+    low = int(min(max(float(progress), 0), 100) // AI_PROGRESS_BAND * AI_PROGRESS_BAND)
+    return low, min(low + AI_PROGRESS_BAND - 1, 100)
+
+def ai_cache_key(course_name, progress):
+    low, high = progress_band(progress)
+    return f"gemini|{AI_PROMPT_VERSION}|{normalize_course_name(course_name)}|{low}-{high}"
+
+def _migrate_legacy_ai_key(key):
+    """ "AI_GEMINI_{môn}_{tiến độ}" -> khóa mới; khóa không đọc được thì bỏ. """
+    course_name, _, progress = key[len(LEGACY_AI_KEY_PREFIX):].rpartition("_")
+    try:
+        return ai_cache_key(course_name, float(progress)) if course_name else None
+    except ValueError:
+        return None
+
+def migrate_legacy_caches():
+    """
+    Migration tường minh (gọi từ app.migrate_cache_db, KHÔNG chạy khi import):
+    chuyển các mục còn hạn của bảng ai_cache cũ trong ai_youtube_cache.db
+    (expires_at dạng ISO) sang kv_cache và đổi sang khóa mới; bảng youtube_cache
+    cũ (khóa và dạng kết quả khác hiện tại) chỉ bị xóa. Chạy lại nhiều lần không sao.
+    """
+    cache = get_cache()
+    cache.import_legacy_table(LEGACY_CACHE_DB, "ai_cache", "prompt", "response", "ai", iso_expiry=True)
+    cache.drop_legacy_table(LEGACY_CACHE_DB, "youtube_cache")
+    migrated = cache.rekey("ai", LEGACY_AI_KEY_PREFIX, _migrate_legacy_ai_key)
+    if migrated:
+        print(f"✅ Đã chuyển {migrated} mục cache AI sang khóa mới ({AI_PROMPT_VERSION}).")
+    print("✅ Cache DB sẵn sàng (kv_cache: ai + youtube).")
 
 # --- Các hàm xử lý dữ liệu cơ bản (KHÔNG đổi) ---
 
+# Đường dẫn các trường cần lấy trong JSON TLU (xem tlu_extract: "?" = giá trị rỗng coi như {})
+_MARK_FIELDS = compile_fields({
+    "course": (("subject", "subjectName"), "N/A"),
+    "mark": (("mark",), None),
+})
+_SCHEDULE_FIELDS = compile_fields({
+    "course": (("courseSubject", "semesterSubject", "subject?", "subjectName"), "N/A"),
+    "subjectCode": (("courseSubject", "semesterSubject", "subject?", "subjectCode"), "N/A"),
+    "teacherName": (("courseSubject", "teacher?", "displayName"), "N/A"),
+})
+
+def _mark_to_float(mark):
+    """ Điểm hợp lệ (int/float, kể cả bool như trước) -> float; còn lại -> NaN. """
+    if isinstance(mark, float):
+        return mark
+    if isinstance(mark, int):
+        return float(max(-1e300, min(1e300, mark)))  # int Python không tràn; kẹp trước khi đổi sang float
+    return np.nan
+
+def _titles(values):
+    """ str.title() cho từng tên; tên không phải chuỗi (item hỏng) -> None. """
+    titles = np.empty(len(values), dtype=object)
+    try:
+        titles[:] = [v.title() for v in values]  # đường nhanh: dữ liệu TLU bình thường toàn chuỗi
+    except (AttributeError, TypeError):
+        titles[:] = [v.title() if isinstance(v, str) else None for v in values]
+    return titles
+
+def _first_occurrences(codes):
+    """
+    (chỉ số các phần tử xuất hiện lần đầu, số mã hỏng). Mã không băm được
+    (list/dict) coi là hỏng và bị bỏ. Dùng dict thay pd.Index.duplicated vì
+    nhanh hơn ở cỡ lịch học/bảng điểm (vài chục tới vài trăm môn).
+    """
+    first, unhashable = {}, 0
+    for index, code in enumerate(codes):
+        try:
+            first.setdefault(code, index)
+        except TypeError:
+            unhashable += 1
+    return np.fromiter(first.values(), dtype=np.intp, count=len(first)), unhashable
+
 def process_tlu_data_to_progress(tlu_marks_data, student_id):
-    progress_list = []
-    found_real_data = False 
     if not isinstance(tlu_marks_data, list):
         return generate_mock_data(student_id)
-    for subject in tlu_marks_data:
-        if not isinstance(subject, dict):
-            continue 
-        try:
-            subject_name = subject.get("subject", {}).get("subjectName", "N/A").title()
-            score = subject.get("mark") 
-            if (isinstance(score, (int, float))):
-                progress = int(score * 10) 
-                found_real_data = True
-            else:
-                continue 
-            progress_list.append({"course": subject_name, "progress": max(0, min(100, progress))})
-        except Exception as e:
-            print(f"ERROR: Failed processing one subject (Mark). Reason: {e}")
-    if not found_real_data:
+    columns, skipped = extract_columns(tlu_marks_data, _MARK_FIELDS)
+    titles = _titles(columns["course"])
+    name_ok = titles != None  # noqa: E711 (so sánh từng phần tử)
+    with np.errstate(over="ignore", invalid="ignore"):
+        scaled = np.fromiter(map(_mark_to_float, columns["mark"]), dtype=float, count=len(titles)) * 10
+    keep = name_ok & np.isfinite(scaled)
+    skipped += int((~name_ok).sum())
+    if skipped:
+        print(f"ERROR: Bỏ qua {skipped} môn sai định dạng (Mark).")
+    if not keep.any():
         return generate_mock_data(student_id)
-    return pd.DataFrame(progress_list)
+    return pd.DataFrame({
+        "course": titles[keep],
+        "progress": np.clip(np.trunc(scaled[keep]), 0, 100).astype(np.int64),
+    }, copy=False)
 
 def process_schedule_to_courses(schedule_data, student_id): 
-    processed_subjects, processed_list = set(), []
     if not isinstance(schedule_data, list):
-        return pd.DataFrame(processed_list)
-    for subject in schedule_data:
-        try:
-            if subject is None:
-                continue 
-            subject_details = subject.get("courseSubject", {}).get("semesterSubject", {}).get("subject", {}) or {}
-            subject_name = subject_details.get("subjectName", "N/A").title()
-            subject_code = subject_details.get("subjectCode", "N/A")
-            teacher_details = subject.get("courseSubject", {}).get("teacher", {}) or {}
-            teacher_name = teacher_details.get("displayName", "N/A")
-            if subject_name != "N/A" and subject_code != "N/A":
-                if subject_code not in processed_subjects:
-                    processed_subjects.add(subject_code)
-                    processed_list.append({"course": subject_name, "subjectCode": subject_code, "teacherName": teacher_name, "progress": 0})
-        except Exception as e:
-            print(f"ERROR: Lỗi khi xử lý một môn học (Schedule): {e}")
-    if not processed_list:
-        return generate_mock_data(student_id) 
-    return pd.DataFrame(processed_list)
+        return pd.DataFrame([])
+    columns, skipped = extract_columns(schedule_data, _SCHEDULE_FIELDS)
+    titles = _titles(columns["course"])
+    codes = np.empty(len(titles), dtype=object)
+    codes[:] = columns["subjectCode"]
+    name_ok = titles != None  # noqa: E711 (so sánh từng phần tử)
+    # Khử trùng theo mã môn (giữ lần xuất hiện đầu tiên) trên các dòng hợp lệ
+    valid = np.flatnonzero(name_ok & (titles != "N/A") & (codes != "N/A"))
+    first, unhashable = _first_occurrences(codes[valid])
+    kept = valid[first]
+    skipped += int((~name_ok).sum()) + unhashable
+    if skipped:
+        print(f"ERROR: Bỏ qua {skipped} môn sai định dạng (Schedule).")
+    if not len(kept):
+        return generate_mock_data(student_id)
+    teachers = np.empty(len(titles), dtype=object)
+    teachers[:] = columns["teacherName"]
+    codes, teachers = codes[kept], teachers[kept]
+    courses_df = pd.DataFrame({
+        "course": titles[kept],
+        "subjectCode": codes,
+        "teacherName": teachers,
+        "progress": np.zeros(len(kept), dtype=np.int64),
+    }, copy=False)
+    if any(pd.api.types.infer_dtype(values, skipna=False) != "string" for values in (codes, teachers)):
+        courses_df = courses_df.infer_objects()  # suy kiểu cột như DataFrame(list các dict) trước đây (mã môn dạng số...)
+    return courses_df
 
 def generate_mock_data(student_id):
     mock_courses = [
@@ -181,41 +226,47 @@ def generate_mock_data(student_id):
 # --- Các hàm AI (logic & insight) ---
 
 def build_cf_model_data(csv_data):
+    """ Xây chỉ mục CF thưa (top-K hàng xóm) từ bảng điểm. Trả về CFIndex hoặc None. """
     try:
-        data = csv_data[['Mã SV', 'Tên Môn Học', 'Điểm Tổng Kết (10)']].copy()
-        data = data.dropna(subset=['Điểm Tổng Kết (10)'])
-        data['Tên Môn Học'] = data['Tên Môn Học'].str.title()
-        utility_matrix = data.pivot_table(index='Mã SV', columns='Tên Môn Học', values='Điểm Tổng Kết (10)').fillna(0)
-        similarity_matrix = pd.DataFrame(cosine_similarity(utility_matrix.values),
-                                         index=utility_matrix.index,
-                                         columns=utility_matrix.index)
-        return utility_matrix, similarity_matrix
+        from cf_index import build_cf_index
+        return build_cf_index(csv_data)
     except Exception as e:
         print(f"Lỗi khi xây dựng mô hình CF: {e}")
-        return None, None
+        return None
 
-def get_cf_recommendations(student_id_int, utility_matrix, similarity_matrix, num_recs=5):
+def get_cf_recommendations(student_id_int, cf_model, num_recs=5):
+    """ Trả lời từ chỉ mục đã tính sẵn: O(K·số môn), không dựng lại ma trận. """
     try:
-        if student_id_int not in similarity_matrix.index:
-            return []
-        sim_scores = similarity_matrix[student_id_int].drop(student_id_int)
-        top_neighbors = sim_scores.nlargest(5).index
-        if top_neighbors.empty:
-            return []
-        neighbor_scores = utility_matrix.loc[top_neighbors]
-        avg_scores = neighbor_scores.mean(axis=0)
-        user_scores = utility_matrix.loc[student_id_int]
-        unseen_courses = user_scores[user_scores == 0].index
-        if unseen_courses.empty:
-            return []
-        recommended_scores = avg_scores[unseen_courses]
-        top_cf_recs = recommended_scores.nlargest(num_recs)
-        return [{"course": course, "predicted_score": round(score, 1)} 
-                for course, score in top_cf_recs.items() if score > 0]
+        return cf_model.recommend(student_id_int, num_recs=num_recs)
     except Exception as e:
         print(f"Lỗi khi tính toán CF: {e}")
         return []
 
+def extract_cf_grade_rows(tlu_marks_data, student_id_int):
+    """
+    Chuyển điểm TLU thành các dòng (student_id, tên môn, điểm hệ 10) cho mô hình CF
+    — cùng dữ liệu mà data_synchronizer ghi vào bảng grades.
+    """
+    rows = []
+    if not isinstance(tlu_marks_data, list):
+        return rows
+    for subject in tlu_marks_data:
+        if not isinstance(subject, dict):
+            continue
+        subject_name = (subject.get("subject") or {}).get("subjectName")
+        score = subject.get("mark")
+        if subject_name and isinstance(score, (int, float)):
+            rows.append((student_id_int, subject_name.title(), float(score)))
+    return rows
+
+def get_cf_recommendations_batch(student_ids, cf_model, num_recs=5):
+    """ Gợi ý CF cho cả danh sách sinh viên trong một lượt tính ma trận. """
+    try:
+        return cf_model.recommend_batch(student_ids, num_recs=num_recs)
+    except Exception as e:
+        print(f"Lỗi khi tính toán CF (batch): {e}")
+        return {sid: [] for sid in student_ids}
+
 # =========================================================
 # Hàm Insight (K-Means, rule-based) -- phiên bản đơn giản
 # =========================================================
@@ -253,22 +304,56 @@ def get_insight_logic(progress_data):
         print(f"Lỗi khi chạy phân tích insight theo quy tắc: {e}")
     return {"insights": insights}
 
-def predict_future_logic(progress_data):
-    future_preds = []
+# Dự báo: mô phỏng 5 tuần lịch sử quanh tiến độ hiện tại rồi ngoại suy tuyến tính
+# tuần thứ 6. Nhiễu được sinh từ seed băm theo dữ liệu nên cùng đầu vào luôn cho
+# cùng kết quả -> cache được theo sinh viên.
+FORECAST_WEEKS = 5
+FORECAST_NOISE_STD = 5
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+_prediction_cache = MemoryCache(maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", "1024")), ttl=PREDICTION_CACHE_TTL)
+
+
+def _progress_fingerprint(courses, progress):
+    payload = "\n".join(f"{course}\t{value:.6f}" for course, value in zip(courses, progress))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def simulate_progress_history(progress, fingerprint, weeks=FORECAST_WEEKS):
+    """ Ma trận (số môn x weeks) điểm các tuần trước, sinh tất định từ `fingerprint`. """
+    rng = np.random.default_rng(int(fingerprint[:16], 16))
+    noise = rng.normal(0, FORECAST_NOISE_STD, size=(len(progress), weeks))
+    return np.clip(progress[:, None] + noise, 40, 100)
+
+
+def forecast_next_week(history):
+    """ Hồi quy tuyến tính (bình phương tối thiểu, dạng đóng) cho mọi hàng cùng lúc; trả về giá trị tuần kế tiếp. """
+    weeks = history.shape[1]
+    x = np.arange(1, weeks + 1, dtype=float)
+    x_centered = x - x.mean()
+    slope = history @ x_centered / (x_centered @ x_centered)
+    intercept = history.mean(axis=1) - slope * x.mean()
+    return intercept + slope * (weeks + 1)
+
+
+def predict_future_logic(progress_data, student_id=None):
     if progress_data.empty:
         return {"predictions": []}
-    for index, row in progress_data.iterrows():
-        current_progress = float(row["progress"])
-        past_scores = np.clip(np.random.normal(current_progress, 5, size=5), 40, 100)
-        X = np.arange(1, 6).reshape(-1, 1)
-        model = LinearRegression().fit(X, past_scores)
-        next_week = float(model.predict([[6]])[0])
-        risk = max(0, min(100, 100 - next_week))
-        future_preds.append({
-            "course": row["course"],
-            "predicted_progress": round(next_week, 1),
-            "risk": round(risk, 1)
-        })
+    courses = progress_data["course"].tolist()
+    progress = progress_data["progress"].to_numpy(dtype=float)
+    fingerprint = _progress_fingerprint(courses, progress)
+
+    cache_key = (student_id, fingerprint) if student_id is not None else None
+    if cache_key is not None:
+        cached = _prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    next_week = forecast_next_week(simulate_progress_history(progress, fingerprint))
+    risk = np.clip(100 - next_week, 0, 100)
+    future_preds = [
+        {"course": course, "predicted_progress": round(float(pred), 1), "risk": round(float(r), 1)}
+        for course, pred, r in zip(courses, next_week, risk)
+    ]
     warnings = [
         {
             "course": r["course"],
@@ -278,7 +363,10 @@ def predict_future_logic(progress_data):
         }
         for r in sorted(future_preds, key=lambda x: -x["risk"])
     ]
-    return {"predictions": warnings}
+    result = {"predictions": warnings}
+    if cache_key is not None:
+        _prediction_cache.set(cache_key, result)
+    return result
 
 # =========================================================
 # Hàm gọi GEMINI AI để gợi ý học tập
@@ -287,14 +375,22 @@ def generate_ai_driven_content(course_name, progress):
     if not GEMINI_API_KEY:
         print("Tắt AI: Không có GEMINI_API_KEY.")
         return None
-    prompt = f"AI_GEMINI_{course_name}_{progress}"
-    cached = get_ai_cache(prompt)
-    if cached:
-        return cached
+    _count_ai("lookups")
+    # Các request đồng thời cùng khóa chỉ gọi Gemini một lần
+    return get_cache().get_or_compute("ai", ai_cache_key(course_name, progress),
+                                      lambda: _call_gemini(course_name, progress))
+
+def _call_gemini(course_name, progress):
+    genai = get_genai()
+    if genai is None:
+        _count_ai("unavailable")
+        print("Tắt AI: Không thể khởi tạo Gemini AI.")
+        return None
     try:
         model = genai.GenerativeModel("gemini-2.0-flash")
+        low, high = progress_band(progress)  # nội dung dùng chung cho cả dải nên prompt chỉ nêu dải
         prompt_text = f"""
-        Một sinh viên Việt Nam đang học yếu môn "{course_name}" (tiến độ: {progress}%).
+        Một sinh viên Việt Nam đang học yếu môn "{course_name}" (tiến độ: khoảng {low}-{high}%).
         Tạo JSON có dạng:
         {{
           "roadmap": ["Lời khuyên 1", "Lời khuyên 2", "Lời khuyên 3", "Lời khuyên 4"],
@@ -302,23 +398,25 @@ def generate_ai_driven_content(course_name, progress):
         }}
         """
         print(f"➡️ Đang gọi Gemini AI cho môn: {course_name}...")
+        _count_ai("gemini_calls")
         response = model.generate_content(
             prompt_text,
             generation_config=genai.types.GenerationConfig(response_mime_type="application/json")
         )
         cleaned_text = response.text.strip().replace("```json", "").replace("```", "")
         ai_content = json.loads(cleaned_text)
-        set_ai_cache(prompt, ai_content)
         print(f"✅ AI trả về gợi ý cho: {course_name}")
         return ai_content
     except Exception as e:
+        _count_ai("errors")
         print(f"❌ Lỗi khi gọi Gemini AI cho môn {course_name}: {e}")
         return None
 
-def get_fallback_recommendation(course_name, progress):
+def get_fallback_recommendation(course_name, progress, with_videos=True):
     """
     Hàm dự phòng (fallback) nếu AI bị lỗi.
-    Dùng template cố định.
+    Dùng template cố định. `with_videos=False` bỏ qua lời gọi YouTube
+    (dùng khi môn học đã trễ deadline của request).
     """
     print(f"⚠️ Dùng gợi ý dự phòng (template) cho môn: {course_name}")
     roadmap = [
@@ -329,7 +427,7 @@ def get_fallback_recommendation(course_name, progress):
     else:
         roadmap.append("Tập trung vào các chủ đề nâng cao và bài tập lớn cần vượt trội.")
     roadmap.append("Tìm đường hướng học với giảng viên hoặc người có kinh nghiệm.")
-    videos = search_youtube_videos(f"bài giảng {course_name}")
+    videos = search_youtube_videos(f"bài giảng {course_name}") if with_videos else []
     query_safe_course = course_name.replace(' ', '+')
     documents = [
         {
@@ -353,107 +451,264 @@ def get_fallback_recommendation(course_name, progress):
 # =========================================================
 # Hàm logic chính gợi ý học tập
 # =========================================================
+def _parse_ai_content(ai_content):
+    """ Tách roadmap và video_topics từ JSON Gemini trả về (dict hoặc list). """
+    if isinstance(ai_content, dict):
+        return ai_content.get("roadmap", []), ai_content.get("video_topics", [])
+    if isinstance(ai_content, list):
+        if len(ai_content) > 0 and isinstance(ai_content[0], dict):
+            return ai_content[0].get("roadmap", []), ai_content[0].get("video_topics", [])
+        return ai_content, []
+    return [], []
+
+def _build_improve_item(course, progress, roadmap, videos):
+    query_safe_course = course.replace(' ', '+')
+    documents = [
+        {"title": f"Tải tài liệu {course} (Google)", "url": f"https://www.google.com/search?q=tải+{query_safe_course}+pdf"}
+    ]
+    exercises = [
+        {"title": f"Tìm bài tập {course} (Google)", "url": f"https://www.google.com/search?q=bài+tập+{query_safe_course}"}
+    ]
+    return {
+        "course": course,
+        "progress": progress,
+        "roadmap": roadmap,
+        "resources": {"videos": videos, "documents": documents, "exercises": exercises}
+    }
+
+def _build_fallback_item(course, progress, with_videos=True):
+    fallback_data = get_fallback_recommendation(course, progress, with_videos=with_videos)
+    return {
+        "course": course,
+        "progress": progress,
+        "roadmap": fallback_data["roadmap"],
+        "resources": {
+            "videos": fallback_data["videos"],
+            "documents": fallback_data["documents"],
+            "exercises": fallback_data["exercises"]
+        }
+    }
+
+def _summarize_recommendations(improve_recommendations, discover_recommendations):
+    message = "Dưới đây là các gợi ý tốt nhất cho bạn."
+    if not improve_recommendations and not discover_recommendations:
+        message = "🎉 Bạn học tốt! AI không tìm thấy gợi ý nào cần thiết."
+    elif not improve_recommendations:
+        message = "🔍 Các môn học của bạn khá ổn! Dưới đây là gợi ý khám phá thêm."
+    return {
+        "message": message,
+        "improve_recommendations": improve_recommendations,
+        "discover_recommendations": discover_recommendations
+    }
+
+def _discover_recommendations(student_id_int, cf_model_data):
+    if cf_model_data is not None and student_id_int:
+        return get_cf_recommendations(student_id_int, cf_model_data, num_recs=5)
+    return []
+
+# Fan-out song song: mỗi môn yếu là một task (Gemini + các video), có deadline chung
+RECOMMENDATION_DEADLINE = float(os.getenv("RECOMMENDATION_DEADLINE", "8"))
+MAX_PARALLEL_AI_CALLS = int(os.getenv("MAX_PARALLEL_AI_CALLS", "4"))
+# Pool riêng (không gắn với event loop của request) để lời gọi Gemini trễ deadline
+# vẫn chạy nốt và ghi cache mà không bắt response phải chờ khi loop đóng.
+_ai_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ai-fanout")
+
+async def _run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_ai_executor, fn, *args)
+
+async def _improve_course_async(course, progress, client, ai_semaphore):
+    async with ai_semaphore:
+        ai_content = await _run_blocking(generate_ai_driven_content, course, progress)
+    if not ai_content:
+        return await _run_blocking(_build_fallback_item, course, progress)
+    roadmap, video_topics = _parse_ai_content(ai_content)
+    video_lists = await search_youtube_videos_many_async(video_topics, max_results=1, client=client)
+    videos = [video for found in video_lists for video in found]
+    return _build_improve_item(course, progress, roadmap, videos)
+
 def get_recommendation_logic(progress_data, student_id_int, cf_model_data, materials_db=None):
     """
     Logic gợi ý tổng hợp:
     1. Gợi ý 'Cần cải thiện': Dựa trên Gemini AI
     2. Gợi ý 'Khám phá': Dựa trên mô hình CF (CSV)
     """
+    return asyncio.run(get_recommendation_logic_async(progress_data, student_id_int, cf_model_data, materials_db))
+
+async def get_recommendation_logic_async(progress_data, student_id_int, cf_model_data, materials_db=None,
+                                         deadline=None):
+    """
+    Bản async của get_recommendation_logic.
+    Các môn yếu được xử lý đồng thời (Gemini chạy trong thread phụ, tối đa
+    MAX_PARALLEL_AI_CALLS lời gọi cùng lúc; video YouTube gọi song song qua
+    httpx). Môn nào chưa xong khi hết `deadline` giây sẽ dùng gợi ý dự phòng
+    (không gọi YouTube) thay vì chặn cả response.
+    """
+    if deadline is None:
+        deadline = RECOMMENDATION_DEADLINE
     # --- 1. Gợi ý 'Cần cải thiện' (TLU API + Gemini AI) ---
+    low_courses = [(row["course"], row["progress"]) for index, row in progress_data.iterrows() if row["progress"] < 70]
     improve_recommendations = []
-    low_courses = [row for index, row in progress_data.iterrows() if row["progress"] < 70]
-    for course_data in low_courses:
-        course = course_data["course"]
-        progress = course_data["progress"]
-        ai_content = generate_ai_driven_content(course, progress)
-        roadmap, videos, documents, exercises = [], [], [], []
-        if ai_content:
-            if isinstance(ai_content, dict):
-                roadmap = ai_content.get("roadmap", [])
-                video_topics = ai_content.get("video_topics", [])
-            elif isinstance(ai_content, list):
-                if len(ai_content) > 0 and isinstance(ai_content[0], dict):
-                    roadmap = ai_content[0].get("roadmap", [])
-                    video_topics = ai_content[0].get("video_topics", [])
-                else:
-                    roadmap = ai_content
-                    video_topics = []
-            else:
-                roadmap, video_topics = [], []
-
-            for topic in video_topics:
-                videos.extend(search_youtube_videos(topic, max_results=1))
-            query_safe_course = course.replace(' ', '+')
-            documents = [
-                {"title": f"Tải tài liệu {course} (Google)", "url": f"https://www.google.com/search?q=tải+{query_safe_course}+pdf"}
-            ]
-            exercises = [
-                {"title": f"Tìm bài tập {course} (Google)", "url": f"https://www.google.com/search?q=bài+tập+{query_safe_course}"}
+    if low_courses:
+        ai_semaphore = asyncio.Semaphore(MAX_PARALLEL_AI_CALLS)
+        async with httpx.AsyncClient(timeout=YOUTUBE_TIMEOUT) as client:
+            tasks = [
+                asyncio.create_task(_improve_course_async(course, progress, client, ai_semaphore))
+                for course, progress in low_courses
             ]
-        else:
-            fallback_data = get_fallback_recommendation(course, progress)
-            roadmap = fallback_data["roadmap"]
-            videos = fallback_data["videos"]
-            documents = fallback_data["documents"]
-            exercises = fallback_data["exercises"]
-
-        improve_recommendations.append({
-            "course": course,
-            "progress": progress,
-            "roadmap": roadmap,
-            "resources": {"videos": videos, "documents": documents, "exercises": exercises}
-        })
+            done, pending = await asyncio.wait(tasks, timeout=deadline)
+            for task in pending:
+                task.cancel()
+            # Chờ các task bị hủy kết thúc hẳn trước khi đóng client (tránh dùng client đã đóng)
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, (course, progress) in zip(tasks, low_courses):
+                if task in done and task.exception() is None:
+                    improve_recommendations.append(task.result())
+                    continue
+                if task in done:
+                    print(f"❌ Lỗi khi tạo gợi ý cho môn {course}: {task.exception()}")
+                else:
+                    print(f"⏱️ Quá deadline {deadline}s cho môn {course}, dùng gợi ý dự phòng.")
+                improve_recommendations.append(_build_fallback_item(course, progress, with_videos=False))
     # --- 2. Gợi ý 'Khám phá' (mô hình CF) ---
-    discover_recommendations = []
-    if cf_model_data and student_id_int:
-        utility_matrix, similarity_matrix = cf_model_data
-        if utility_matrix is not None and similarity_matrix is not None:
-            discover_recommendations = get_cf_recommendations(student_id_int,
-                                                               utility_matrix,
-                                                               similarity_matrix,
-                                                               num_recs=5)
+    discover_recommendations = _discover_recommendations(student_id_int, cf_model_data)
     # --- 3. Tổng hợp kết quả ---
-    message = "Dưới đây là các gợi ý tốt nhất cho bạn."
-    if not improve_recommendations and not discover_recommendations:
-        message = "🎉 Bạn học tốt! AI không tìm thấy gợi ý nào cần thiết."
-    elif not improve_recommendations:
-        message = "🔍 Các môn học của bạn khá ổn! Dưới đây là gợi ý khám phá thêm."
-    return {
-        "message": message,
-        "improve_recommendations": improve_recommendations,
-        "discover_recommendations": discover_recommendations
-    }
+    return _summarize_recommendations(improve_recommendations, discover_recommendations)
 
 import requests, urllib.parse
 
-def search_youtube_videos(query, max_results=2):
-    if not YOUTUBE_API_KEY:
-        print("❌ Thiếu API key YouTube.")
-        return []
+YOUTUBE_API_BASE = os.getenv("YOUTUBE_API_BASE", "https://www.googleapis.com/youtube/v3").rstrip("/")
+YOUTUBE_TIMEOUT = 10
+YOUTUBE_BLOCKED_WORDS = ["kickfit", "boxing", "nhảy", "review", "vlog"]
+YOUTUBE_SEARCH_COST = 100  # số đơn vị quota YouTube Data API của mỗi lần gọi search.list
+# Đổi dạng kết quả trong _parse_youtube_items thì tăng phiên bản để bỏ cache cũ
+YOUTUBE_RESULT_VERSION = "v2"
+
+_youtube_lock = threading.Lock()
+youtube_metrics = {"lookups": 0, "api_calls": 0, "quota_units": 0, "errors": 0}
+
+def _count_youtube(name, n=1):
+    with _youtube_lock:
+        youtube_metrics[name] += n
+
+def youtube_stats():
+    """ Số lần tra cứu, số lần gọi API thật và quota đã tiêu (search.list = 100 đơn vị). """
+    with _youtube_lock:
+        stats = dict(youtube_metrics)
+    stats["api_calls_saved"] = stats["lookups"] - stats["api_calls"]
+    return stats
+
+def _youtube_cache_key(query, max_results):
+    """ Khóa cache: phiên bản dạng kết quả + max_results + truy vấn chuẩn hóa (NFC, chữ thường, gộp khoảng trắng). """
+    normalized = " ".join(unicodedata.normalize("NFC", query).lower().split())
+    return f"search|{YOUTUBE_RESULT_VERSION}|{max_results}|{normalized}"
+
+def _youtube_search_url(query, max_results):
     academic_keywords = " học tập OR bài giảng OR course OR university OR tutorial OR giới thiệu học OR cybersecurity"
     full_query = f"{query} {academic_keywords}"
     encoded_query = urllib.parse.quote(full_query)
-    url = (
-        f"https://www.googleapis.com/youtube/v3/search?"
+    return (
+        f"{YOUTUBE_API_BASE}/search?"
         f"part=snippet&type=video&maxResults={max_results}"
         f"&regionCode=VN&relevanceLanguage=vi"
         f"&safeSearch=strict&order=relevance"
         f"&q={encoded_query}&key={YOUTUBE_API_KEY}"
     )
+
+def _parse_youtube_items(data):
+    """ Kết quả search.list -> [{title, videoId, url, thumbnail}] (dạng dùng chung cho gợi ý và /api/youtube). """
+    videos = []
+    for item in data.get("items", []):
+        vid = item["id"]["videoId"]
+        snippet = item["snippet"]
+        title = snippet["title"]
+        if not any(word in title.lower() for word in YOUTUBE_BLOCKED_WORDS):
+            videos.append({
+                "title": title,
+                "videoId": vid,
+                "url": f"https://www.youtube.com/watch?v={vid}",
+                "thumbnail": snippet.get("thumbnails", {}).get("medium", {}).get("url"),
+            })
+    return videos
+
+def _fetch_youtube(query, max_results):
+    _count_youtube("api_calls")
+    _count_youtube("quota_units", YOUTUBE_SEARCH_COST)
+    res = requests.get(_youtube_search_url(query, max_results), timeout=YOUTUBE_TIMEOUT)
+    res.raise_for_status()
+    return _parse_youtube_items(res.json())
+
+async def _fetch_youtube_async(query, max_results, client):
+    _count_youtube("api_calls")
+    _count_youtube("quota_units", YOUTUBE_SEARCH_COST)
+    res = await client.get(_youtube_search_url(query, max_results))
+    res.raise_for_status()
+    return _parse_youtube_items(res.json())
+
+def _is_search_result(videos):
+    return videos is not None  # kết quả rỗng cũng là kết quả hợp lệ: cache để khỏi tốn quota lần nữa
+
+def search_youtube_videos(query, max_results=2):
+    """ Tìm video qua cache "youtube" của kv_cache; chỉ gọi API khi chưa có (lỗi thì không cache). """
+    if not YOUTUBE_API_KEY:
+        print("❌ Thiếu API key YouTube.")
+        return []
+    _count_youtube("lookups")
     try:
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json()
-        videos = []
-        for item in data.get("items", []):
-            vid = item["id"]["videoId"]
-            title = item["snippet"]["title"]
-            if not any(word in title.lower() for word in ["kickfit", "boxing", "nhảy", "review", "vlog"]):
-                videos.append({
-                    "title": title,
-                    "url": f"https://www.youtube.com/watch?v={vid}",
-                })
-        return videos
+        return get_cache().get_or_compute(
+            "youtube", _youtube_cache_key(query, max_results),
+            lambda: _fetch_youtube(query, max_results), should_cache=_is_search_result
+        )
     except Exception as e:
+        _count_youtube("errors")
         print(f"❌ Lỗi YouTube: {e}")
         return []
+
+async def search_youtube_videos_async(query, max_results=2, client=None):
+    """ Bản async (httpx) của search_youtube_videos. """
+    return (await search_youtube_videos_many_async([query], max_results=max_results, client=client))[0]
+
+async def search_youtube_videos_many_async(queries, max_results=2, client=None):
+    """
+    Tìm video cho nhiều truy vấn cùng lúc. Các truy vấn trùng nhau sau chuẩn hóa
+    chỉ tra một lần; các truy vấn chưa có trong cache được gọi API song song
+    (gộp với lời gọi đang chạy của request khác cùng khóa). Trả về danh sách
+    kết quả theo đúng thứ tự `queries`.
+    """
+    if not YOUTUBE_API_KEY:
+        print("❌ Thiếu API key YouTube.")
+        return [[] for _ in queries]
+    _count_youtube("lookups", len(queries))
+    cache = get_cache()
+    found = {}
+    for query in queries:
+        key = _youtube_cache_key(query, max_results)
+        if key not in found:
+            found[key] = cache.get("youtube", key)
+    missing = {}
+    for query in queries:
+        key = _youtube_cache_key(query, max_results)
+        if found[key] is None:
+            missing.setdefault(key, query)
+
+    async def fetch(key, query, client):
+        try:
+            return await cache.fill_async(
+                "youtube", key, lambda: _fetch_youtube_async(query, max_results, client),
+                should_cache=_is_search_result
+            )
+        except Exception as e:
+            _count_youtube("errors")
+            print(f"❌ Lỗi YouTube: {e}")
+            return []
+
+    async def fetch_missing(client):
+        results = await asyncio.gather(*(fetch(key, query, client) for key, query in missing.items()))
+        found.update(zip(missing, results))
+
+    if missing:
+        if client is None:  # tạo AsyncClient tốn vài chục ms nên chỉ tạo khi thật sự phải gọi API
+            async with httpx.AsyncClient(timeout=YOUTUBE_TIMEOUT) as client:
+                await fetch_missing(client)
+        else:
+            await fetch_missing(client)
+    return [found[_youtube_cache_key(query, max_results)] for query in queries]
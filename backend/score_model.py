@@ -0,0 +1,266 @@
+"""
+Dịch vụ dự đoán điểm môn học bằng mô hình MLP đã huấn luyện (models/score_mlp.keras).
+
+- Mô hình, scaler và label encoder chỉ được nạp MỘT lần, lười (ở request đầu tiên),
+  trong thread xử lý lô nên không làm chậm lúc khởi động app.
+- Các request đồng thời được gom (micro-batch) thành một lời gọi `model.predict`
+  duy nhất: thread xử lý chờ tối đa `max_wait_ms` hoặc đủ `max_batch_size` dòng.
+- Mặc định suy luận bằng NumPy từ models/score_mlp.npz (xuất bởi
+  export_score_model.py) nên không phải import TensorFlow; chỉ khi chưa có
+  tệp .npz mới dùng Keras (CPU, ẩn GPU trước khi import).
+
+Đặc trưng đầu vào (theo thứ tự của scaler): course_enc, semester_num,
+student_avg, n_taken, credits.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+NUMPY_MODEL_PATH = os.path.join(MODEL_DIR, "score_mlp.npz")
+FEATURES = ["course_enc", "semester_num", "student_avg", "n_taken", "credits"]
+DEFAULT_CREDITS = 3
+MAX_BATCH_SIZE = int(os.getenv("SCORE_MAX_BATCH_SIZE", "256"))
+MAX_WAIT_MS = float(os.getenv("SCORE_MAX_WAIT_MS", "5"))
+PREDICT_TIMEOUT = float(os.getenv("SCORE_PREDICT_TIMEOUT", "30"))
+
+
+def current_semester_num(today=None):
+    """ Đặc trưng semester_num của năm học hiện tại: 2024-2025 -> 20242025 (như lúc huấn luyện). """
+    today = today or date.today()
+    start_year = today.year if today.month >= 8 else today.year - 1
+    return int(f"{start_year}{start_year + 1}")
+
+
+def build_score_features(course_codes, label_encoder, semester_num, student_avg, n_taken, credits=DEFAULT_CREDITS):
+    """
+    Dựng ma trận đặc trưng (chưa chuẩn hóa) cho các mã môn mà encoder biết.
+    Trả về (ma trận, danh sách vị trí các môn được giữ lại).
+    """
+    known = {code: i for i, code in enumerate(label_encoder.classes_)}
+    kept = [i for i, code in enumerate(course_codes) if code in known]
+    features = np.empty((len(kept), len(FEATURES)), dtype=np.float64)
+    features[:, 0] = [known[course_codes[i]] for i in kept]
+    features[:, 1] = semester_num
+    features[:, 2] = student_avg
+    features[:, 3] = n_taken
+    features[:, 4] = credits
+    return features, kept
+
+
+def load_keras_artifacts(model_dir=MODEL_DIR):
+    """ Nạp (hàm dự đoán, scaler, label encoder) bằng Keras trên CPU. """
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import joblib
+    import keras
+
+    model = keras.saving.load_model(os.path.join(model_dir, "score_mlp.keras"), compile=False)
+    scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+    label_encoder = joblib.load(os.path.join(model_dir, "le_course.joblib"))
+
+    def predict(x):
+        return np.asarray(model.predict(x, batch_size=len(x), verbose=0)).reshape(-1)
+
+    return predict, scaler, label_encoder
+
+
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+class NumpyMLP:
+    """ Lan truyền xuôi của chuỗi lớp Dense (float32, như Keras). """
+
+    def __init__(self, layers):
+        self.layers = [(kernel, bias, _ACTIVATIONS[activation]) for kernel, bias, activation in layers]
+
+    def __call__(self, x):
+        h = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            h = activation(h @ kernel + bias)
+        return h.reshape(-1)
+
+
+def load_numpy_artifacts(path=NUMPY_MODEL_PATH):
+    """ Nạp (hàm dự đoán, tham số chuẩn hóa, danh sách mã môn) từ tệp .npz, không cần TensorFlow/sklearn. """
+    with np.load(path) as data:
+        activations = [str(a) for a in data["activations"]]
+        layers = [(data[f"kernel_{i}"], data[f"bias_{i}"], activation) for i, activation in enumerate(activations)]
+        standardizer = SimpleNamespace(mean_=data["scaler_mean"], scale_=data["scaler_scale"])
+        label_encoder = SimpleNamespace(classes_=data["classes"])
+    return NumpyMLP(layers), standardizer, label_encoder
+
+
+def load_score_artifacts():
+    if os.path.exists(NUMPY_MODEL_PATH):
+        return load_numpy_artifacts()
+    print("⚠️ CẢNH BÁO: Chưa có models/score_mlp.npz (chạy export_score_model.py); dùng Keras.")
+    return load_keras_artifacts()
+
+
+class ScoreModelService:
+    def __init__(self, loader=load_score_artifacts, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self._loader = loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._worker = None
+        self._predict = None
+        self.scaler = None
+        self.label_encoder = None
+        self.error = None
+        self.load_seconds = None
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self._latencies = deque(maxlen=1000)  # giây, tính từ lúc gửi tới lúc có kết quả
+        self._batch_sizes = deque(maxlen=1000)
+        self._started_at = None
+
+    # --- vòng đời ---
+
+    def _ensure_started(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._started_at = time.time()
+                self._worker = threading.Thread(target=self._run, name="score-model", daemon=True)
+                self._worker.start()
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self._predict, self.scaler, self.label_encoder = self._loader()
+            print("✅ Nạp mô hình dự đoán điểm (MLP) thành công.")
+        except Exception as e:
+            print(f"❌ LỖI: Không thể nạp mô hình dự đoán điểm. Lý do: {e}")
+            self.error = str(e)
+        self.load_seconds = round(time.perf_counter() - start, 3)
+        self._ready.set()
+
+    def status(self):
+        if not self._ready.is_set():
+            return "warming" if self._worker is not None else "idle"
+        return "failed" if self.error else "ready"
+
+    def get_label_encoder(self, timeout=PREDICT_TIMEOUT):
+        """ Chờ mô hình nạp xong (khởi động nếu cần) rồi trả về label encoder, hoặc None nếu lỗi. """
+        self._ensure_started()
+        self._ready.wait(timeout)
+        return self.label_encoder
+
+    # --- gom lô ---
+
+    def submit(self, features):
+        """ Gửi ma trận đặc trưng (chưa chuẩn hóa); trả về Future -> mảng điểm dự đoán. """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((np.asarray(features, dtype=np.float64), future, time.perf_counter()))
+        return future
+
+    def predict(self, features, timeout=PREDICT_TIMEOUT):
+        if len(features) == 0:
+            return np.empty(0)
+        return self.submit(features).result(timeout)
+
+    def _run(self):
+        self._load()
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self._process(batch)
+
+    def _process(self, batch):
+        if self.error:
+            for _, future, _ in batch:
+                future.set_exception(RuntimeError(f"Mô hình dự đoán điểm không khả dụng: {self.error}"))
+            return
+        try:
+            stacked = np.vstack([features for features, _, _ in batch])
+            scores = self._predict((stacked - self.scaler.mean_) / self.scaler.scale_)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        done = time.perf_counter()
+        offset = 0
+        for features, future, _ in batch:
+            future.set_result(scores[offset:offset + len(features)])
+            offset += len(features)
+        with self._stats_lock:
+            self._latencies.extend(done - submitted for _, _, submitted in batch)
+            self.requests += len(batch)
+            self.rows += len(stacked)
+            self.batches += 1
+            self._batch_sizes.append(len(batch))
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = np.array(self._latencies) * 1000
+            uptime = time.time() - self._started_at if self._started_at else 0
+            return {
+                "status": self.status(),
+                "load_seconds": self.load_seconds,
+                "error": self.error,
+                "requests": self.requests,
+                "rows": self.rows,
+                "batches": self.batches,
+                "avg_requests_per_batch": round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0,
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+                "rows_per_second": round(self.rows / uptime, 1) if uptime else 0,
+            }
+
+
+score_model = ScoreModelService()
+
+
+def predict_course_scores(schedule_data, progress_data, service=score_model):
+    """
+    Dự đoán điểm (thang 10) cho các môn đang học của sinh viên.
+    `schedule_data`: DataFrame có cột course, subjectCode; `progress_data`: điểm các môn đã học.
+    Trả về danh sách {"course", "subjectCode", "predicted_score"}.
+    """
+    label_encoder = service.get_label_encoder()
+    if label_encoder is None or schedule_data is None or schedule_data.empty or "subjectCode" not in schedule_data:
+        return []
+    codes = schedule_data["subjectCode"].astype(str).tolist()
+    student_avg = float(progress_data["progress"].mean()) / 10 if not progress_data.empty else 0.0
+    features, kept = build_score_features(
+        codes, label_encoder, current_semester_num(), student_avg, len(progress_data)
+    )
+    scores = np.clip(service.predict(features), 0, 10)
+    courses = schedule_data["course"].tolist()
+    return [
+        {"course": courses[i], "subjectCode": codes[i], "predicted_score": round(float(score), 1)}
+        for i, score in zip(kept, scores)
+    ]
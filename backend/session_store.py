@@ -0,0 +1,102 @@
+"""
+Kho phiên đăng nhập (token TLU) dùng chung giữa các worker.
+
+- MemorySessionStore: dict trong tiến trình (như trước đây) — chỉ hợp với
+  một worker duy nhất hoặc khi chạy thử.
+- SQLiteSessionStore: bảng `sessions` trong một file SQLite (WAL), tra cứu
+  theo khóa chính nên mọi worker/tiến trình trên cùng máy đều thấy phiên vừa
+  đăng nhập mà không cần sticky session. Đặt SESSION_DB trong /dev/shm để
+  dùng bộ nhớ chia sẻ thay vì đĩa.
+
+Mỗi phiên có hạn dùng (expires_at); phiên hết hạn coi như không tồn tại và
+được dọn dần khi ghi phiên mới.
+"""
+import json
+import os
+import threading
+import time
+
+import storage
+
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(8 * 3600)))
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._data = {}  # student_id -> (session, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, student_id):
+        """ Trả về dict phiên còn hạn hoặc None. """
+        with self._lock:
+            entry = self._data.get(student_id)
+            if entry is None:
+                return None
+            if time.time() >= entry[1]:
+                del self._data[student_id]
+                return None
+            return entry[0]
+
+    def set(self, student_id, session, ttl=None):
+        with self._lock:
+            self._data[student_id] = (session, time.time() + (ttl or self.ttl))
+
+    def delete(self, student_id):
+        with self._lock:
+            self._data.pop(student_id, None)
+
+    def active_ids(self):
+        now = time.time()
+        with self._lock:
+            return [student_id for student_id, (_, expires_at) in self._data.items() if expires_at > now]
+
+
+class SQLiteSessionStore:
+    def __init__(self, db_file=SESSION_DB, ttl=SESSION_TTL):
+        self.db_file = db_file
+        self.ttl = ttl
+        with storage.transaction(db_file) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    student_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+    def get(self, student_id):
+        row = storage.fetchone(
+            self.db_file,
+            "SELECT data FROM sessions WHERE student_id = ? AND expires_at > ?",
+            (student_id, time.time())
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self, student_id, session, ttl=None):
+        now = time.time()
+        with storage.transaction(self.db_file) as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (student_id, data, expires_at) VALUES (?, ?, ?)",
+                (student_id, json.dumps(session, ensure_ascii=False), now + (ttl or self.ttl))
+            )
+
+    def delete(self, student_id):
+        storage.execute(self.db_file, "DELETE FROM sessions WHERE student_id = ?", (student_id,))
+
+    def active_ids(self):
+        rows = storage.fetchall(self.db_file, "SELECT student_id FROM sessions WHERE expires_at > ?", (time.time(),))
+        return [row[0] for row in rows]
+
+
+def create_session_store(kind=SESSION_STORE):
+    """ Tạo kho phiên theo cấu hình SESSION_STORE ("sqlite" | "memory"). """
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"SESSION_STORE không hợp lệ: {kind}")
@@ -0,0 +1,103 @@
+"""
+Single-flight: gộp các lời gọi đồng thời có cùng khóa thành MỘT lời gọi thật.
+
+Khi nhiều request cùng cần một tài nguyên (ví dụ điểm của cùng một sinh viên
+từ TLU), request đầu tiên thực hiện lời gọi; các request đến sau trong lúc
+lời gọi đó còn chạy chỉ việc chờ và nhận chung kết quả (hoặc chung lỗi).
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+        self.calls = 0       # số lời gọi thật sự được thực hiện
+        self.shared = 0      # số lời gọi được gộp vào lời gọi đang chạy
+
+    def _join_or_lead(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.calls += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """ Chạy `fn(*args, **kwargs)` hoặc chờ lời gọi đang chạy có cùng `key`. """
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """
+        Phiên bản async của `do`. Dùng chung bảng lời gọi đang chạy với `do`,
+        nên lời gọi sync và async cùng khóa cũng được gộp với nhau (kể cả khi
+        chúng chạy trên các event loop/thread khác nhau).
+        """
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "inflight": len(self._inflight)}
+
+
+upstream_flight = SingleFlight()
+
+
+def coalesce(resource, group=upstream_flight):
+    """
+    Decorator: gộp các lời gọi đồng thời tới cùng `resource` với cùng tham số.
+    Khóa = (resource, *args, *kwargs) — tham số phải hashable (token, id học kỳ...).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (resource, args, tuple(sorted(kwargs.items())))
+            return group.do(key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def coalesce_async(resource, group=upstream_flight):
+    """
+    Như `coalesce` nhưng cho hàm async. Tham số `client` (kết nối HTTP) không
+    được tính vào khóa nên khớp với khóa của bản sync tương ứng.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, client=None, **kwargs):
+            key = (resource, args, tuple(sorted(kwargs.items())))
+            return await group.do_async(key, fn, *args, client=client, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+"""
+Lớp truy cập SQLite dùng chung cho toàn bộ backend.
+
+Thay vì mở/đóng `sqlite3.connect` cho từng câu lệnh, mỗi file CSDL có một
+pool kết nối bền vững (tái sử dụng giữa các request/thread). Mỗi kết nối
+được cấu hình WAL + synchronous=NORMAL và giữ bộ nhớ đệm câu lệnh đã
+prepare, nên các câu SQL hằng số chỉ được biên dịch một lần cho mỗi kết nối.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+
+def configure_connection(conn, foreign_keys=False):
+    """ Bật WAL, synchronous=NORMAL và busy_timeout cho một kết nối. """
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def connect(db_file, foreign_keys=False):
+    """ Mở một kết nối mới (đã cấu hình) — dùng cho script chạy một lần. """
+    conn = sqlite3.connect(
+        db_file,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    return configure_connection(conn, foreign_keys=foreign_keys)
+
+
+class ConnectionPool:
+    """ Pool kết nối LIFO cho một file CSDL (kết nối nóng nhất được dùng lại trước). """
+
+    def __init__(self, db_file, size=POOL_SIZE, foreign_keys=False):
+        self.db_file = db_file
+        self.foreign_keys = foreign_keys
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = connect(self.db_file, foreign_keys=self.foreign_keys)
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file):
+    """ Trả về pool dùng chung cho `db_file` (tạo mới ở lần gọi đầu). """
+    key = os.path.abspath(db_file)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(key)
+                _pools[key] = pool
+    return pool
+
+
+def fetchone(db_file, sql, params=()):
+    with get_pool(db_file).connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def fetchall(db_file, sql, params=()):
+    with get_pool(db_file).connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def execute(db_file, sql, params=()):
+    """ Chạy một câu lệnh ghi và commit. Trả về số dòng bị ảnh hưởng. """
+    with get_pool(db_file).connection() as conn:
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+
+@contextmanager
+def transaction(db_file):
+    """ Mượn một kết nối trong pool, commit khi thoát (rollback nếu lỗi). """
+    with get_pool(db_file).connection() as conn:
+        with conn:
+            yield conn
+
+
+SQL_CREATE_LEASES = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+"""
+SQL_ACQUIRE_LEASE = """
+    INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+    WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+"""
+
+
+def try_acquire_lease(db_file, name, owner, ttl):
+    """
+    Lease trong bảng `leases` để chỉ MỘT tiến trình (worker gunicorn, script...)
+    chạy một việc nền tại một thời điểm. `owner` giành được lease khi lease trống
+    hoặc đã hết hạn, và gia hạn thêm `ttl` giây nếu đang giữ.
+    Trả về True nếu `owner` đang giữ lease.
+    """
+    now = time.time()
+    with transaction(db_file) as conn:
+        conn.execute(SQL_CREATE_LEASES)
+        conn.execute(SQL_ACQUIRE_LEASE, (name, owner, now + ttl, now))
+        row = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] == owner
+
+
+def close_all():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
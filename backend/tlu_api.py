@@ -4,6 +4,9 @@ import sys
 sys.stdout.reconfigure(encoding='utf-8')
 import pandas as pd
 import getpass # Thu vien de nhap mat khau an toan
+from singleflight import coalesce
+from http_client import get_session, tlu_url
+from tlu_stream import JSONArrayStream, MARK_CHUNK_SIZE, slim_mark
 
 
 # Tat canh bao ve chung chi bao mat (InsecureRequestWarning)
@@ -14,7 +17,7 @@ def authenticate_tlu(username, password):
     Lay Access Token tu API TLU.
     Tra ve token hoac None neu that bai.
     """
-    token_url = "https://sinhvien1.tlu.edu.vn/education/oauth/token"
+    token_url = tlu_url("/education/oauth/token")
     credentials = {
         "username": username,
         "password": password,
@@ -24,7 +27,7 @@ def authenticate_tlu(username, password):
     }
     
     try:
-        token_response = requests.post(token_url, data=credentials, verify=False)
+        token_response = get_session().post(token_url, data=credentials)
         token_response.raise_for_status() # Bao loi neu (4xx, 5xx)
         token_data = token_response.json()
         access_token = token_data.get("access_token")
@@ -39,6 +42,7 @@ def authenticate_tlu(username, password):
                 return {
                     **user_info, # Ghep user_info vao dict
                     "access_token": access_token,
+                    "expires_in": token_data.get("expires_in"),
                     "success": True
                 }
             else:
@@ -60,15 +64,16 @@ def authenticate_tlu(username, password):
         return None
 
 # --- HAM MOI (Lay tu script get_lich_hoc.py) ---
+@coalesce("semester_info")
 def fetch_current_semester_id(access_token):
     """
     GOI API 'semester_info' DE LAY ID HOC KY HIEN TAI.
     """
-    semester_info_url = "https://sinhvien1.tlu.edu.vn/education/api/semester/semester_info" # URL ANH EM MINH DA TIM THAY
+    semester_info_url = tlu_url("/education/api/semester/semester_info") # URL ANH EM MINH DA TIM THAY
     
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
     try:
-        response = requests.get(semester_info_url, headers=headers, verify=False)
+        response = get_session().get(semester_info_url, headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -93,17 +98,18 @@ def fetch_current_semester_id(access_token):
         return None
 
 # --- HAM MOI (Lay tu script get_lich_hoc.py) ---
+@coalesce("schedule")
 def fetch_student_schedule(access_token, semester_id): 
     """
     Lay du lieu lich hoc (cac mon dang hoc) tu API TLU.
     """
-    schedule_url = f"https://sinhvien1.tlu.edu.vn/education/api/StudentCourseSubject/studentLoginUser/{semester_id}"
+    schedule_url = tlu_url(f"/education/api/StudentCourseSubject/studentLoginUser/{semester_id}")
     print(f"... Dang goi API lich hoc: {schedule_url}")
 
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
 
     try:
-        response = requests.get(schedule_url, headers=headers, verify=False)
+        response = get_session().get(schedule_url, headers=headers)
         response.raise_for_status()
         data = response.json()
         print(f"OK: Lay thanh cong du lieu lich hoc (Tim thay {len(data)} mon).")
@@ -119,11 +125,11 @@ def fetch_student_data(access_token):
     """
     Lay thong tin ca nhan cua sinh vien tu TLU API.
     """
-    url = "https://sinhvien1.tlu.edu.vn/education/api/users/getCurrentUser"
+    url = tlu_url("/education/api/users/getCurrentUser")
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers, verify=False)
+        response = get_session().get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
         return {
@@ -136,16 +142,17 @@ def fetch_student_data(access_token):
         return None
 
 
+@coalesce("marks")
 def fetch_student_marks(access_token):
     """
     LAY TOAN BO DIEM TONG KET (TAT CA HOC KY)
     """
-    url = "https://sinhvien1.tlu.edu.vn/education/api/studentsubjectmark/getListMarkDetailStudent" # API DIEM TONG KET
+    url = tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent") # API DIEM TONG KET
     
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers, verify=False)
+        response = get_session().get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
 
@@ -159,3 +166,35 @@ def fetch_student_marks(access_token):
         print(f"ERROR TLU API (StudentMark): {e}")
         return None
 
+
+
+@coalesce("mark_records")
+def fetch_student_mark_records(access_token):
+    """
+    Nhu fetch_student_marks nhung doc dang stream va chi giu cac truong can dung,
+    nen bo nho dinh khong tang theo kich thuoc ca bang diem (nhieu hoc ky).
+    Tra ve list ban ghi rut gon hoac None neu loi.
+    """
+    url = tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent")
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+
+    try:
+        with get_session().get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            parser = JSONArrayStream(transform=slim_mark)
+            data = []
+            for chunk in response.iter_content(MARK_CHUNK_SIZE):
+                data.extend(parser.feed(chunk))
+            data.extend(parser.feed(b"", final=True))
+        if parser.is_array is False:
+            data = parser.document  # TLU khong tra ve mang: giu nguyen nhu response.json()
+
+        if not data:
+             print("WARNING: TLU API (StudentMark) tra ve danh sach diem rong.")
+        else:
+            print(f"OK: Lay thanh cong {len(data)} diem tong ket tu TLU API.")
+        return data
+
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"ERROR TLU API (StudentMark): {e}")
+        return None
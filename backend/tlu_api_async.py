@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+
+import httpx
+
+from http_client import (
+    CONNECT_TIMEOUT, READ_TIMEOUT, POOL_MAXSIZE, RETRY_BACKOFF, RETRY_STATUSES, RETRY_TOTAL, tlu_url
+)
+from singleflight import coalesce_async
+from tlu_stream import JSONArrayStream, MARK_CHUNK_SIZE, slim_mark
+
+# Ban async (httpx) cua cac ham trong tlu_api.py. Moi ham nhan them tham so
+# `client` (httpx.AsyncClient) de nhieu loi goi trong cung mot request dung
+# chung mot ket noi; neu khong truyen, ham tu mo mot client ngan han.
+#
+# Gioi han khi chay duoi Flask (WSGI, app.run/gunicorn sync): asgiref chay moi
+# async view tren mot event loop rieng trong thread cua worker, nen mot tien
+# trinh van chi phuc vu mot request/thread — cac route async KHONG tang so
+# request dong thoi. Loi ich chi nam TRONG mot request (nhieu loi goi TLU/YouTube
+# chay song song). Client cung song theo loop cua request (khong dung chung duoc
+# giua cac loop), nen keep-alive chi co tac dung giua cac loi goi cua cung request.
+
+TIMEOUT = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+LIMITS = httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE)
+
+
+class RetryTransport(httpx.AsyncHTTPTransport):
+    """
+    Thu lai giong Session cua http_client: loi ket noi (retries cua httpx) va
+    cac ma 5xx trong RETRY_STATUSES cho request GET, backoff luy thua
+    RETRY_BACKOFF * 2^lan. POST (dang nhap) khong thu lai khi gap 5xx.
+    """
+
+    async def handle_async_request(self, request):
+        for attempt in range(RETRY_TOTAL + 1):
+            response = await super().handle_async_request(request)
+            if (request.method != "GET" or response.status_code not in RETRY_STATUSES
+                    or attempt == RETRY_TOTAL):
+                return response
+            await response.aclose()
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+        return response
+
+
+def tlu_client():
+    """
+    Tao AsyncClient cho TLU (keep-alive trong request, timeout, thu lai khi loi
+    ket noi hoac 5xx voi GET — cung chinh sach voi http_client.build_session).
+    Dung: `async with tlu_client() as client: ...`
+    """
+    transport = RetryTransport(retries=RETRY_TOTAL, verify=False, limits=LIMITS)
+    return httpx.AsyncClient(transport=transport, timeout=TIMEOUT, verify=False)
+
+
+@contextlib.asynccontextmanager
+async def _client_or_new(client):
+    if client is not None:
+        yield client
+        return
+    async with tlu_client() as new_client:
+        yield new_client
+
+
+def _auth_headers(access_token):
+    return {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+
+
+async def authenticate_tlu_async(username, password, client=None):
+    """
+    Lay Access Token tu API TLU roi lay luon thong tin user (cung 1 ket noi).
+    Tra ve dict giong authenticate_tlu hoac None neu that bai.
+    """
+    credentials = {
+        "username": username,
+        "password": password,
+        "grant_type": "password",
+        "client_id": "education_client",
+        "client_secret": "password"
+    }
+    async with _client_or_new(client) as client:
+        try:
+            token_response = await client.post(tlu_url("/education/oauth/token"), data=credentials)
+            token_response.raise_for_status()
+            token_data = token_response.json()
+            access_token = token_data.get("access_token")
+
+            if not access_token:
+                print("ERROR: Khong tim thay access_token trong phan hoi.")
+                return None
+
+            print("OK: Dang nhap TLU va lay token thanh cong!")
+            user_info = await fetch_student_data_async(access_token, client=client)
+            if not user_info:
+                print("ERROR: Lay token thanh cong nhung khong lay duoc user info.")
+                return None
+            return {
+                **user_info,
+                "access_token": access_token,
+                "expires_in": token_data.get("expires_in"),
+                "success": True
+            }
+        except httpx.HTTPStatusError as e:
+            print(f"ERROR TLU API (Auth): {e.response.status_code}")
+            return None
+        except Exception as e:
+            print(f"ERROR (Unknown Auth): {e}")
+            return None
+
+
+async def fetch_student_data_async(access_token, client=None):
+    """
+    Lay thong tin ca nhan cua sinh vien tu TLU API.
+    """
+    async with _client_or_new(client) as client:
+        try:
+            response = await client.get(tlu_url("/education/api/users/getCurrentUser"), headers=_auth_headers(access_token))
+            response.raise_for_status()
+            data = response.json()
+            return {
+                "student_id": data.get('username', 'N/A'),
+                "name": data.get('displayName', 'N/A'),
+                "major": "He thong thong tin"
+            }
+        except httpx.HTTPError as e:
+            print(f"ERROR TLU API (User Data): {e}")
+            return None
+
+
+@coalesce_async("semester_info")
+async def fetch_current_semester_id_async(access_token, client=None):
+    """
+    GOI API 'semester_info' DE LAY ID HOC KY HIEN TAI.
+    """
+    async with _client_or_new(client) as client:
+        try:
+            response = await client.get(tlu_url("/education/api/semester/semester_info"), headers=_auth_headers(access_token))
+            response.raise_for_status()
+            data = response.json()
+
+            current_semester_id = None
+            if isinstance(data, list) and len(data) > 0:
+                current_semester_id = data[0].get('id')
+            elif isinstance(data, dict):
+                current_semester_id = data.get('id')
+
+            if current_semester_id:
+                print(f"OK: Lay thanh cong ID hoc ky hien tai: {current_semester_id}")
+                return current_semester_id
+            print("ERROR: Khong the phan tich ID hoc ky tu 'semester_info'.")
+            return None
+        except Exception as e:
+            print(f"ERROR TLU API (Semester Info): {e}")
+            return None
+
+
+@coalesce_async("schedule")
+async def fetch_student_schedule_async(access_token, semester_id, client=None):
+    """
+    Lay du lieu lich hoc (cac mon dang hoc) tu API TLU.
+    """
+    schedule_url = tlu_url(f"/education/api/StudentCourseSubject/studentLoginUser/{semester_id}")
+    async with _client_or_new(client) as client:
+        try:
+            response = await client.get(schedule_url, headers=_auth_headers(access_token))
+            response.raise_for_status()
+            data = response.json()
+            print(f"OK: Lay thanh cong du lieu lich hoc (Tim thay {len(data)} mon).")
+            return data
+        except httpx.HTTPError as e:
+            print(f"ERROR TLU API (Lich hoc): {e}")
+            return None
+
+
+@coalesce_async("marks")
+async def fetch_student_marks_async(access_token, client=None):
+    """
+    LAY TOAN BO DIEM TONG KET (TAT CA HOC KY)
+    """
+    url = tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent")
+    async with _client_or_new(client) as client:
+        try:
+            response = await client.get(url, headers=_auth_headers(access_token))
+            response.raise_for_status()
+            data = response.json()
+            if not data:
+                print("WARNING: TLU API (StudentMark) tra ve danh sach diem rong.")
+            else:
+                print(f"OK: Lay thanh cong {len(data)} diem tong ket tu TLU API.")
+            return data
+        except httpx.HTTPError as e:
+            print(f"ERROR TLU API (StudentMark): {e}")
+            return None
+
+
+@coalesce_async("mark_records")
+async def fetch_student_mark_records_async(access_token, client=None):
+    """
+    Ban async cua tlu_api.fetch_student_mark_records: doc diem dang stream va chi
+    giu cac truong can dung (tlu_stream.slim_mark).
+    """
+    url = tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent")
+    async with _client_or_new(client) as client:
+        try:
+            async with client.stream("GET", url, headers=_auth_headers(access_token)) as response:
+                response.raise_for_status()
+                parser = JSONArrayStream(transform=slim_mark)
+                data = []
+                async for chunk in response.aiter_bytes(MARK_CHUNK_SIZE):
+                    data.extend(parser.feed(chunk))
+                data.extend(parser.feed(b"", final=True))
+            if parser.is_array is False:
+                data = parser.document
+            if not data:
+                print("WARNING: TLU API (StudentMark) tra ve danh sach diem rong.")
+            else:
+                print(f"OK: Lay thanh cong {len(data)} diem tong ket tu TLU API.")
+            return data
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"ERROR TLU API (StudentMark): {e}")
+            return None
@@ -2,6 +2,8 @@ import requests
 import urllib3
 import pandas as pd
 import getpass # Thư viện để nhập mật khẩu an toàn
+from http_client import get_session, tlu_url
+from tlu_stream import MARK_CHUNK_SIZE, iter_json_array, slim_mark
 import sys
 # Fix lỗi encoding khi in ra console
 sys.stdout.reconfigure(encoding='utf-8')
@@ -14,7 +16,7 @@ def authenticate_tlu(username, password):
     Lấy Access Token từ API TLU.
     Trả về token (string) nếu thành công hoặc None nếu thất bại.
     """
-    token_url = "https://sinhvien1.tlu.edu.vn/education/oauth/token"
+    token_url = tlu_url("/education/oauth/token")
     credentials = {
         "username": username,
         "password": password,
@@ -24,7 +26,7 @@ def authenticate_tlu(username, password):
     }
     
     try:
-        token_response = requests.post(token_url, data=credentials, verify=False)
+        token_response = get_session().post(token_url, data=credentials)
         token_response.raise_for_status() # Báo lỗi nếu (4xx, 5xx)
         token_data = token_response.json()
         access_token = token_data.get("access_token")
@@ -48,11 +50,11 @@ def fetch_current_semester_id(access_token):
     GỌI API 'semester_info' ĐỂ LẤY ID HỌC KỲ HIỆN TẠI.
     Trả về ID học kỳ (string) hoặc None.
     """
-    semester_info_url = "https://sinhvien1.tlu.edu.vn/education/api/semester/semester_info"
+    semester_info_url = tlu_url("/education/api/semester/semester_info")
     
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
     try:
-        response = requests.get(semester_info_url, headers=headers, verify=False)
+        response = get_session().get(semester_info_url, headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -79,11 +81,11 @@ def fetch_student_data(access_token):
     Lấy thông tin cá nhân của sinh viên từ TLU API.
     Trả về dict chứa user info hoặc None.
     """
-    url = "https://sinhvien1.tlu.edu.vn/education/api/users/getCurrentUser"
+    url = tlu_url("/education/api/users/getCurrentUser")
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers, verify=False)
+        response = get_session().get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
         print("✅ Lấy thông tin cá nhân sinh viên thành công.")
@@ -102,12 +104,12 @@ def fetch_student_marks(access_token):
     Lấy TOÀN BỘ ĐIỂM TỔNG KẾT (TẤT CẢ HỌC KỲ).
     Trả về danh sách list of dicts hoặc None.
     """
-    url = "https://sinhvien1.tlu.edu.vn/education/api/studentsubjectmark/getListMarkDetailStudent" # API DIEM TONG KET
+    url = tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent") # API DIEM TONG KET
     
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers, verify=False)
+        response = get_session().get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
 
@@ -120,18 +122,31 @@ def fetch_student_marks(access_token):
     except requests.exceptions.RequestException as e:
         print(f"❌ LỖI TLU API (StudentMark): {e}")
         return None
+
+def iter_student_marks(access_token):
+    """
+    Đọc DẦN danh sách điểm trong lúc response đang tải, sinh từng bản ghi rút gọn
+    (tên/mã/tín chỉ môn, điểm, học kỳ — xem tlu_stream.slim_mark) để ghi CSDL
+    ngay mà không giữ cả bảng điểm trong RAM.
+    Ném lỗi requests/ValueError nếu gọi API hoặc JSON lỗi (kể cả giữa chừng).
+    """
+    url = tlu_url("/education/api/studentsubjectmark/getListMarkDetailStudent")
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    with get_session().get(url, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        yield from iter_json_array(response.iter_content(MARK_CHUNK_SIZE), transform=slim_mark)
     
 def fetch_schedule(access_token, semester_id): 
     """
     Lấy dữ liệu lịch học (các môn đang học) từ API TLU.
     """
-    schedule_url = f"https://sinhvien1.tlu.edu.vn/education/api/StudentCourseSubject/studentLoginUser/{semester_id}"
+    schedule_url = tlu_url(f"/education/api/StudentCourseSubject/studentLoginUser/{semester_id}")
     print(f"... Đang gọi API lịch học: {schedule_url}")
 
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
 
     try:
-        response = requests.get(schedule_url, headers=headers, verify=False)
+        response = get_session().get(schedule_url, headers=headers)
         response.raise_for_status()
         data = response.json()
         return data
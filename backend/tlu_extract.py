@@ -0,0 +1,67 @@
+"""
+Trích cột từ JSON lồng nhau của TLU theo đường dẫn khai báo sẵn.
+
+Mỗi trường được khai báo một lần dưới dạng (đường dẫn, giá trị mặc định).
+`compile_fields` tách sẵn các đường dẫn thành các bước (bước dùng chung giữa
+các trường chỉ tra một lần). `extract_columns` chạy từng bước trên CẢ danh sách
+item bằng list comprehension (theo cột, không theo từng item) và trả về các cột
+(list) thay vì list các dict, để bước sau lọc/kẹp/khử trùng bằng NumPy/pandas.
+
+Quy ước đường dẫn (giữ đúng ngữ nghĩa chuỗi `.get(key, {})` trước đây):
+- khóa thiếu -> {} (bước giữa) hoặc giá trị mặc định (bước cuối);
+- khóa có giá trị None/không phải dict ở bước giữa -> item hỏng, bị bỏ qua;
+- khóa kết thúc bằng "?" -> giá trị "rỗng" (None, {}, ...) được coi như {}
+  (tương đương `... or {}`).
+"""
+from collections import namedtuple
+
+_EMPTY = {}  # chỉ dùng làm giá trị mặc định cho .get(), không bao giờ bị ghi
+
+# names  : tên các cột, theo thứ tự khai báo
+# steps  : (ô cha, khóa, "?") cho từng bước giữa; bước thứ i tạo ô i + 1 (ô 0 = các item)
+# outputs: (ô cha, khóa cuối, mặc định) cho từng cột
+CompiledFields = namedtuple("CompiledFields", "names steps outputs")
+
+
+def compile_fields(fields):
+    """
+    {tên cột: (đường dẫn, mặc định)} -> CompiledFields dùng cho `extract_columns`.
+    Các tiền tố đường dẫn trùng nhau dùng chung một bước.
+    """
+    slots, steps, outputs = {(): 0}, [], []
+    for path, default in fields.values():
+        parent = ()
+        for key in path[:-1]:
+            prefix = parent + (key,)
+            if prefix not in slots:
+                slots[prefix] = len(slots)
+                steps.append((slots[parent], key.rstrip("?"), key.endswith("?")))
+            parent = prefix
+        outputs.append((slots[parent], path[-1], default))
+    return CompiledFields(tuple(fields), tuple(steps), tuple(outputs))
+
+
+def extract_columns(items, compiled):
+    """
+    Trả về ({tên cột: list giá trị}, số item hỏng bị bỏ qua).
+    Item không phải dict hoặc có bước giữa không phải dict được bỏ qua.
+    """
+    names, steps, outputs = compiled
+    items = items if isinstance(items, list) else list(items)
+    dicts = [item for item in items if isinstance(item, dict)]
+    skipped = len(items) - len(dicts)
+    slots = [dicts]
+    broken = set()  # vị trí (trong `dicts`) của item có bước giữa không phải dict
+    for parent, key, empty_as_dict in steps:
+        values = [value.get(key, _EMPTY) for value in slots[parent]]
+        if empty_as_dict:
+            values = [value or _EMPTY for value in values]
+        for i in [i for i, value in enumerate(values) if not isinstance(value, dict)]:
+            broken.add(i)
+            values[i] = _EMPTY
+        slots.append(values)
+    columns = [[value.get(key, default) for value in slots[parent]] for parent, key, default in outputs]
+    if broken:
+        skipped += len(broken)
+        columns = [[value for i, value in enumerate(column) if i not in broken] for column in columns]
+    return dict(zip(names, columns)), skipped
@@ -0,0 +1,114 @@
+"""
+Đọc dần (streaming) mảng JSON lớn từ TLU trong lúc response còn đang tải.
+
+`getListMarkDetailStudent` trả về một mảng chứa mọi môn của mọi học kỳ kèm
+rất nhiều trường chi tiết mà backend không dùng. Thay vì `response.json()`
+(giữ cả văn bản lẫn toàn bộ cây đối tượng trong RAM), `JSONArrayStream` nhận
+từng chunk byte, tách ra từng phần tử của mảng cấp cao nhất ngay khi phần tử
+đó đọc trọn (json.JSONDecoder.raw_decode) và chỉ giữ lại bản rút gọn
+(`slim_mark`). Bộ nhớ đỉnh vì thế tỉ lệ với kích thước bản rút gọn + một
+chunk, không phải với cả tài liệu.
+"""
+import codecs
+import json
+
+MARK_CHUNK_SIZE = 64 * 1024
+MARK_FIELDS = ("mark", "semesterName")
+MARK_SUBJECT_FIELDS = ("subjectName", "subjectCode", "credit")
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def slim_mark(item):
+    """
+    Chỉ giữ tên/mã/số tín chỉ môn, điểm và học kỳ — vẫn theo cấu trúc lồng của TLU
+    (item["subject"]["subjectName"]...) nên mọi hàm xử lý điểm dùng được ngay.
+    Item không phải dict (dữ liệu hỏng) được giữ nguyên để bước sau bỏ qua như cũ.
+    """
+    if not isinstance(item, dict):
+        return item
+    slim = {key: item[key] for key in MARK_FIELDS if key in item}
+    if "subject" in item:
+        subject = item["subject"]
+        if isinstance(subject, dict):
+            subject = {key: subject[key] for key in MARK_SUBJECT_FIELDS if key in subject}
+        slim["subject"] = subject
+    return slim
+
+
+class JSONArrayStream:
+    """
+    Bộ phân tích kiểu "đẩy": `feed(chunk)` trả về các phần tử vừa đọc trọn (đã qua
+    `transform`). Gọi `feed(b"", final=True)` khi hết dữ liệu. Nếu tài liệu không
+    phải mảng (ví dụ TLU trả về object lỗi), các phần tử không được tách mà toàn
+    bộ tài liệu nằm ở `document` sau lần feed cuối.
+    """
+
+    def __init__(self, transform=None):
+        self.transform = transform or (lambda item: item)
+        self.is_array = None  # chưa biết cho tới ký tự đầu tiên khác khoảng trắng
+        self.document = None
+        self.count = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._expect = "open"  # open -> item_or_close -> item -> separator -> done
+
+    def _skip_whitespace(self, pos):
+        while pos < len(self._buffer) and self._buffer[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def feed(self, chunk, final=False):
+        self._buffer += self._text.decode(chunk, final)
+        if self.is_array is False:
+            if final:
+                self.document = json.loads(self._buffer)
+                self._buffer = ""
+            return []
+        items, pos = [], 0
+        while True:
+            pos = self._skip_whitespace(pos)
+            if pos == len(self._buffer):
+                break
+            char = self._buffer[pos]
+            if self._expect == "open":
+                if char != "[":
+                    self.is_array = False
+                    self._buffer = self._buffer[pos:]
+                    return self.feed(b"", final)
+                self.is_array = True
+                self._expect, pos = "item_or_close", pos + 1
+            elif self._expect in ("item_or_close", "separator") and char == "]":
+                self._expect, pos = "done", pos + 1
+            elif self._expect == "separator":
+                if char != ",":
+                    raise ValueError(f"JSON không hợp lệ: cần ',' hoặc ']' tại ký tự {pos}")
+                self._expect, pos = "item", pos + 1
+            elif self._expect in ("item_or_close", "item"):
+                try:
+                    item, end = self._json.raw_decode(self._buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # phần tử chưa tải xong: chờ chunk sau
+                if (not final and self._buffer[end - 1] not in '}]"'
+                        and (end == len(self._buffer) or self._buffer[end] not in _DELIMITERS)):
+                    break  # số/true/false... có thể còn bị cắt dở ("-4.5" của "-4.5e10"): chờ ký tự phân cách
+                items.append(self.transform(item))
+                self.count += 1
+                self._expect, pos = "separator", end
+            else:  # done: chỉ cho phép khoảng trắng phía sau
+                raise ValueError(f"JSON không hợp lệ: dữ liệu thừa sau mảng tại ký tự {pos}")
+        self._buffer = self._buffer[pos:]
+        if final and self._expect != "done":
+            raise ValueError("JSON bị cắt: mảng chưa đóng")
+        return items
+
+
+def iter_json_array(chunks, transform=None):
+    """ Sinh lần lượt các phần tử (đã qua `transform`) của mảng JSON đến từ iterable các chunk byte. """
+    parser = JSONArrayStream(transform)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.feed(b"", final=True)